@@ -0,0 +1,177 @@
+from OpenGL.GL import *
+import numpy as np
+
+from instancing import POSE_LOCATION
+from pipeline import FRAGMENT_SHADER, FRAME_BLOCK, VERTEX_INPUTS, MeshAttributes, PipelineProgram
+
+# Unidad de textura del FlightPath; la 0 queda para las texturas de las mallas
+FLIGHT_PATH_UNIT = 1
+
+# Cada paso del FlightPath ocupa dos texels RGBA32F: (x, y, z, guiñada) y (cabeceo, 0, 0, 0)
+TEXELS_PER_STEP = 2
+
+# La pose sale del FlightPath con la misma cuenta que FlightPath.pose(): tiempo más desfase, vuelta al
+# ciclo, y la muestra del paso más la pendiente del tramo por la fracción. Después, como el programa
+# instanciado, se gira el modelo con la guiñada y el cabeceo y se lleva al centro de su órbita.
+# Por abeja solo llega instance_pose: (centro x, -, centro z, desfase en pasos)
+ANIMATED_VERTEX_SHADER = "#version 330 compatibility\n" + FRAME_BLOCK + VERTEX_INPUTS + f"""
+layout(location = {POSE_LOCATION}) in vec4 instance_pose;
+
+uniform samplerBuffer flight_path;
+uniform float time;
+uniform float period;
+uniform bool lighting;
+
+mat3 rotate_y(float degrees)
+{{
+    float a = radians(degrees);
+    return mat3(cos(a), 0.0, -sin(a), 0.0, 1.0, 0.0, sin(a), 0.0, cos(a));
+}}
+
+mat3 rotate_x(float degrees)
+{{
+    float a = radians(degrees);
+    return mat3(1.0, 0.0, 0.0, 0.0, cos(a), sin(a), 0.0, -sin(a), cos(a));
+}}
+
+void main()
+{{
+    float steps = instance_pose.w + time;
+    if (steps >= period)
+        steps -= period;
+
+    float whole = floor(steps);
+    float fraction = steps - whole;
+    int texel = int(whole) * {TEXELS_PER_STEP};
+
+    vec4 pose = texelFetch(flight_path, texel);
+    pose += (texelFetch(flight_path, texel + {TEXELS_PER_STEP}) - pose) * fraction;
+    float pitch = texelFetch(flight_path, texel + 1).x;
+    pitch += (texelFetch(flight_path, texel + {TEXELS_PER_STEP} + 1).x - pitch) * fraction;
+
+    mat3 rotation = rotate_y(pose.w) * rotate_x(pitch);
+    vec3 world = vec3(instance_pose.x, 0.0, instance_pose.z) + pose.xyz + rotation * position;
+    vec4 eye_pos = view * vec4(world, 1.0);
+    gl_Position = projection * eye_pos;
+
+    vertex_color = color;
+    vertex_uv = uv;
+
+    if (lighting) {{
+        vec3 eye_normal = normalize(mat3(view) * (rotation * normal));
+        vec3 to_light = normalize(light_position.xyz - eye_pos.xyz * light_position.w);
+        vec3 lit = light_ambient.rgb * color.rgb + max(dot(eye_normal, to_light), 0.0) * light_diffuse.rgb * color.rgb;
+        vertex_color = vec4(clamp(lit, 0.0, 1.0), color.a);
+    }}
+}}
+"""
+
+
+class FlightPathTexture:
+    """Las muestras de un FlightPath en un búfer de textura, para leerlas desde el vertex shader."""
+
+    def __init__(self, path):
+        self.path = path
+        self.period = path.period
+
+        data = np.zeros((path.period + 1, TEXELS_PER_STEP * 4), np.float32)
+        data[:, 0:4] = path.samples[0:4].T
+        data[:, 4] = path.samples[4]
+
+        self.buffer = glGenBuffers(1)
+        glBindBuffer(GL_TEXTURE_BUFFER, self.buffer)
+        glBufferData(GL_TEXTURE_BUFFER, data, GL_STATIC_DRAW)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_BUFFER, self.texture)
+        glTexBuffer(GL_TEXTURE_BUFFER, GL_RGBA32F, self.buffer)
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+
+    def delete(self):
+        if self.texture:
+            glDeleteTextures([self.texture])
+            glDeleteBuffers(1, [self.buffer])
+            self.texture = self.buffer = 0
+
+
+class AnimatedBatch:
+    """Malla, instancias y FlightPath de un enjambre animado, como geometría de un elemento de RenderQueue."""
+
+    def __init__(self, mesh, instances, vertex_array, flight_path):
+        self.attributes = MeshAttributes(mesh, vertex_array)
+        self.instances = instances
+        self.flight_path = flight_path
+
+    def bind_arrays(self):
+        # La textura del FlightPath va en su propia unidad; la 0 la sigue manejando RenderQueue
+        glActiveTexture(GL_TEXTURE0 + FLIGHT_PATH_UNIT)
+        glBindTexture(GL_TEXTURE_BUFFER, self.flight_path.texture)
+        glActiveTexture(GL_TEXTURE0)
+
+        self.attributes.bind_arrays()
+        self.instances.bind()
+
+    def point_arrays(self):
+        self.bind_arrays()
+
+    def unbind_arrays(self):
+        self.instances.unbind()
+        self.attributes.unbind_arrays()
+
+
+class AnimatedSwarmRenderer:
+    """Enjambre que vuela entero en la GPU: el vertex shader evalúa el FlightPath para cada abeja.
+
+    Las instancias llevan solo el centro de la órbita y el desfase de cada abeja y se suben una vez;
+    por cuadro la CPU manda un único valor, el tiempo, así que su costo no depende de cuántas abejas
+    haya. A cambio no hay poses en la CPU para descartar abejas fuera de cámara. Usa el VAO y el
+    bloque Frame de un ShaderPipeline.
+    """
+
+    def __init__(self, pipeline):
+        self.vertex_array = pipeline.vertex_array
+        self.program = PipelineProgram(ANIMATED_VERTEX_SHADER, FRAGMENT_SHADER,
+                                       ('flight_path', 'time', 'period', 'lighting'))
+
+        glUseProgram(self.program.program)
+        glUniform1i(self.program.uniforms['flight_path'], FLIGHT_PATH_UNIT)
+        glUseProgram(0)
+
+        self.flight_path = None
+
+    def set_flight_path(self, path):
+        # Se vuelve a subir solo si cambió el FlightPath
+        if self.flight_path is None or self.flight_path.path is not path:
+            if self.flight_path is not None:
+                self.flight_path.delete()
+            self.flight_path = FlightPathTexture(path)
+
+    def update_instances(self, instances, centers, phase_steps):
+        # centers (N, 2) en XZ y phase_steps de FlightPath.phase_steps()
+        positions = np.zeros((len(centers), 3), np.float32)
+        positions[:, [0, 2]] = centers
+        instances.update(positions, phase_steps)
+
+    def submit(self, queue, mesh, instances, state, steps):
+        # steps es el tiempo de la simulación en pasos, como en FlightPath.pose()
+        if not mesh.vertex_count or not instances.count:
+            return
+
+        batch = AnimatedBatch(mesh, instances, self.vertex_array, self.flight_path)
+        values = {'time': float(steps % self.flight_path.period), 'period': float(self.flight_path.period),
+                  'lighting': state.lighting}
+
+        # Como en ShaderPipeline, la luz la decide el programa y GL_LIGHTING no se toca
+        for tex_id, first, count in mesh.ranges:
+            queue.submit(lambda first=first, count=count: glDrawArraysInstanced(mesh.primitive, first, count,
+                                                                                instances.count),
+                         state._replace(program=self.program.program, texture=tex_id or 0, lighting=True), batch,
+                         shader=self.program, uniforms=dict(values, textured=bool(tex_id)),
+                         geometry_key=(mesh, instances))
+
+    def delete(self):
+        self.program.delete()
+        if self.flight_path is not None:
+            self.flight_path.delete()
+            self.flight_path = None
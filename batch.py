@@ -0,0 +1,80 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import os
+import time
+
+from encoders import is_video_path
+from headless import add_scene_args, render_frames, setup_scene
+
+
+def split_frames(first, last, workers):
+    # Tramos contiguos [inicio, fin) casi iguales: cada proceso carga la escena y hornea el mapa de sombra una vez
+    count = last - first
+    bounds = [first + count * i // workers for i in range(workers + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def render_range(args, first, last):
+    # Corre en su propio proceso, con su propio contexto GL sin ventana
+    scene, context = setup_scene(args)
+    try:
+        elapsed = render_frames(scene, context, last - first, args.out, args.format, first_index=first, fps=args.fps)
+    finally:
+        context.destroy()
+    return first, last, elapsed
+
+
+def render_batch(args, workers):
+    first, last = round(args.start * args.fps), round(args.end * args.fps)
+    ranges = split_frames(first, last, workers)
+
+    # Antes de crear los procesos, que heredan el entorno: llvmpipe reparte sus hilos entre los procesos
+    # en lugar de lanzar uno por núcleo en cada uno
+    os.environ.setdefault('LP_NUM_THREADS', str(max(1, (os.cpu_count() or 1) // len(ranges))))
+
+    # Como MeshWorkerPool: fork cuando se puede; este proceso nunca carga OpenGL ni crea un contexto
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context) as executor:
+        jobs = [executor.submit(render_range, args, *frames) for frames in ranges]
+        for job in as_completed(jobs):
+            range_first, range_last, elapsed = job.result()
+            print(f"Cuadros {range_first}-{range_last - 1} en {elapsed:.3f} s")
+
+    return last - first, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Renderiza un tramo de tiempo de una escena repartido entre varios procesos sin ventana.")
+    add_scene_args(parser)
+    parser.add_argument('--start', type=float, default=0.0, help="Inicio del tramo, en segundos simulados")
+    parser.add_argument('--end', type=float, required=True, help="Fin del tramo (sin incluir), en segundos simulados")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Procesos de render")
+    args = parser.parse_args(argv)
+
+    if not args.out:
+        parser.error("--out es obligatorio: los procesos escriben los cuadros numerados en esa carpeta")
+    if is_video_path(args.out):
+        parser.error("--out tiene que ser una carpeta: cada proceso escribe solo sus cuadros")
+    if args.end <= args.start:
+        parser.error("--end tiene que ser mayor que --start")
+
+    # La carpeta se crea una vez aquí y no en cada proceso a la vez
+    os.makedirs(args.out, exist_ok=True)
+
+    try:
+        frames, elapsed = render_batch(args, max(1, args.workers))
+    except ValueError as error:
+        parser.error(str(error))
+
+    width, height = args.size
+    print(f"{frames} cuadros de {width}x{height} en {elapsed:.3f} s ({frames / max(elapsed, 1e-9):.1f} cuadros/s) "
+          f"con {args.workers} procesos en '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
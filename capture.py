@@ -0,0 +1,165 @@
+from OpenGL.GL import *
+import numpy as np
+from collections import deque
+import ctypes
+import queue
+import threading
+
+# Búferes del anillo: el cuadro se lee de la GPU uno o dos cuadros después de pedirlo
+RING_SIZE = 3
+
+# Cuadros leídos que esperan al hilo de escritura; si el codificador se atrasa más, el render lo espera
+WRITE_BACKLOG = 8
+
+
+class PixelBufferRing:
+    """Lectura del framebuffer sin detener el pipeline, con un anillo de pixel buffer objects.
+
+    glReadPixels con un GL_PIXEL_PACK_BUFFER ligado solo encola la copia y vuelve enseguida; el búfer
+    se mapea cuadros después, cuando su fence dice que la copia terminó. Los cuadros salen como
+    llegan de GL, de abajo hacia arriba, en filas RGB.
+    """
+
+    def __init__(self, width, height, size=RING_SIZE):
+        self.width = width
+        self.height = height
+        self.frame_bytes = width * height * 3
+
+        self.buffers = [glGenBuffers(1) for _ in range(size)]
+        for pbo in self.buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.frame_bytes, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        self.pending = deque()  # (pbo, fence) de las lecturas encoladas, de la más vieja a la más nueva
+        self.next = 0
+
+    def read(self):
+        # Encola la lectura del cuadro actual; devuelve los cuadros anteriores que ya terminaron de copiarse.
+        # Solo espera si el anillo está lleno, es decir, si la GPU va RING_SIZE cuadros atrasada
+        frames = []
+        while self.pending and (len(self.pending) == len(self.buffers) or self._ready(self.pending[0][1])):
+            frames.append(self._map(*self.pending.popleft()))
+
+        pbo = self.buffers[self.next]
+        self.next = (self.next + 1) % len(self.buffers)
+
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        self.pending.append((pbo, glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)))
+        return frames
+
+    def flush(self):
+        # Los cuadros que quedan en el anillo, esperando a la GPU; al terminar de grabar
+        frames = []
+        while self.pending:
+            frames.append(self._map(*self.pending.popleft()))
+        return frames
+
+    def _ready(self, fence):
+        return glClientWaitSync(fence, 0, 0) in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED)
+
+    def _map(self, pbo, fence):
+        glDeleteSync(fence)
+
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        pointer = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.frame_bytes, GL_MAP_READ_BIT)
+        data = (ctypes.c_ubyte * self.frame_bytes).from_address(pointer)
+        frame = np.frombuffer(data, np.uint8).reshape(self.height, self.width, 3).copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        return frame
+
+    def delete(self):
+        for _, fence in self.pending:
+            glDeleteSync(fence)
+        self.pending.clear()
+
+        if self.buffers:
+            glDeleteBuffers(len(self.buffers), self.buffers)
+            self.buffers = []
+
+
+class FrameRecorder:
+    """Graba el framebuffer cuadro a cuadro sin detener el render.
+
+    capture() se llama con el cuadro ya dibujado y antes del intercambio de búferes: encola la
+    lectura en el PixelBufferRing y pasa los cuadros que ya llegaron a un hilo que los escribe en
+    sink (ImageSequence o VideoEncoder de encoders.py). Así el hilo de render no espera a la GPU ni al
+    codificador; los PNG se comprimen y ffmpeg lee la tubería mientras se dibujan los siguientes.
+
+    Sin clock cada capture() es un cuadro del video. Con clock (segundos) y fps, el cuadro k del
+    video muestra lo que había en pantalla k / fps después de la primera captura: un cuadro que llega
+    antes de que toque el siguiente no se lee y uno lento se repite, así el video dura lo mismo que la
+    sesión.
+    """
+
+    def __init__(self, width, height, sink, ring_size=RING_SIZE, backlog=WRITE_BACKLOG, clock=None, fps=None):
+        self.ring = PixelBufferRing(width, height, ring_size)
+        self.sink = sink
+        self.frames = queue.Queue(maxsize=backlog)
+        self.clock = clock
+        self.fps = fps
+        self.start = None
+        self.scheduled = 0  # Cuadros del video ya asignados a una captura
+        self.repeats = deque()  # Veces que va cada lectura pendiente del anillo, en el mismo orden
+        self.recorded = 0
+        self.error = None
+
+        self.thread = threading.Thread(target=self._write_frames, name="FrameRecorder", daemon=True)
+        self.thread.start()
+
+    def capture(self):
+        repeats = 1
+        if self.clock is not None:
+            now = self.clock()
+            if self.start is None:
+                self.start = now
+            repeats = int((now - self.start) * self.fps) + 1 - self.scheduled
+            if repeats <= 0:
+                return
+            self.scheduled += repeats
+
+        self.repeats.append(repeats)
+        self._send(self.ring.read())
+
+    def close(self):
+        # Espera los cuadros que faltan y cierra el sink; el error del hilo de escritura sale aquí
+        self._queue(self.ring.flush())
+
+        self.frames.put(None)
+        self.thread.join()
+        self.ring.delete()
+
+        self.sink.close()
+        if self.error is not None:
+            raise self.error
+
+    def _send(self, frames):
+        if self.error is not None:
+            raise self.error
+
+        self._queue(frames)
+
+    def _queue(self, frames):
+        for frame in frames:
+            for _ in range(self.repeats.popleft()):
+                self.frames.put(frame)
+                self.recorded += 1
+
+    def _write_frames(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                return
+
+            # Después de un error se siguen sacando cuadros para que capture() no quede bloqueado
+            if self.error is None:
+                try:
+                    self.sink.write(frame)
+                except Exception as error:
+                    self.error = error
@@ -0,0 +1,181 @@
+from functools import partial
+
+import numpy as np
+
+from voxels import MAT_AIRE, VoxelGrid, build_voxel_mesh
+
+CHUNK_SIZE = 16  # Vóxeles por lado de cada chunk
+
+# Chunks que se rehacen como mucho por cuadro; una edición grande se termina en los siguientes
+MAX_CHUNK_REBUILDS = 4
+
+# Veces que el pool puede fallar al mallar un chunk antes de mallarlo en el hilo de render
+MAX_POOL_FAILURES = 3
+
+
+class VoxelWorld:
+    """Rejilla de vóxeles partida en chunks de CHUNK_SIZE³, cada uno con su propia malla en un VBO.
+
+    Editar un vóxel marca como sucio su chunk y, si el vóxel está en una de sus caras, el vecino de
+    ese lado, que es el único al que le cambia la oclusión. rebuild() rehace unos pocos chunks sucios
+    por llamada; mientras tanto los demás siguen dibujando su malla anterior. La rejilla se edita en
+    su sitio, así que grid sigue siendo el modelo completo.
+
+    Con un MeshWorkerPool los chunks sucios se mallan en otros procesos, sin pasar del tope de
+    rebuild() ni de los lugares libres del pool, y la subida la limita MeshWorkerPool.poll(). Un
+    chunk que el pool no pudo mallar MAX_POOL_FAILURES veces se malla aquí mismo. versions descarta
+    las mallas de un chunk que se volvió a editar mientras se mallaba. Con cache los chunks del
+    modelo original se guardan en la caché de mallas por su contenido; uno editado ya no, porque no se
+    repetirá en otro arranque y hashearlo y escribirlo en cada edición costaría más que mallarlo.
+    revision sube cada vez que cambia alguna malla, p. ej. para saber cuándo rehacer un mapa de sombra.
+    """
+
+    def __init__(self, grid, textures=None, atlas=None, chunk_size=CHUNK_SIZE, pool=None, cache=False):
+        self.grid = grid
+        self.textures = textures
+        self.atlas = atlas
+        self.chunk_size = chunk_size
+        self.pool = pool
+        self.cache = cache
+
+        self.shape = tuple(-(-np.array(grid.data.shape) // chunk_size))
+        self.dirty = np.ones(self.shape, bool)
+        self.versions = np.zeros(self.shape, np.int64)
+        self.edited = np.zeros(self.shape, bool)
+        self.failures = np.zeros(self.shape, np.int32)
+        self.in_flight = 0
+        self.meshes = {}
+        self.revision = 0
+
+    def chunk_grid(self, chunk):
+        # Vóxeles del chunk con un marco de un vóxel de sus vecinos, que solo tapan caras
+        lo = np.array(chunk) * self.chunk_size
+        hi = np.minimum(lo + self.chunk_size, self.grid.data.shape)
+
+        sub = VoxelGrid(tuple(hi - lo + 2), self.grid.origin + (lo - 1) * self.grid.voxel_size, self.grid.voxel_size)
+
+        src_lo, src_hi = np.maximum(lo - 1, 0), np.minimum(hi + 1, self.grid.data.shape)
+        dst_lo, dst_hi = src_lo - (lo - 1), src_hi - (lo - 1)
+        sub.data[dst_lo[0]:dst_hi[0], dst_lo[1]:dst_hi[1], dst_lo[2]:dst_hi[2]] = \
+            self.grid.data[src_lo[0]:src_hi[0], src_lo[1]:src_hi[1], src_lo[2]:src_hi[2]]
+        return sub
+
+    def mark_dirty(self, lo, hi):
+        # Vóxeles [lo, hi): sus chunks y, ampliando la caja un vóxel en cada eje por separado, los
+        # vecinos por cara que toca; los de arista o esquina no comparten caras con ella
+        lo, hi = np.asarray(lo), np.asarray(hi)
+        last = np.array(self.shape) - 1
+
+        for axis in range(3):
+            grow = np.eye(3, dtype=int)[axis]
+            first = np.clip((lo - grow) // self.chunk_size, 0, last)
+            end = np.clip((hi - 1 + grow) // self.chunk_size, 0, last) + 1
+            self.dirty[first[0]:end[0], first[1]:end[1], first[2]:end[2]] = True
+            self.edited[first[0]:end[0], first[1]:end[1], first[2]:end[2]] = True
+
+    def set_voxel(self, index, material):
+        index = tuple(int(i) for i in index)
+        if not all(0 <= i < n for i, n in zip(index, self.grid.data.shape)):
+            raise IndexError(f"El vóxel {index} está fuera del mundo {self.grid.data.shape}")
+
+        if self.grid.data[index] != material:
+            self.grid.data[index] = material
+            self.mark_dirty(index, np.add(index, 1))
+
+    def clear_voxel(self, index):
+        self.set_voxel(index, MAT_AIRE)
+
+    def fill_box(self, min_corner, max_corner, material):
+        # Como VoxelGrid.fill_box, en coordenadas del mundo
+        lo, hi = self.grid.fill_box(min_corner, max_corner, material)
+        if (hi > lo).all():
+            self.mark_dirty(lo, hi)
+
+    @property
+    def pending(self):
+        # Chunks sucios más los que se están mallando en el pool
+        return int(np.count_nonzero(self.dirty)) + self.in_flight
+
+    def rebuild(self, limit=MAX_CHUNK_REBUILDS):
+        # Rehace hasta limit chunks sucios (todos con None) y devuelve cuántos rehízo; con pool manda
+        # a mallar, como mucho, los que quepan en el pool y devuelve cuántos mandó
+        if self.pool is not None:
+            limit = self.pool.free_slots if limit is None else min(limit, self.pool.free_slots)
+        chunks = [tuple(c) for c in np.argwhere(self.dirty)[:limit]]
+
+        for chunk in chunks:
+            self.dirty[chunk] = False
+            self.versions[chunk] += 1
+
+            cache = self.cache and not self.edited[chunk]
+
+            sub = self.chunk_grid(chunk)
+            if not sub.data[1:-1, 1:-1, 1:-1].any():
+                self.replace(chunk, None)
+            elif self.pool is not None and self.failures[chunk] < MAX_POOL_FAILURES:
+                self.in_flight += 1
+                self.pool.submit(partial(self.receive, chunk, self.versions[chunk]), sub,
+                                 self.textures, self.atlas, cache=cache,
+                                 failed=partial(self.fail, chunk, self.versions[chunk]), border=1)
+            else:
+                self.replace(chunk, build_voxel_mesh(sub, self.textures, atlas=self.atlas, border=1, cache=cache))
+
+        return len(chunks)
+
+    def replace(self, chunk, mesh):
+        self.revision += 1
+        old = self.meshes.pop(chunk, None)
+        if old is not None:
+            old.delete()
+        if mesh is not None:
+            self.meshes[chunk] = mesh
+
+    def receive(self, chunk, version, mesh):
+        # Callback del pool, ya en el hilo de GL
+        self.in_flight -= 1
+        if version == self.versions[chunk]:
+            self.replace(chunk, mesh)
+        else:
+            mesh.delete()
+
+    def fail(self, chunk, version):
+        # El pool no pudo mallar el chunk: vuelve a quedar sucio, salvo que ya se haya vuelto a editar.
+        # Tras MAX_POOL_FAILURES fallos rebuild() ya no lo manda al pool
+        self.in_flight -= 1
+        self.failures[chunk] += 1
+        if version == self.versions[chunk]:
+            self.dirty[chunk] = True
+
+    def stats(self):
+        # Estadísticas de malla sumadas sobre todos los chunks
+        total = {}
+        for mesh in self.meshes.values():
+            for key, value in mesh.stats.items():
+                total[key] = total.get(key, 0) + value
+        return total
+
+    def draw(self):
+        for mesh in self.meshes.values():
+            mesh.draw()
+
+    def submit(self, queue, state):
+        # Los chunks comparten estado, así que en la RenderQueue quedan juntos por textura
+        for mesh in self.meshes.values():
+            queue.submit_mesh(mesh, state)
+
+    def set_textures(self, textures, atlas=None):
+        # Las mallas actuales se siguen dibujando hasta que lleguen las que usan las texturas nuevas
+        self.textures = textures
+        self.atlas = atlas
+        self.invalidate()
+
+    def invalidate(self):
+        self.dirty[...] = True
+
+    def delete(self):
+        for mesh in self.meshes.values():
+            mesh.delete()
+        self.meshes = {}
+        self.dirty[...] = True
+        self.versions += 1
+        self.revision += 1
@@ -0,0 +1,135 @@
+import numpy as np
+
+
+def perspective_matrix(fov_y, aspect, near, far):
+    # La misma matriz que gluPerspective
+    f = 1.0 / np.tan(np.radians(fov_y) / 2.0)
+    return np.array([
+        [f / aspect, 0.0, 0.0, 0.0],
+        [0.0, f, 0.0, 0.0],
+        [0.0, 0.0, (far + near) / (near - far), 2.0 * far * near / (near - far)],
+        [0.0, 0.0, -1.0, 0.0],
+    ])
+
+
+def rotation_matrix(degrees, axis):
+    # glRotatef sobre uno de los ejes principales (0 = X, 1 = Y)
+    c, s = np.cos(np.radians(degrees)), np.sin(np.radians(degrees))
+    m = np.eye(4)
+    a, b = [(1, 2), (2, 0)][axis]
+    m[a, a], m[a, b], m[b, a], m[b, b] = c, -s, s, c
+    return m
+
+
+def translation_matrix(x, y, z):
+    # glTranslatef
+    m = np.eye(4)
+    m[:3, 3] = x, y, z
+    return m
+
+
+def model_matrix(x, y, z, yaw=0.0, pitch=0.0):
+    # glTranslatef(x, y, z); glRotatef(yaw, 0, 1, 0); glRotatef(pitch, 1, 0, 0), como draw_bee()
+    return translation_matrix(x, y, z) @ rotation_matrix(yaw, 1) @ rotation_matrix(pitch, 0)
+
+
+def orthographic_matrix(left, right, bottom, top, near, far):
+    # La misma matriz que glOrtho
+    return np.array([
+        [2.0 / (right - left), 0.0, 0.0, -(right + left) / (right - left)],
+        [0.0, 2.0 / (top - bottom), 0.0, -(top + bottom) / (top - bottom)],
+        [0.0, 0.0, -2.0 / (far - near), -(far + near) / (far - near)],
+        [0.0, 0.0, 0.0, 1.0],
+    ])
+
+
+def look_at_matrix(eye, target, up=(0.0, 1.0, 0.0)):
+    # La misma matriz que gluLookAt
+    forward = np.subtract(target, eye, dtype=np.float64)
+    forward /= np.linalg.norm(forward)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+    true_up = np.cross(side, forward)
+
+    m = np.eye(4)
+    m[0, :3], m[1, :3], m[2, :3] = side, true_up, -forward
+    return m @ translation_matrix(*(-np.asarray(eye, np.float64)))
+
+
+def camera_matrix(zoom, rot_x, rot_y):
+    # glTranslatef(0, 0, -zoom); glRotatef(rot_x, 1, 0, 0); glRotatef(rot_y, 0, 1, 0)
+    return translation_matrix(0.0, 0.0, -zoom) @ rotation_matrix(rot_x, 0) @ rotation_matrix(rot_y, 1)
+
+
+def camera_position(zoom, rot_x, rot_y):
+    # Posición de la cámara en coordenadas del mundo
+    return np.linalg.inv(camera_matrix(zoom, rot_x, rot_y))[:3, 3]
+
+
+def frustum_planes(clip):
+    # Planos (a, b, c, d) normalizados, con la normal hacia dentro, sacados de proyección × vista
+    planes = np.array([
+        clip[3] + clip[0], clip[3] - clip[0],
+        clip[3] + clip[1], clip[3] - clip[1],
+        clip[3] + clip[2], clip[3] - clip[2],
+    ])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def camera_frustum(zoom, rot_x, rot_y, aspect, fov_y=45.0, near=0.1, far=50.0):
+    return frustum_planes(perspective_matrix(fov_y, aspect, near, far) @ camera_matrix(zoom, rot_x, rot_y))
+
+
+def boxes_in_frustum(planes, mins, maxs):
+    # Para cada caja y plano se prueba la esquina más adentro; una caja queda fuera si esa
+    # esquina está detrás de algún plano. Es conservador: puede aceptar cajas en las esquinas del frustum.
+    normals = planes[:, :3]
+    corners = np.where(normals[None, :, :] >= 0.0, maxs[:, None, :], mins[:, None, :])
+    distances = np.einsum('npk,pk->np', corners, normals) + planes[:, 3]
+    return (distances >= 0.0).all(axis=1)
+
+
+class UniformGrid:
+    """Rejilla uniforme en XZ para descartar instancias por celdas en lugar de una a una.
+
+    Cada celda es una caja con toda la altura ocupada, ampliada por el radio del modelo para cubrir
+    cualquier giro. El frustum se prueba contra todas las celdas a la vez y cada instancia hereda
+    el resultado de la suya.
+    """
+
+    def __init__(self, cell_size, radius, y_range):
+        self.cell_size = cell_size
+        self.radius = radius
+        self.y_range = y_range
+
+        self.cell_index = None
+        self.mins = self.maxs = None
+
+    def assign(self, positions):
+        xz = positions[:, (0, 2)]
+        origin = xz.min(axis=0)
+        cells = ((xz - origin) // self.cell_size).astype(np.int64)
+        shape = cells.max(axis=0) + 1
+
+        self.cell_index = cells[:, 0] * shape[1] + cells[:, 1]
+
+        i, k = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), indexing='ij')
+        x0 = origin[0] + i.ravel() * self.cell_size
+        z0 = origin[1] + k.ravel() * self.cell_size
+        y0 = positions[:, 1].min() + self.y_range[0]
+        y1 = positions[:, 1].max() + self.y_range[1]
+
+        self.mins = np.column_stack((x0 - self.radius, np.full_like(x0, y0), z0 - self.radius))
+        self.maxs = np.column_stack((x0 + self.cell_size + self.radius, np.full_like(x0, y1),
+                                     z0 + self.cell_size + self.radius))
+
+    @property
+    def cell_count(self):
+        return len(self.mins)
+
+    def visible_cells(self, planes):
+        return boxes_in_frustum(planes, self.mins, self.maxs)
+
+    def cull(self, planes):
+        # Máscara de instancias visibles
+        return self.visible_cells(planes)[self.cell_index]
@@ -0,0 +1,80 @@
+import numpy as np
+import os
+import shutil
+import subprocess
+
+from PIL import Image
+
+# Extensiones que van a ffmpeg; cualquier otra ruta es una carpeta de imágenes
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.mov', '.avi')
+
+# zlib rápido: el PNG sigue sin pérdida, un poco más grande, y el hilo de escritura no se atrasa
+PNG_COMPRESS_LEVEL = 1
+
+
+def is_video_path(path):
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+class ImageSequence:
+    """Cuadros numerados en una carpeta, en PNG o RGB crudo.
+
+    Los cuadros llegan como los lee GL, de abajo hacia arriba; se guardan de arriba hacia abajo.
+    """
+
+    def __init__(self, out_dir, fmt='png', first_index=0):
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.index = first_index
+
+        os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, frame):
+        path = os.path.join(self.out_dir, f"frame_{self.index:05d}.{self.fmt}")
+        frame = np.flipud(frame)
+
+        if self.fmt == 'png':
+            Image.fromarray(frame).save(path, compress_level=PNG_COMPRESS_LEVEL)
+        else:
+            with open(path, 'wb') as f:
+                f.write(np.ascontiguousarray(frame).tobytes())
+
+        self.index += 1
+
+    def close(self):
+        pass
+
+
+class VideoEncoder:
+    """Video codificado por un ffmpeg local: los cuadros le llegan crudos por su entrada estándar.
+
+    ffmpeg los da vuelta con vflip, así que pasan tal cual los entrega GL, sin copiarlos.
+    """
+
+    def __init__(self, path, width, height, fps):
+        executable = shutil.which('ffmpeg')
+        if executable is None:
+            raise RuntimeError(f"Para grabar '{path}' hace falta ffmpeg en el PATH; "
+                               f"sin él, graba a una carpeta de PNG")
+
+        self.path = path
+        self.process = subprocess.Popen(
+            [executable, '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{width}x{height}", '-r', f"{fps:g}", '-i', '-',
+             '-vf', 'vflip', '-pix_fmt', 'yuv420p', path],
+            stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame.data)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait():
+            raise RuntimeError(f"ffmpeg terminó con código {self.process.returncode} al grabar '{self.path}'")
+
+
+def open_sink(path, width, height, fps, fmt='png', first_index=0):
+    # Un video si la extensión lo es; si no, una carpeta de cuadros numerados
+    if is_video_path(path):
+        return VideoEncoder(path, width, height, fps)
+    return ImageSequence(path, fmt, first_index)
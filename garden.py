@@ -0,0 +1,219 @@
+from OpenGL.GL import GL_DYNAMIC_DRAW, GL_STATIC_DRAW
+import numpy as np
+
+from culling import UniformGrid
+from impostor import Impostor
+from instancing import InstanceBuffer, shared_renderer
+from render import DEFAULT_STATE
+from voxels import MAT_CENTRO_NEGRO, MAT_HOJAS, MAT_LANA_ROJA, MAT_TIERRA, average_material_colors, build_voxel_mesh
+
+# Lado del bloque de tierra del tulipán: con esta separación los bloques quedan pegados
+GARDEN_SPACING = 2.0
+
+# Celdas de 8×8 tulipanes para descartar por frustum
+GARDEN_CELL_SIZE = 8 * GARDEN_SPACING
+
+# Tintes sobre la lana roja; los canales por encima de 1 sacan amarillo, rosa o morado del rojo
+GARDEN_TINTS = np.array([
+    (1.0, 1.0, 1.0),  # rojo original
+    (1.4, 5.0, 0.6),  # amarillo
+    (1.5, 3.0, 4.0),  # rosa
+    (0.9, 1.0, 4.5),  # morado
+    (1.4, 3.0, 0.5),  # naranja
+    (1.5, 5.5, 5.5),  # blanco
+], np.float32)
+
+# Niveles de detalle: 0 = tulipán completo, 1 = cajas fusionadas de una rejilla más gruesa, sin
+# textura y con el color medio de cada una, 2 = billboard con el tulipán prerenderizado. Se cambia de
+# nivel a estas distancias de la cámara, con un margen para que un tulipán justo en el borde no
+# alterne entre niveles cada cuadro.
+LOD_DISTANCES = (18.0, 30.0)
+LOD_HYSTERESIS = 1.5
+LOD_DOWNSAMPLE = 4
+
+PETAL_MATERIALS = (MAT_LANA_ROJA,)
+BASE_MATERIALS = (MAT_HOJAS, MAT_TIERRA, MAT_CENTRO_NEGRO)
+
+
+def parse_garden(text):
+    # "200x200" o "50" (cuadrado)
+    rows, _, cols = text.lower().partition('x')
+    return int(rows), int(cols or rows)
+
+
+def select_lod(current, distances, thresholds=LOD_DISTANCES, hysteresis=LOD_HYSTERESIS):
+    # Cada tulipán se queda en su nivel mientras la distancia esté dentro del margen del umbral
+    thresholds = np.asarray(thresholds, np.float32)
+    if current is None:
+        return np.searchsorted(thresholds, distances).astype(np.int8)
+
+    finest = np.searchsorted(thresholds + hysteresis, distances)
+    coarsest = np.searchsorted(thresholds - hysteresis, distances)
+    return np.clip(current, finest, coarsest).astype(np.int8)
+
+
+def grid_bounds(grid):
+    low = np.asarray(grid.origin, np.float64)
+    return low, low + np.asarray(grid.data.shape) * grid.voxel_size
+
+
+def garden_layout(rows, cols, spacing=GARDEN_SPACING, seed=0):
+    # Rejilla centrada en el origen; el tulipán del centro conserva la pose y el color de la escena original
+    rng = np.random.default_rng(seed)
+
+    row_index, col_index = np.meshgrid(np.arange(rows), np.arange(cols), indexing='ij')
+    positions = np.zeros((rows * cols, 3), np.float32)
+    positions[:, 0] = (col_index.ravel() - (cols - 1) // 2) * spacing
+    positions[:, 2] = (row_index.ravel() - (rows - 1) // 2) * spacing
+
+    # Giros de 90° para que los bloques de tierra sigan encajando entre sí
+    yaw = rng.integers(0, 4, rows * cols).astype(np.float32) * 90.0
+    tint = GARDEN_TINTS[rng.integers(0, len(GARDEN_TINTS), rows * cols)]
+
+    center = np.flatnonzero((positions[:, 0] == 0.0) & (positions[:, 2] == 0.0))
+    yaw[center] = 0.0
+    tint[center] = GARDEN_TINTS[0]
+
+    return positions, yaw, tint
+
+
+class Garden:
+    """Campo de tulipanes que comparten mallas horneadas y se dibujan con instancias.
+
+    Cada nivel de detalle son dos llamadas de dibujo sin importar cuántos tulipanes haya: la base
+    (tierra, tallo y hojas) y los pétalos teñidos. Con un frustum solo se suben los tulipanes de las
+    celdas visibles, y solo cuando cambian esas celdas o el nivel de algún tulipán.
+    """
+
+    def __init__(self, rows, cols, spacing=GARDEN_SPACING, seed=0):
+        self.rows = rows
+        self.cols = cols
+        self.positions, self.yaw, self.tint = garden_layout(rows, cols, spacing, seed)
+
+        self.instances = None  # un InstanceBuffer por nivel
+        self.levels = None  # (base, pétalos) por nivel
+        self.impostor = None
+
+        self.cells = None
+        self.lod = None
+        self.uploaded = None
+
+        self.casters = None  # todos los tulipanes, para el mapa de sombra
+
+    @property
+    def count(self):
+        return len(self.positions)
+
+    def build_cells(self, grid):
+        # Radio y altura del modelo a partir de la rejilla de vóxeles del tulipán
+        low, high = grid_bounds(grid)
+        radius = float(np.hypot(np.abs((low[0], high[0])).max(), np.abs((low[2], high[2])).max()))
+
+        self.cells = UniformGrid(GARDEN_CELL_SIZE, radius, (low[1], high[1]))
+        self.cells.assign(self.positions)
+
+    def update_instances(self, grid, planes, camera_position):
+        if planes is None:
+            visible_cells = None
+        else:
+            if self.cells is None:
+                self.build_cells(grid)
+            visible_cells = self.cells.visible_cells(planes)
+
+        if camera_position is None:
+            self.lod = None
+        else:
+            distances = np.linalg.norm(self.positions - np.asarray(camera_position, np.float32), axis=1)
+            self.lod = select_lod(self.lod, distances)
+
+        state = (None if visible_cells is None else visible_cells.tobytes(),
+                 None if self.lod is None else self.lod.tobytes())
+        if state == self.uploaded:
+            return
+
+        visible = np.ones(self.count, bool) if visible_cells is None else visible_cells[self.cells.cell_index]
+        lod = np.zeros(self.count, np.int8) if self.lod is None else self.lod
+
+        for level, instances in enumerate(self.instances):
+            mask = visible & (lod == level)
+            instances.update(self.positions[mask], self.yaw[mask], tint=self.tint[mask])
+        self.uploaded = state
+
+    def bake(self, grid, textures=None, atlas=None):
+        self.invalidate()
+
+        coarse = grid.downsample(LOD_DOWNSAMPLE)
+        colors = average_material_colors(atlas)
+        self.levels = [
+            (build_voxel_mesh(grid, textures, atlas=atlas, materials=BASE_MATERIALS, cache=True),
+             build_voxel_mesh(grid, textures, atlas=atlas, materials=PETAL_MATERIALS, cache=True)),
+            (build_voxel_mesh(coarse, materials=BASE_MATERIALS, colors=colors, cache=True),
+             build_voxel_mesh(coarse, materials=PETAL_MATERIALS, colors=colors, cache=True)),
+        ]
+
+        self.impostor = Impostor(self.levels[0], *grid_bounds(grid))
+        self.levels.append(tuple(self.impostor.quads))
+
+    def submit(self, queue, grid, textures=None, atlas=None, planes=None, camera_position=None):
+        # Añade los niveles a la RenderQueue; devuelve cuántos tulipanes se mandaron a dibujar en cada nivel
+        if self.levels is None:
+            self.bake(grid, textures, atlas)
+
+        if self.instances is None:
+            self.instances = [InstanceBuffer(GL_DYNAMIC_DRAW) for _ in range(len(LOD_DISTANCES) + 1)]
+
+        self.update_instances(grid, planes, camera_position)
+
+        renderer = shared_renderer()
+        for level, ((base, petals), instances) in enumerate(zip(self.levels, self.instances)):
+            if level < len(self.levels) - 1:
+                renderer.submit(queue, base, instances, DEFAULT_STATE)
+                renderer.submit(queue, petals, instances, DEFAULT_STATE, tinted=True)
+            else:
+                # El impostor ya viene iluminado; se recorta por alfa para que escriba profundidad
+                unlit = DEFAULT_STATE._replace(lighting=False)
+                renderer.submit(queue, base, instances, unlit, camera_position=camera_position, alpha_cutoff=0.5)
+                renderer.submit(queue, petals, instances, unlit, tinted=True, camera_position=camera_position,
+                                alpha_cutoff=0.5)
+
+        return [instances.count for instances in self.instances]
+
+    def bounds(self, grid):
+        # Caja (low, high) de todo el jardín en el mundo. Los tulipanes giran de a 90°, así que en X y Z
+        # cada uno alcanza lo que el mayor de sus dos ejes
+        low, high = grid_bounds(grid)
+        reach = np.abs((low[0], low[2], high[0], high[2])).max()
+        return (self.positions.min(axis=0) + (-reach, low[1], -reach),
+                self.positions.max(axis=0) + (reach, high[1], reach))
+
+    def submit_casters(self, queue, grid, textures=None, atlas=None):
+        # Todo el jardín, sin frustum y con las cajas gruesas del nivel 1: el mapa de sombra lo ve desde
+        # la luz y solo se vuelve a dibujar cuando cambian las mallas (levels es otra lista tras hornear)
+        if self.levels is None:
+            self.bake(grid, textures, atlas)
+
+        if self.casters is None:
+            self.casters = InstanceBuffer(GL_STATIC_DRAW)
+            self.casters.update(self.positions, self.yaw)
+
+        renderer = shared_renderer()
+        for mesh in self.levels[1]:
+            renderer.submit(queue, mesh, self.casters, DEFAULT_STATE)
+
+    def invalidate(self):
+        # Se vuelve a hornear y a subir en el próximo draw(), p. ej. cuando llega el atlas; también libera
+        # los VBOs de un jardín que se reemplaza
+        if self.levels is not None:
+            for level in self.levels[:-1]:
+                for mesh in level:
+                    mesh.delete()
+            self.impostor.delete()
+            self.levels = None
+            self.impostor = None
+
+        for instances in (self.instances or []) + [self.casters]:
+            if instances is not None:
+                instances.delete()
+        self.instances = None
+        self.casters = None
+        self.uploaded = None
@@ -0,0 +1,297 @@
+import argparse
+import ctypes
+import importlib
+import os
+import time
+
+# Escenas que se pueden renderizar sin ventana: todas exponen init_opengl(), render_scene() y CAMERA
+SCENES = ('tulipan_3d', 'tulipan_3d_', 'tulipan_abeja')
+
+
+def configure_platform(backend):
+    # PyOpenGL elige la plataforma al importarse por primera vez, así que esto va antes de cargar la escena
+    os.environ.setdefault('PYOPENGL_PLATFORM', backend)
+    if backend == 'egl':
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+
+class OffscreenContext:
+    """Contexto GL sin ventana con Mesa por software (EGL pbuffer u OSMesa)."""
+
+    def __init__(self, width, height, backend='egl'):
+        self.width = width
+        self.height = height
+        self.backend = backend
+
+        if backend == 'egl':
+            self._create_egl()
+        elif backend == 'osmesa':
+            self._create_osmesa()
+        else:
+            raise ValueError(f"Backend sin ventana desconocido: {backend}")
+
+    def _create_egl(self):
+        from OpenGL import EGL
+
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        if not EGL.eglInitialize(self.display, None, None):
+            raise RuntimeError("No se pudo inicializar EGL")
+
+        config_attribs = (EGL.EGLint * 13)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_NONE
+        )
+        configs = (EGL.EGLConfig * 64)()
+        num_configs = EGL.EGLint()
+        if not EGL.eglChooseConfig(self.display, config_attribs, configs, len(configs),
+                                   ctypes.pointer(num_configs)) or num_configs.value == 0:
+            raise RuntimeError("EGL no ofrece una configuración RGB con profundidad")
+
+        # EGL pone primero las de más bits por canal (p. ej. 10); con 8, como la ventana de pygame, una
+        # grabación repetida aquí da los mismos píxeles que en pantalla
+        config = configs[0]
+        for candidate in configs[:num_configs.value]:
+            red = EGL.EGLint()
+            EGL.eglGetConfigAttrib(self.display, candidate, EGL.EGL_RED_SIZE, ctypes.pointer(red))
+            if red.value == 8:
+                config = candidate
+                break
+
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+
+        surface_attribs = (EGL.EGLint * 5)(EGL.EGL_WIDTH, self.width, EGL.EGL_HEIGHT, self.height, EGL.EGL_NONE)
+        self.surface = EGL.eglCreatePbufferSurface(self.display, config, surface_attribs)
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, None)
+
+        if not EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context):
+            raise RuntimeError("No se pudo activar el contexto EGL")
+
+    def _create_osmesa(self):
+        from OpenGL import arrays, osmesa
+        from OpenGL.GL import GL_UNSIGNED_BYTE
+
+        self.context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+        if not self.context:
+            raise RuntimeError("No se pudo crear el contexto OSMesa")
+
+        self.buffer = arrays.GLubyteArray.zeros((self.height, self.width, 4))
+        if not osmesa.OSMesaMakeCurrent(self.context, self.buffer, GL_UNSIGNED_BYTE, self.width, self.height):
+            raise RuntimeError("No se pudo activar el contexto OSMesa")
+
+    def destroy(self):
+        if self.backend == 'egl':
+            from OpenGL import EGL
+
+            EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+            EGL.eglDestroySurface(self.display, self.surface)
+            EGL.eglDestroyContext(self.display, self.context)
+            EGL.eglTerminate(self.display)
+        else:
+            from OpenGL import osmesa
+
+            osmesa.OSMesaDestroyContext(self.context)
+
+
+def open_scene(name, width, height, camera=None, backend='egl', shaders=False):
+    # Crea el contexto y prepara la escena igual que su main(), pero sin pygame.display
+    configure_platform(backend)
+    context = OffscreenContext(width, height, backend)
+
+    scene = importlib.import_module(name)
+    scene.WINDOW_WIDTH, scene.WINDOW_HEIGHT = width, height
+
+    scene.SHADERS = shaders
+    if camera is not None:
+        scene.CAMERA.rot_x, scene.CAMERA.rot_y, scene.CAMERA.zoom = camera
+
+    from OpenGL.GL import glViewport
+    from textures import TEXTURE_FILES, load_textures
+
+    glViewport(0, 0, width, height)
+    scene.init_opengl()
+
+    scene_textures = getattr(scene, 'SCENE_TEXTURES', ())
+    if scene_textures:
+        textures, scene.ATLAS = load_textures({name: TEXTURE_FILES[name] for name in scene_textures})
+        scene.TEXTURES.update(textures)
+        scene.invalidate_models()
+
+    return scene, context
+
+
+def render_frames(scene, context, frames, out_dir=None, fmt='png', first_index=0, fps=60, replay=None):
+    from OpenGL.GL import glFinish
+    from capture import FrameRecorder
+    from encoders import open_sink
+    from simulation import ManualClock
+
+    # La simulación avanza 1/fps por cuadro, no según lo que tarda el render: mismos cuadros en cada corrida.
+    # El cuadro first_index cae en first_index / fps, así un proceso de batch.py empieza en cualquier cuadro.
+    # Con replay (InputReplay) cada cuadro avanza lo que duró al grabarlo y la cámara sigue sus eventos
+    clock = None
+    if replay is not None:
+        from window import MouseOrbit
+
+        controls = MouseOrbit(scene.CAMERA)
+        replay.begin(scene.CAMERA, getattr(scene, 'SIM_CLOCK', None))
+    elif hasattr(scene, 'SIM_CLOCK'):
+        clock = ManualClock()
+        scene.SIM_CLOCK.clock = clock
+        scene.SIM_CLOCK.seek(first_index / fps)
+
+    # out_dir es una carpeta de cuadros o un video para ffmpeg; se leen con PBO y se escriben en otro hilo
+    # mientras se dibujan los siguientes
+    recorder = None
+    if out_dir:
+        recorder = FrameRecorder(context.width, context.height,
+                                 open_sink(out_dir, context.width, context.height, fps, fmt, first_index))
+
+    profiler = scene.PROFILER
+
+    start = time.perf_counter()
+    for i in range(frames):
+        if replay is not None:
+            for event in replay.replay_frame(i):
+                controls.handle(event)
+        elif clock is not None and i:
+            clock.tick(1.0 / fps)
+
+        profiler.begin_frame()
+        scene.render_scene()
+
+        if recorder is not None:
+            with profiler.phase('capture'):
+                recorder.capture()
+
+        # Sin ventana no hay intercambio de búferes: glFinish ocupa el lugar de pygame.display.flip
+        with profiler.phase('flip'):
+            glFinish()
+
+        profiler.end_frame()
+
+    if recorder is not None:
+        recorder.close()
+
+    return time.perf_counter() - start
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def parse_camera(text):
+    rot_x, rot_y, zoom = (float(v) for v in text.split(','))
+    return rot_x, rot_y, zoom
+
+
+def add_scene_args(parser):
+    # Opciones de la escena y del contexto; batch.py las comparte con sus procesos
+    parser.add_argument('scene', nargs='?', default='tulipan_abeja', choices=SCENES)
+    parser.add_argument('--size', type=parse_size, default=(800, 600), help="ANCHOxALTO")
+    parser.add_argument('--camera', type=parse_camera, default=None, help="rot_x,rot_y,zoom")
+    parser.add_argument('--out', default=None,
+                        help="Carpeta de salida, o un video (.mp4, .mkv, ...) que codifica ffmpeg; "
+                             "sin ella solo se mide el tiempo")
+    parser.add_argument('--format', choices=('png', 'rgb'), default='png')
+    parser.add_argument('--fps', type=float, default=60.0, help="Cuadros por segundo de tiempo simulado")
+    parser.add_argument('--bees', type=int, default=None, help="Enjambre de N abejas (solo tulipan_abeja)")
+    parser.add_argument('--garden', default=None, metavar='FILASxCOLUMNAS', help="Jardín de tulipanes con instancias")
+    parser.add_argument('--backend', choices=('egl', 'osmesa'), default='egl')
+    parser.add_argument('--shaders', action='store_true', help="Mallas con el ShaderPipeline GLSL")
+    parser.add_argument('--gpu-bees', action='store_true', help="Enjambre animado en el vertex shader")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla del enjambre y del jardín")
+
+
+def setup_scene(args):
+    # Contexto y escena listos para render_frames(), con el enjambre y el jardín de args. ValueError si
+    # la escena no tiene lo que se pide
+    width, height = args.size
+    scene, context = open_scene(args.scene, width, height, args.camera, args.backend,
+                                args.shaders or args.gpu_bees)
+
+    if args.bees:
+        if not hasattr(scene, 'create_swarm'):
+            raise ValueError(f"La escena {args.scene} no tiene abejas")
+        scene.create_swarm(args.bees, args.seed)
+        scene.GPU_BEES = args.gpu_bees
+
+    if args.garden:
+        if not hasattr(scene, 'create_garden'):
+            raise ValueError(f"La escena {args.scene} no tiene jardín")
+        from garden import parse_garden
+
+        scene.create_garden(*parse_garden(args.garden), seed=args.seed)
+
+    return scene, context
+
+
+def load_replay(args):
+    # La escena, el tamaño, el enjambre, el jardín y los cuadros salen de la grabación; cómo se dibuja
+    # (--shaders, --gpu-bees, --backend) sigue siendo de la línea de comandos
+    from replay import InputRecording, InputReplay
+
+    recording = InputRecording.load(args.replay)
+    if recording.scene not in SCENES:
+        raise ValueError(f"la escena {recording.scene} no se puede renderizar sin ventana")
+
+    options = recording.options
+    args.scene = recording.scene
+    args.size = tuple(recording.header['size'])
+    args.bees = options.get('bees')
+    args.seed = options.get('seed', 0)
+    args.garden = "{}x{}".format(*options['garden']) if options.get('garden') else None
+    args.frames = len(recording)
+
+    return InputReplay(recording)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renderiza una escena del tulipán sin ventana.")
+    add_scene_args(parser)
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--profile', metavar='RUTA', help="Guarda los tiempos por fase en CSV o JSON")
+    parser.add_argument('--gpu-timers', action='store_true')
+    parser.add_argument('--replay', metavar='RUTA',
+                        help="Repite una grabación de la ventana (--record-input): escena, cámara, eventos y tiempos")
+    args = parser.parse_args(argv)
+
+    replay = None
+    if args.replay:
+        try:
+            replay = load_replay(args)
+        except (OSError, ValueError) as error:
+            parser.error(f"No se pudo leer la grabación: {error}")
+
+    width, height = args.size
+    try:
+        scene, context = setup_scene(args)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.profile:
+        from profiler import FrameProfiler, install_gl_counter
+
+        # Sin overlay para que los cuadros guardados salgan limpios
+        scene.PROFILER = FrameProfiler(gpu_timers=args.gpu_timers, overlay=False)
+        install_gl_counter(scene.PROFILER, scene)
+
+    try:
+        elapsed = render_frames(scene, context, args.frames, args.out, args.format, fps=args.fps, replay=replay)
+    finally:
+        context.destroy()
+
+    print(f"{args.frames} cuadros de {width}x{height} en {elapsed:.3f} s "
+          f"({args.frames / max(elapsed, 1e-9):.1f} cuadros/s)")
+
+    if args.profile:
+        scene.PROFILER.print_summary()
+        scene.PROFILER.export(args.profile)
+        print(f"Perfil guardado en '{args.profile}'")
+
+
+if __name__ == "__main__":
+    main()
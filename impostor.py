@@ -0,0 +1,127 @@
+from OpenGL.GL import *
+import numpy as np
+
+from mesh import StaticMesh, VERTEX_FLOATS
+
+IMPOSTOR_SIZE = 128  # Lado de la textura de cada capa, en píxeles
+
+# Inclinación de la cámara al fotografiar el modelo; a lo lejos se ve desde arriba como con la cámara por defecto
+IMPOSTOR_ELEVATION = 30.0
+
+
+def create_render_target(size):
+    # Textura RGBA + profundidad en un framebuffer, para renderizar dentro de ella
+    texture_id = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture_id)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, size, size, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+
+    depth = glGenRenderbuffers(1)
+    glBindRenderbuffer(GL_RENDERBUFFER, depth)
+    glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, size, size)
+    glBindRenderbuffer(GL_RENDERBUFFER, 0)
+
+    framebuffer = glGenFramebuffers(1)
+    glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+    glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, texture_id, 0)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, depth)
+
+    if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+        raise RuntimeError("El framebuffer del impostor está incompleto")
+
+    return framebuffer, depth, texture_id
+
+
+def billboard_quad(left, right, bottom, top, texture_id):
+    # Quad vertical en el plano XY mirando a +Z, sin iluminación, con la textura completa
+    data = np.zeros((4, VERTEX_FLOATS), np.float32)
+    data[:, 0:3] = [(left, bottom, 0.0), (right, bottom, 0.0), (right, top, 0.0), (left, top, 0.0)]
+    data[:, 3:6] = (0.0, 0.0, 1.0)
+    data[:, 6:8] = [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)]
+    data[:, 8:12] = 1.0
+    return StaticMesh(data, [(texture_id, 0, 4)])
+
+
+class Impostor:
+    """El modelo renderizado una sola vez a texturas, para dibujarlo lejos como un billboard.
+
+    Se hace una textura por capa (p. ej. base y pétalos) con las otras capas solo en profundidad, así
+    cada capa conserva sus oclusiones y se puede teñir por separado. quads[i] es el billboard de la capa i.
+    """
+
+    def __init__(self, layers, bounds_min, bounds_max, size=IMPOSTOR_SIZE, elevation=IMPOSTOR_ELEVATION):
+        self.size = size
+        self.textures = []
+        self.quads = []
+
+        # Caja de la vista ortográfica: el origen del modelo queda en (0, 0) igual que en el billboard
+        lo, hi = np.asarray(bounds_min, np.float64), np.asarray(bounds_max, np.float64)
+        radius = float(np.hypot(np.abs((lo[0], hi[0])).max(), np.abs((lo[2], hi[2])).max()))
+        corners = np.array([(x, y, z) for x in (lo[0], hi[0]) for y in (lo[1], hi[1]) for z in (lo[2], hi[2])])
+        a = np.radians(elevation)
+        view_y = corners[:, 1] * np.cos(a) - corners[:, 2] * np.sin(a)
+        bottom, top = float(view_y.min()), float(view_y.max())
+        reach = float(np.linalg.norm(corners, axis=1).max())
+
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        clear_color = glGetFloatv(GL_COLOR_CLEAR_VALUE)
+
+        glPushAttrib(GL_ENABLE_BIT | GL_COLOR_BUFFER_BIT)
+        glDisable(GL_BLEND)
+
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(-radius, radius, bottom, top, -reach, reach)
+
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        glRotatef(elevation, 1, 0, 0)
+
+        glViewport(0, 0, size, size)
+        glClearColor(0.0, 0.0, 0.0, 0.0)
+
+        for i, layer in enumerate(layers):
+            framebuffer, depth_buffer, texture_id = create_render_target(size)
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+            # Las otras capas solo tapan; la capa i escribe color donde queda por delante
+            glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+            for j, other in enumerate(layers):
+                if j != i:
+                    other.draw()
+            glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+            layer.draw()
+
+            glBindFramebuffer(GL_FRAMEBUFFER, 0)
+            glDeleteFramebuffers(1, [framebuffer])
+            glDeleteRenderbuffers(1, [depth_buffer])
+
+            glBindTexture(GL_TEXTURE_2D, texture_id)
+            glGenerateMipmap(GL_TEXTURE_2D)
+
+            self.textures.append(texture_id)
+            self.quads.append(billboard_quad(-radius, radius, bottom, top, texture_id))
+
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+
+        glViewport(*viewport)
+        glClearColor(*clear_color)
+        glPopAttrib()
+
+    def delete(self):
+        for quad in self.quads:
+            quad.delete()
+        if self.textures:
+            glDeleteTextures(self.textures)
+        self.quads = []
+        self.textures = []
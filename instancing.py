@@ -0,0 +1,257 @@
+from OpenGL.GL import *
+import numpy as np
+import ctypes
+
+from shaders import link_program, uniform_locations
+
+# Cada instancia: posición (3), guiñada (1) y cabeceo (1) en grados, como draw_bee(), y tinte RGB (3)
+INSTANCE_FLOATS = 8
+INSTANCE_STRIDE = INSTANCE_FLOATS * 4
+
+POSE_OFFSET = 0
+PITCH_OFFSET = 4 * 4
+TINT_OFFSET = 5 * 4
+
+# Locations fijas para los atributos por instancia; la 0 queda para gl_Vertex
+POSE_LOCATION = 6
+PITCH_LOCATION = 7
+TINT_LOCATION = 8
+
+# (location, componentes, desplazamiento en bytes)
+INSTANCE_ATTRIBUTES = (
+    (POSE_LOCATION, 4, POSE_OFFSET),
+    (PITCH_LOCATION, 1, PITCH_OFFSET),
+    (TINT_LOCATION, 3, TINT_OFFSET),
+)
+
+# Mismas transformaciones que glTranslatef + glRotatef(guiñada, Y) + glRotatef(cabeceo, X) y la
+# misma iluminación por vértice que el pipeline fijo con GL_COLOR_MATERIAL (sin especular)
+VERTEX_SHADER = """
+#version 120
+
+attribute vec4 instance_pose;
+attribute float instance_pitch;
+attribute vec3 instance_tint;
+
+uniform bool lighting;
+uniform bool tinted;
+uniform bool billboard;
+uniform vec3 camera_position;
+
+varying vec4 color;
+varying vec2 uv;
+varying vec3 tint;
+
+mat3 rotate_y(float degrees)
+{
+    float a = radians(degrees);
+    return mat3(cos(a), 0.0, -sin(a), 0.0, 1.0, 0.0, sin(a), 0.0, cos(a));
+}
+
+mat3 rotate_x(float degrees)
+{
+    float a = radians(degrees);
+    return mat3(1.0, 0.0, 0.0, 0.0, cos(a), sin(a), 0.0, -sin(a), cos(a));
+}
+
+void main()
+{
+    // Un billboard ignora la guiñada de la instancia y gira sobre Y para mirar a la cámara
+    float yaw = billboard ? degrees(atan(camera_position.x - instance_pose.x, camera_position.z - instance_pose.z))
+                          : instance_pose.w;
+    mat3 rotation = rotate_y(yaw) * rotate_x(instance_pitch);
+    vec4 eye_pos = gl_ModelViewMatrix * vec4(instance_pose.xyz + rotation * gl_Vertex.xyz, 1.0);
+
+    gl_Position = gl_ProjectionMatrix * eye_pos;
+    uv = gl_MultiTexCoord0.xy;
+    color = gl_Color;
+    tint = tinted ? instance_tint : vec3(1.0);
+
+    if (lighting) {
+        vec3 normal = normalize(gl_NormalMatrix * (rotation * gl_Normal));
+        vec4 light_pos = gl_LightSource[0].position;
+        vec3 to_light = normalize(light_pos.xyz - eye_pos.xyz * light_pos.w);
+
+        vec4 lit = (gl_LightModel.ambient + gl_LightSource[0].ambient) * gl_Color
+                 + max(dot(normal, to_light), 0.0) * gl_LightSource[0].diffuse * gl_Color;
+        color = vec4(clamp(lit.rgb, 0.0, 1.0), gl_Color.a);
+    }
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 120
+
+uniform sampler2D texture;
+uniform bool textured;
+uniform float alpha_cutoff;
+
+varying vec4 color;
+varying vec2 uv;
+varying vec3 tint;
+
+void main()
+{
+    // El tinte multiplica el color final; con canales > 1 puede llevar el rojo a amarillo o rosa
+    vec4 base = textured ? color * texture2D(texture, uv) : color;
+    if (base.a < alpha_cutoff)
+        discard;
+
+    gl_FragColor = vec4(base.rgb * tint, base.a);
+}
+"""
+
+
+class InstanceBuffer:
+    """Poses de todas las instancias en un VBO.
+
+    Las abejas lo reescriben cada cuadro (GL_STREAM_DRAW); los niveles de un jardín, cuando cambian
+    las celdas visibles o el nivel de detalle de algún tulipán (GL_DYNAMIC_DRAW), y solo el de los
+    que hacen sombra se sube una vez (GL_STATIC_DRAW).
+    """
+
+    def __init__(self, usage=GL_STREAM_DRAW):
+        self.vbo = glGenBuffers(1)
+        self.usage = usage
+        self.count = 0
+        self.data = np.zeros((0, INSTANCE_FLOATS), np.float32)
+
+    def update(self, positions, yaw, pitch=0.0, tint=1.0):
+        count = len(positions)
+        if len(self.data) != count:
+            self.data = np.empty((count, INSTANCE_FLOATS), np.float32)
+
+        self.data[:, 0:3] = positions
+        self.data[:, 3] = yaw
+        self.data[:, 4] = pitch
+        self.data[:, 5:8] = tint
+        self.count = count
+
+        # glBufferData con el tamaño completo deja que el driver descarte el búfer anterior sin esperar a la GPU
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.data, self.usage)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def bind(self):
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+
+        for location, size, offset in INSTANCE_ATTRIBUTES:
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, INSTANCE_STRIDE, ctypes.c_void_p(offset))
+            glVertexAttribDivisor(location, 1)
+
+    def unbind(self):
+        for location, _, _ in INSTANCE_ATTRIBUTES:
+            glVertexAttribDivisor(location, 0)
+            glDisableVertexAttribArray(location)
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        if self.vbo:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = 0
+
+
+class InstancedBatch:
+    """Una StaticMesh con su InstanceBuffer, como geometría de un elemento de RenderQueue."""
+
+    def __init__(self, mesh, instances):
+        self.mesh = mesh
+        self.instances = instances
+
+    def bind_arrays(self):
+        self.mesh.bind_arrays()
+        self.instances.bind()
+
+    def point_arrays(self):
+        self.mesh.point_arrays()
+        self.instances.bind()
+
+    def unbind_arrays(self):
+        self.instances.unbind()
+        self.mesh.unbind_arrays()
+
+
+class InstancedRenderer:
+    """Dibuja una StaticMesh una vez por instancia con un glDrawArraysInstanced por textura."""
+
+    def __init__(self):
+        self.program = link_program(VERTEX_SHADER, FRAGMENT_SHADER, {
+            'instance_pose': POSE_LOCATION, 'instance_pitch': PITCH_LOCATION, 'instance_tint': TINT_LOCATION,
+        })
+        self.uniforms = uniform_locations(self.program, ('lighting', 'tinted', 'billboard', 'camera_position',
+                                                         'texture', 'textured', 'alpha_cutoff'))
+
+        glUseProgram(self.program)
+        glUniform1i(self.uniforms['texture'], 0)
+        glUseProgram(0)
+
+    def set_uniform(self, name, value):
+        # Con el programa ya en uso
+        if name == 'camera_position':
+            glUniform3f(self.uniforms[name], *value)
+        elif name == 'alpha_cutoff':
+            glUniform1f(self.uniforms[name], value)
+        else:
+            glUniform1i(self.uniforms[name], int(value))
+
+    def uniform_values(self, lighting, tinted, camera_position, alpha_cutoff):
+        # Con camera_position (en coordenadas del mundo) la malla se dibuja como billboard
+        values = {'lighting': lighting, 'tinted': tinted, 'billboard': camera_position is not None,
+                  'alpha_cutoff': alpha_cutoff}
+        if camera_position is not None:
+            values['camera_position'] = tuple(float(c) for c in camera_position)
+        return values
+
+    def draw(self, mesh, instances, lighting=True, tinted=False, camera_position=None, alpha_cutoff=0.0):
+        if not mesh.vertex_count or not instances.count:
+            return
+
+        glUseProgram(self.program)
+        for name, value in self.uniform_values(lighting, tinted, camera_position, alpha_cutoff).items():
+            self.set_uniform(name, value)
+
+        mesh.bind_arrays()
+        instances.bind()
+
+        for tex_id, first, count in mesh.ranges:
+            glBindTexture(GL_TEXTURE_2D, tex_id or 0)
+            glUniform1i(self.uniforms['textured'], int(bool(tex_id)))
+            glDrawArraysInstanced(mesh.primitive, first, count, instances.count)
+
+        instances.unbind()
+        mesh.unbind_arrays()
+
+        glUseProgram(0)
+
+    def submit(self, queue, mesh, instances, state, tinted=False, camera_position=None, alpha_cutoff=0.0):
+        # Como draw(), pero en una RenderQueue: un elemento por textura. La iluminación sale de state.lighting
+        if not mesh.vertex_count or not instances.count:
+            return
+
+        batch = InstancedBatch(mesh, instances)
+        values = self.uniform_values(state.lighting, tinted, camera_position, alpha_cutoff)
+
+        for tex_id, first, count in mesh.ranges:
+            queue.submit(lambda first=first, count=count: glDrawArraysInstanced(mesh.primitive, first, count,
+                                                                                instances.count),
+                         state._replace(program=self.program, texture=tex_id or 0), batch,
+                         shader=self, uniforms=dict(values, textured=bool(tex_id)), geometry_key=(mesh, instances))
+
+    def delete(self):
+        if self.program:
+            glDeleteProgram(self.program)
+            self.program = 0
+
+
+_shared_renderer = None
+
+
+def shared_renderer():
+    # Un solo programa por proceso para abejas y jardín; se compila la primera vez que se dibuja
+    global _shared_renderer
+
+    if _shared_renderer is None:
+        _shared_renderer = InstancedRenderer()
+    return _shared_renderer
@@ -0,0 +1,277 @@
+from OpenGL.GL import *
+import numpy as np
+import ctypes
+import hashlib
+import json
+import os
+
+from textures import write_json
+
+# Disposición intercalada de cada vértice: posición (3), normal (3), uv (2), color RGBA (4)
+VERTEX_FLOATS = 12
+VERTEX_STRIDE = VERTEX_FLOATS * 4
+
+POS_OFFSET = 0
+NORMAL_OFFSET = 3 * 4
+UV_OFFSET = 6 * 4
+COLOR_OFFSET = 8 * 4
+
+# Mismo orden de esquinas, caras y normales que draw_cube
+CUBE_CORNERS = np.array([
+    (-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1),
+    (-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1)
+], np.float32) * 0.5
+
+CUBE_FACES = np.array([
+    (0, 3, 2, 1), (4, 7, 6, 5), (0, 4, 5, 1),
+    (3, 7, 6, 2), (1, 2, 6, 5), (0, 3, 7, 4)
+])
+
+CUBE_NORMALS = np.array([
+    (0.0, 0.0, 1.0), (0.0, 0.0, -1.0), (0.0, -1.0, 0.0),
+    (0.0, 1.0, 0.0), (1.0, 0.0, 0.0), (-1.0, 0.0, 0.0)
+], np.float32)
+
+QUAD_TEX_COORDS = np.array([(0, 0), (1, 0), (1, 1), (0, 1)], np.float32)
+
+# Mallas horneadas reutilizadas entre arranques, por hash del modelo y de las texturas que usan.
+# MESH_CACHE_VERSION entra en la clave: hay que subirlo si cambia cómo se generan las mallas.
+MESH_CACHE_DIR = ".mesh_cache"
+MESH_CACHE_VERSION = 1
+
+# Tamaño máximo de MESH_CACHE_DIR; al pasarlo se borran las mallas usadas hace más tiempo
+MESH_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Si este proceso ya recortó la caché; se hace una vez, al guardar su primera malla
+mesh_cache_trimmed = False
+
+# Nombre con que se guarda el id del atlas en los rangos de una malla en caché
+ATLAS_TEXTURE = '@atlas'
+
+
+def resolve_face_texture(texture_id, face_index):
+    # Misma regla que draw_cube: un id único o un dict {cara: id, 'default': id}
+    if isinstance(texture_id, dict):
+        return texture_id.get(face_index, texture_id.get('default'))
+    return texture_id or None
+
+
+class MeshBuilder:
+    """Acumula cubos con la firma de draw_cube y los agrupa por textura.
+
+    Con un atlas, texture_id son claves de TEXTURES y todo el modelo queda en una sola textura.
+    """
+
+    def __init__(self, atlas=None):
+        self.batches = {}
+        self.atlas = atlas
+
+    def add_cube(self, center_x, center_y, center_z, size, color=None, texture_id=None, texture_repeat=1):
+        base_color = color if color else (1.0, 1.0, 1.0)
+        rgba = tuple(base_color) + (1.0,) * (4 - len(base_color))
+
+        corners = CUBE_CORNERS * size + np.array((center_x, center_y, center_z), np.float32)
+
+        for i, face in enumerate(CUBE_FACES):
+            current_tex_id = resolve_face_texture(texture_id, i)
+
+            face_data = np.empty((4, VERTEX_FLOATS), np.float32)
+            face_data[:, 0:3] = corners[face]
+            face_data[:, 3:6] = CUBE_NORMALS[i]
+
+            if self.atlas is not None:
+                # El atlas no admite repeticiones: la región se estira sobre la cara completa
+                region = self.atlas.region(current_tex_id)
+                if region:
+                    face_data[:, 6:8] = np.array(region[:2]) + QUAD_TEX_COORDS * np.array(region[2:])
+                else:
+                    face_data[:, 6:8] = self.atlas.white_uv()
+                current_tex_id = self.atlas.texture_id if region else None
+                batch_key = self.atlas.texture_id
+            else:
+                face_data[:, 6:8] = QUAD_TEX_COORDS * texture_repeat
+                batch_key = current_tex_id
+
+            face_data[:, 8:12] = (1.0, 1.0, 1.0, 1.0) if current_tex_id else rgba
+
+            self.batches.setdefault(batch_key, []).append(face_data)
+
+    def build(self):
+        arrays = []
+        ranges = []
+        first = 0
+
+        # Primero las caras sin textura y después agrupadas por id, para no alternar binds
+        for tex_id in sorted(self.batches, key=lambda t: (t is not None, t or 0)):
+            data = np.concatenate(self.batches[tex_id])
+            arrays.append(data)
+            ranges.append((tex_id, first, len(data)))
+            first += len(data)
+
+        if arrays:
+            vertices = np.concatenate(arrays)
+        else:
+            vertices = np.zeros((0, VERTEX_FLOATS), np.float32)
+
+        return StaticMesh(vertices, ranges)
+
+
+def texture_set(textures, atlas=None):
+    # Lo que de las texturas cambia una malla: qué texturas hay y dónde cae cada una en el atlas
+    names = tuple(sorted(name for name, tex_id in (textures or {}).items() if tex_id))
+    regions = tuple(sorted(atlas.regions.items())) if atlas is not None else None
+    return names, regions
+
+
+def texture_names(textures, atlas=None):
+    # Id de GL -> nombre; los ids pueden cambiar de un arranque a otro, los nombres no
+    names = {tex_id: name for name, tex_id in (textures or {}).items() if tex_id}
+    if atlas is not None and atlas.texture_id:
+        names[atlas.texture_id] = ATLAS_TEXTURE
+    return names
+
+
+def mesh_cache_key(*parts):
+    # Los arrays entran con su contenido completo; el resto por su repr
+    digest = hashlib.sha1(repr((MESH_CACHE_VERSION, VERTEX_FLOATS)).encode())
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(repr((part.dtype.str, part.shape)).encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode())
+    return digest.hexdigest()
+
+
+def mesh_cache_paths(key):
+    base = os.path.join(MESH_CACHE_DIR, key)
+    return base + ".npy", base + ".json"
+
+
+def trim_mesh_cache(max_bytes=MESH_CACHE_MAX_BYTES):
+    # Borra las mallas menos usadas hasta que la caché quepa en max_bytes. Cargar una malla le
+    # actualiza la fecha a su .json, así que por esa fecha se sabe cuál se usó hace más tiempo
+    entries = {}
+    try:
+        with os.scandir(MESH_CACHE_DIR) as it:
+            for entry in it:
+                key, ext = os.path.splitext(entry.name)
+                if ext not in (".npy", ".json"):
+                    continue
+                stat = entry.stat()
+                size, used = entries.get(key, (0, 0.0))
+                entries[key] = (size + stat.st_size, max(used, stat.st_mtime) if ext == ".json" else used)
+    except OSError:
+        return
+
+    total = sum(size for size, _ in entries.values())
+    for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+        if total <= max_bytes:
+            break
+        for path in mesh_cache_paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Otro proceso del pool pudo borrarla primero
+        total -= size
+
+
+def save_cached_mesh(key, vertices, ranges, stats=None, textures=None, atlas=None):
+    global mesh_cache_trimmed
+    vertices_path, meta_path = mesh_cache_paths(key)
+    names = texture_names(textures, atlas)
+
+    if not mesh_cache_trimmed:
+        mesh_cache_trimmed = True
+        trim_mesh_cache()
+
+    try:
+        os.makedirs(MESH_CACHE_DIR, exist_ok=True)
+
+        tmp_path = vertices_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(vertices, np.float32))
+        os.replace(tmp_path, vertices_path)
+
+        write_json(meta_path, {'ranges': [(names.get(tex_id), first, count) for tex_id, first, count in ranges],
+                               'stats': stats or {}})
+    except OSError as e:
+        print(f"ADVERTENCIA: No se pudo guardar la malla en caché {key}: {e}")
+
+
+def load_cached_mesh(key, textures=None, atlas=None):
+    # Los vértices se mapean desde el archivo y van directo al VBO; None si no está o no sirve
+    vertices_path, meta_path = mesh_cache_paths(key)
+    ids = {name: tex_id for tex_id, name in texture_names(textures, atlas).items()}
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        ranges = [(ids[name] if name else None, first, count) for name, first, count in meta['ranges']]
+        if ranges:
+            vertices = np.load(vertices_path, mmap_mode='r')
+        else:
+            vertices = np.zeros((0, VERTEX_FLOATS), np.float32)
+        os.utime(meta_path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return StaticMesh(vertices, ranges, stats=meta['stats'])
+
+
+class StaticMesh:
+    """Geometría horneada en un VBO; se dibuja con un glDrawArrays por textura."""
+
+    def __init__(self, vertices, ranges, primitive=GL_QUADS, stats=None):
+        self.vertex_count = len(vertices)
+        self.ranges = ranges
+        self.primitive = primitive
+        self.stats = stats or {}
+
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, np.ascontiguousarray(vertices, np.float32), GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def bind_arrays(self):
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+
+        self.point_arrays()
+
+    def point_arrays(self):
+        # Con los arrays ya activos (por otra StaticMesh), pasar a esta solo cambia los punteros
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+
+        glVertexPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(POS_OFFSET))
+        glNormalPointer(GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(NORMAL_OFFSET))
+        glTexCoordPointer(2, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(UV_OFFSET))
+        glColorPointer(4, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(COLOR_OFFSET))
+
+    def unbind_arrays(self):
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        if not self.vertex_count:
+            return
+
+        self.bind_arrays()
+
+        for tex_id, first, count in self.ranges:
+            glBindTexture(GL_TEXTURE_2D, tex_id or 0)
+            glDrawArrays(self.primitive, first, count)
+
+        self.unbind_arrays()
+
+    def delete(self):
+        if self.vbo:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = 0
@@ -0,0 +1,135 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from mesh import StaticMesh, load_cached_mesh, save_cached_mesh
+from voxels import extract_mesh, voxel_mesh_key
+
+# Tiempo por cuadro para subir mallas terminadas; las que no entran esperan al siguiente cuadro
+UPLOAD_BUDGET = 0.004
+
+
+def mesh_job(grid, textures, atlas, options, cache_key=None):
+    # Corre en un proceso del pool: malla la rejilla y deja los vértices en memoria compartida, así el
+    # array no vuelve por pickle. Devuelve (nombre del bloque, forma, rangos, estadísticas).
+    vertices, ranges, stats = extract_mesh(grid, textures, atlas=atlas, **options)
+    if cache_key is not None:
+        save_cached_mesh(cache_key, vertices, ranges, stats, textures, atlas)
+    if not len(vertices):
+        return None, vertices.shape, ranges, stats
+
+    block = shared_memory.SharedMemory(create=True, size=vertices.nbytes)
+    np.ndarray(vertices.shape, np.float32, block.buf)[:] = vertices
+    block.close()
+    return block.name, vertices.shape, ranges, stats
+
+
+def upload_mesh(result):
+    # En el hilo de GL: sube los vértices compartidos a un VBO y libera el bloque
+    name, shape, ranges, stats = result
+    if name is None:
+        return StaticMesh(np.zeros(shape, np.float32), ranges, stats=stats)
+
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return StaticMesh(np.ndarray(shape, np.float32, block.buf), ranges, stats=stats)
+    finally:
+        block.close()
+        block.unlink()
+
+
+class MeshWorkerPool:
+    """Mallado de vóxeles en procesos aparte; el hilo de GL solo sube los resultados.
+
+    submit() manda una rejilla a mallar y poll(), llamado una vez por cuadro como el de
+    AsyncTextureLoader, sube a VBOs las que ya terminaron dentro de un presupuesto de tiempo y se las
+    entrega a su callback; si el mallado falló, el error se informa y se llama a failed. Conviene
+    crearlo antes que la ventana: en Linux los procesos se crean con fork, y así no heredan el
+    contexto GL ni los hilos del cargador de texturas.
+    """
+
+    def __init__(self, workers=None):
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+        # El rastreador de memoria compartida tiene que existir antes del fork para que los
+        # procesos lo compartan; si no, cada uno daría por perdidos los bloques que crea
+        resource_tracker.ensure_running()
+
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self.pending = {}
+
+        # Un trabajo vacío arranca los procesos ahora y no en el primer submit()
+        self.executor.submit(int).result()
+
+    def submit(self, callback, grid, textures=None, atlas=None, cache=False, failed=None, **options):
+        # options son los argumentos de extract_mesh (cull, greedy, materials, colors, border). Con cache,
+        # una malla que ya está en disco se sube aquí mismo y el callback se llama sin pasar por el pool
+        cache_key = None
+        if cache:
+            cache_key = voxel_mesh_key(grid, textures, atlas, **options)
+            mesh = load_cached_mesh(cache_key, textures, atlas)
+            if mesh is not None:
+                callback(mesh)
+                return None
+
+        layout = atlas.layout() if atlas is not None else None
+        future = self.executor.submit(mesh_job, grid, textures, layout, options, cache_key)
+        self.pending[future] = (callback, failed)
+        return future
+
+    @property
+    def busy(self):
+        return bool(self.pending)
+
+    @property
+    def free_slots(self):
+        # Trabajos que conviene mandar ahora: dos por proceso bastan para que ninguno espere, y
+        # mandar miles de golpe costaría un cuadro entero solo en copiar y serializar las rejillas
+        return max(0, 2 * self.workers - len(self.pending))
+
+    def poll(self, budget=UPLOAD_BUDGET):
+        # Devuelve cuántas mallas subió en esta llamada; budget=None las sube todas
+        start = time.perf_counter()
+        uploaded = 0
+
+        for future in [f for f in self.pending if f.done()]:
+            callback, failed = self.pending.pop(future)
+            if future.cancelled():
+                continue
+
+            # El error del proceso no sale en el hilo de GL: se informa y el dueño decide si reintenta
+            error = future.exception()
+            if error is not None:
+                print(f"Error al mallar en el pool: {error!r}")
+                if failed is not None:
+                    failed()
+                continue
+
+            callback(upload_mesh(future.result()))
+            uploaded += 1
+
+            if budget is not None and time.perf_counter() - start > budget:
+                break
+
+        return uploaded
+
+    def shutdown(self):
+        for future in self.pending:
+            future.cancel()
+        self.executor.shutdown(wait=True)
+
+        # Los trabajos que terminaron sin subirse dejaron su bloque de memoria compartida
+        for future in self.pending:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                name = future.result()[0]
+                if name is not None:
+                    block = shared_memory.SharedMemory(name=name)
+                    block.close()
+                    block.unlink()
+        self.pending = {}
@@ -0,0 +1,236 @@
+from OpenGL.GL import *
+import numpy as np
+import ctypes
+
+from culling import perspective_matrix
+from mesh import COLOR_OFFSET, NORMAL_OFFSET, POS_OFFSET, UV_OFFSET, VERTEX_STRIDE
+from shaders import link_program, uniform_locations
+
+# Locations de los atributos de StaticMesh en los shaders del pipeline: (nombre, location, componentes, desplazamiento)
+VERTEX_ATTRIBUTES = (
+    ('position', 0, 3, POS_OFFSET),
+    ('normal', 1, 3, NORMAL_OFFSET),
+    ('uv', 2, 2, UV_OFFSET),
+    ('color', 3, 4, COLOR_OFFSET),
+)
+
+# Punto de enlace del bloque Frame, que comparten todos los programas del pipeline
+FRAME_BINDING = 0
+
+# Ambiente global por defecto de GL (GL_LIGHT_MODEL_AMBIENT), que el pipeline fijo suma al de GL_LIGHT0
+SCENE_AMBIENT = (0.2, 0.2, 0.2, 1.0)
+
+# Cámara y luz del cuadro, en std140: dos mat4 y tres vec4. La luz está en coordenadas del ojo, donde la
+# deja glLightfv en init_opengl() (se llama con la vista en identidad)
+FRAME_BLOCK = """
+layout(std140) uniform Frame
+{
+    mat4 view;
+    mat4 projection;
+    vec4 light_position;
+    vec4 light_ambient;
+    vec4 light_diffuse;
+};
+"""
+FRAME_FLOATS = 16 + 16 + 4 + 4 + 4
+
+VERTEX_INPUTS = """
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec3 normal;
+layout(location = 2) in vec2 uv;
+layout(location = 3) in vec4 color;
+
+uniform mat4 model;
+
+out vec4 vertex_color;
+out vec2 vertex_uv;
+"""
+
+# Vóxeles iluminados por vértice como el pipeline fijo con GL_COLOR_MATERIAL: ambiente + difusa, sin
+# especular. Los modelos solo se mueven y giran, así que mat3(vista × modelo) sirve para las normales
+LIT_VERTEX_SHADER = "#version 330 compatibility\n" + FRAME_BLOCK + VERTEX_INPUTS + """
+void main()
+{
+    vec4 eye_pos = view * model * vec4(position, 1.0);
+    gl_Position = projection * eye_pos;
+
+    vec3 eye_normal = normalize(mat3(view * model) * normal);
+    vec3 to_light = normalize(light_position.xyz - eye_pos.xyz * light_position.w);
+    vec3 lit = light_ambient.rgb * color.rgb + max(dot(eye_normal, to_light), 0.0) * light_diffuse.rgb * color.rgb;
+
+    vertex_color = vec4(clamp(lit, 0.0, 1.0), color.a);
+    vertex_uv = uv;
+}
+"""
+
+# Alas: el color del vértice tal cual, con su alfa para la mezcla
+UNLIT_VERTEX_SHADER = "#version 330 compatibility\n" + FRAME_BLOCK + VERTEX_INPUTS + """
+void main()
+{
+    gl_Position = projection * view * model * vec4(position, 1.0);
+    vertex_color = color;
+    vertex_uv = uv;
+}
+"""
+
+# Textura modulada por el color, como GL_MODULATE; la textura 0 no es completa, de ahí textured
+FRAGMENT_SHADER = """
+#version 330 compatibility
+
+uniform sampler2D texture_unit;
+uniform bool textured;
+
+in vec4 vertex_color;
+in vec2 vertex_uv;
+
+out vec4 fragment_color;
+
+void main()
+{
+    fragment_color = textured ? vertex_color * texture(texture_unit, vertex_uv) : vertex_color;
+}
+"""
+
+IDENTITY = np.eye(4, dtype=np.float32)
+
+
+class PipelineProgram:
+    """Programa GLSL del pipeline: matriz model y textura por dibujo, el resto en el bloque Frame.
+
+    uniforms son los nombres de los demás uniforms propios del programa.
+    """
+
+    def __init__(self, vertex_source, fragment_source, uniforms=()):
+        self.program = link_program(vertex_source, fragment_source,
+                                    {name: location for name, location, _, _ in VERTEX_ATTRIBUTES})
+        self.uniforms = uniform_locations(self.program, ('model', 'textured', 'texture_unit') + tuple(uniforms))
+
+        glUniformBlockBinding(self.program, glGetUniformBlockIndex(self.program, 'Frame'), FRAME_BINDING)
+
+        glUseProgram(self.program)
+        glUniform1i(self.uniforms['texture_unit'], 0)
+        glUseProgram(0)
+
+    def set_uniform(self, name, value):
+        # Con el programa ya en uso; las matrices ya vienen por columnas, como las deja submit_mesh()
+        if isinstance(value, np.ndarray):
+            glUniformMatrix4fv(self.uniforms[name], 1, GL_FALSE, value)
+        elif isinstance(value, float):
+            glUniform1f(self.uniforms[name], value)
+        else:
+            glUniform1i(self.uniforms[name], int(value))
+
+    def delete(self):
+        if self.program:
+            glDeleteProgram(self.program)
+            self.program = 0
+
+
+class FrameUniforms:
+    """Búfer de uniforms con el bloque Frame: se sube una vez por cuadro y lo leen todos los programas."""
+
+    def __init__(self):
+        self.data = np.zeros(FRAME_FLOATS, np.float32)
+
+        self.ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferData(GL_UNIFORM_BUFFER, self.data.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, FRAME_BINDING, self.ubo)
+
+    def update(self, view, projection, light_position, light_ambient, light_diffuse):
+        # Matrices de NumPy (por filas); std140 las quiere por columnas
+        self.data[0:16] = np.asarray(view).T.ravel()
+        self.data[16:32] = np.asarray(projection).T.ravel()
+        self.data[32:36] = light_position
+        self.data[36:40] = light_ambient
+        self.data[40:44] = light_diffuse
+
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self.data.nbytes, self.data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    def delete(self):
+        if self.ubo:
+            glDeleteBuffers(1, [self.ubo])
+            self.ubo = 0
+
+
+class MeshAttributes:
+    """Una StaticMesh leída por atributos genéricos, como geometría de un elemento de RenderQueue.
+
+    Todas comparten el VAO del pipeline, que ya tiene los atributos activos: pasar de una a otra
+    solo cambia el VBO y los punteros.
+    """
+
+    def __init__(self, mesh, vertex_array):
+        self.mesh = mesh
+        self.vertex_array = vertex_array
+
+    def bind_arrays(self):
+        glBindVertexArray(self.vertex_array)
+        self.point_arrays()
+
+    def point_arrays(self):
+        glBindBuffer(GL_ARRAY_BUFFER, self.mesh.vbo)
+        for _, location, size, offset in VERTEX_ATTRIBUTES:
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, VERTEX_STRIDE, ctypes.c_void_p(offset))
+
+    def unbind_arrays(self):
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+
+class ShaderPipeline:
+    """Camino programable para las StaticMesh en lugar de la luz fija de GL.
+
+    Dos programas: vóxeles iluminados y texturizados, y uno sin luz para lo translúcido (las alas).
+    Cámara y luz van en un búfer de uniforms que se sube una vez por cuadro con begin_frame(); el color
+    por vértice sale del VBO horneado, así que no hay glColor ni glLightfv por dibujo. Con
+    RenderQueue.pipeline, submit_mesh() manda aquí las mallas.
+
+    Es GLSL 330 sobre un contexto de compatibilidad: las mallas se siguen dibujando con GL_QUADS, y
+    las instancias del jardín y del enjambre (salvo con --gpu-bees, animation.py) van por el shader
+    GLSL 1.20 de InstancedRenderer, que lee las matrices y la luz del pipeline fijo; init_opengl() las
+    carga igual con --shaders.
+    """
+
+    def __init__(self, aspect, light_position, light_ambient, light_diffuse, fov_y=45.0, z_near=0.1, z_far=50.0):
+        self.lit = PipelineProgram(LIT_VERTEX_SHADER, FRAGMENT_SHADER)
+        self.unlit = PipelineProgram(UNLIT_VERTEX_SHADER, FRAGMENT_SHADER)
+        self.frame = FrameUniforms()
+
+        self.projection = perspective_matrix(fov_y, aspect, z_near, z_far)
+        self.light_position = light_position
+        self.light_ambient = np.add(SCENE_AMBIENT, light_ambient)
+        self.light_diffuse = light_diffuse
+
+        self.vertex_array = glGenVertexArrays(1)
+        glBindVertexArray(self.vertex_array)
+        for _, location, _, _ in VERTEX_ATTRIBUTES:
+            glEnableVertexAttribArray(location)
+        glBindVertexArray(0)
+
+    def begin_frame(self, view, projection=None):
+        # projection solo para dibujar desde otro punto de vista, como la luz en shadows.py
+        projection = self.projection if projection is None else projection
+        self.frame.update(view, projection, self.light_position, self.light_ambient, self.light_diffuse)
+
+    def submit_mesh(self, queue, mesh, state, matrix=None):
+        # La luz la decide el programa, así que GL_LIGHTING se deja como está y no cuenta como cambio
+        program = self.lit if state.lighting else self.unlit
+        geometry = MeshAttributes(mesh, self.vertex_array)
+        model = IDENTITY if matrix is None else np.ascontiguousarray(matrix.T, np.float32)
+
+        for tex_id, first, count in mesh.ranges:
+            queue.submit(lambda first=first, count=count: glDrawArrays(mesh.primitive, first, count),
+                         state._replace(program=program.program, texture=tex_id or 0, lighting=True), geometry,
+                         shader=program, uniforms={'model': model, 'textured': bool(tex_id)}, geometry_key=mesh)
+
+    def delete(self):
+        self.lit.delete()
+        self.unlit.delete()
+        self.frame.delete()
+        if self.vertex_array:
+            glDeleteVertexArrays(1, [self.vertex_array])
+            self.vertex_array = 0
@@ -0,0 +1,267 @@
+from contextlib import contextmanager, nullcontext
+import csv
+import functools
+import json
+import sys
+import time
+
+import numpy as np
+
+# Ventana del overlay: promedio de los últimos cuadros, refrescado cada OVERLAY_REFRESH segundos
+OVERLAY_HISTORY = 120
+OVERLAY_REFRESH = 0.5
+
+PERCENTILES = (50, 95, 99)
+
+# Módulos compartidos que emiten llamadas GL durante el cuadro
+RENDER_MODULES = ('mesh', 'textures', 'instancing', 'render', 'pipeline', 'animation', 'shadows', 'capture')
+
+
+class NullProfiler:
+    """Profiler vacío para cuando no se mide: cada fase cuesta un with sin trabajo."""
+
+    enabled = False
+
+    def begin_frame(self):
+        pass
+
+    def phase(self, name):
+        return nullcontext()
+
+    def count(self, amount=1):
+        pass
+
+    def stat(self, name, value):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def draw_overlay(self, width, height):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class FrameProfiler:
+    """Mide cada fase de display(): tiempo de pared, llamadas GL y, si se pide, tiempo de GPU.
+
+    Los tiempos de GPU usan consultas GL_TIME_ELAPSED que se leen cuadros después, cuando ya
+    están disponibles, para no detener el pipeline.
+    """
+
+    enabled = True
+
+    def __init__(self, gpu_timers=False, overlay=True):
+        self.gpu_timers = gpu_timers
+        self.overlay = overlay
+
+        self.rows = []  # (cuadro, fase, ms, llamadas GL, ms GPU o None)
+        self.frame_index = -1
+        self.frame_start = 0.0
+        self.current_calls = 0
+        self.stats = {}  # contadores del último cuadro para el overlay, p. ej. instancias visibles
+
+        self.free_queries = []
+        self.pending_queries = []
+
+        self.overlay_image = None
+        self.overlay_time = 0.0
+        self.font = None
+
+    def begin_frame(self):
+        self.frame_index += 1
+        self.frame_start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        query = self._begin_query() if self.gpu_timers else None
+        calls_before = self.current_calls
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000.0
+            if query is not None:
+                self._end_query()
+
+            row = [self.frame_index, name, elapsed, self.current_calls - calls_before, None]
+            self.rows.append(row)
+            if query is not None:
+                self.pending_queries.append((query, row))
+
+    def count(self, amount=1):
+        self.current_calls += amount
+
+    def stat(self, name, value):
+        self.stats[name] = value
+
+    def end_frame(self):
+        elapsed = (time.perf_counter() - self.frame_start) * 1000.0
+        frame_calls = sum(r[3] for r in self.rows_for_frame(self.frame_index))
+        self.rows.append([self.frame_index, 'frame', elapsed, frame_calls, None])
+
+        if self.gpu_timers:
+            self._collect_queries()
+
+    def rows_for_frame(self, frame_index):
+        rows = []
+        for row in reversed(self.rows):
+            if row[0] != frame_index:
+                break
+            rows.append(row)
+        return rows
+
+    def _begin_query(self):
+        from OpenGL.GL import GL_TIME_ELAPSED, glBeginQuery, glGenQueries
+
+        query = self.free_queries.pop() if self.free_queries else int(glGenQueries(1)[0])
+        glBeginQuery(GL_TIME_ELAPSED, query)
+        return query
+
+    def _end_query(self):
+        from OpenGL.GL import GL_TIME_ELAPSED, glEndQuery
+
+        glEndQuery(GL_TIME_ELAPSED)
+
+    def _collect_queries(self):
+        from OpenGL.GL import GL_QUERY_RESULT, GL_QUERY_RESULT_AVAILABLE, glGetQueryObjectiv, glGetQueryObjectuiv
+
+        still_pending = []
+        for query, row in self.pending_queries:
+            if glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE):
+                row[4] = glGetQueryObjectuiv(query, GL_QUERY_RESULT) / 1e6
+                self.free_queries.append(query)
+            else:
+                still_pending.append((query, row))
+        self.pending_queries = still_pending
+
+    def phase_times(self):
+        times = {}
+        for _, name, ms, calls, gpu_ms in self.rows:
+            times.setdefault(name, []).append((ms, calls, gpu_ms))
+        return times
+
+    def summary(self):
+        summary = {}
+        for name, values in self.phase_times().items():
+            ms = np.array([v[0] for v in values])
+            gpu = np.array([v[2] for v in values if v[2] is not None])
+
+            entry = {'count': len(ms), 'mean_ms': float(ms.mean()), 'gl_calls': float(np.mean([v[1] for v in values]))}
+            for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+                entry[f'p{p}_ms'] = float(value)
+            if len(gpu):
+                for p, value in zip(PERCENTILES, np.percentile(gpu, PERCENTILES)):
+                    entry[f'gpu_p{p}_ms'] = float(value)
+
+            summary[name] = entry
+        return summary
+
+    def export(self, path):
+        # El formato se elige por la extensión: .json o .csv
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump({
+                    'columns': ['frame', 'phase', 'wall_ms', 'gl_calls', 'gpu_ms'],
+                    'rows': self.rows,
+                    'summary': self.summary(),
+                }, f)
+        else:
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['frame', 'phase', 'wall_ms', 'gl_calls', 'gpu_ms'])
+                writer.writerows(self.rows)
+
+    def print_summary(self):
+        print("Fase                  p50 ms   p95 ms   p99 ms   llamadas GL")
+        for name, entry in self.summary().items():
+            print(f"{name:<20} {entry['p50_ms']:8.3f} {entry['p95_ms']:8.3f} {entry['p99_ms']:8.3f} "
+                  f"{entry['gl_calls']:10.1f}")
+
+    def overlay_lines(self):
+        # Promedios de los últimos OVERLAY_HISTORY cuadros
+        first_frame = self.frame_index - OVERLAY_HISTORY
+        recent = {}
+        for frame, name, ms, calls, gpu_ms in reversed(self.rows):
+            if frame <= first_frame:
+                break
+            recent.setdefault(name, []).append((ms, calls, gpu_ms))
+
+        lines = []
+        for name, values in recent.items():
+            line = f"{name}: {np.mean([v[0] for v in values]):.2f} ms, {np.mean([v[1] for v in values]):.0f} GL"
+            gpu = [v[2] for v in values if v[2] is not None]
+            if gpu:
+                line += f", GPU {np.mean(gpu):.2f} ms"
+            lines.append(line)
+        return sorted(lines) + [f"{name}: {value}" for name, value in self.stats.items()]
+
+    def draw_overlay(self, width, height):
+        if not self.overlay:
+            return
+
+        now = time.perf_counter()
+        if self.overlay_image is None or now - self.overlay_time > OVERLAY_REFRESH:
+            self.overlay_image = self._render_overlay(self.overlay_lines())
+            self.overlay_time = now
+
+        from OpenGL.GL import (GL_BLEND, GL_DEPTH_TEST, GL_ENABLE_BIT, GL_LIGHTING, GL_RGBA, GL_TEXTURE_2D,
+                               GL_UNSIGNED_BYTE, glDisable, glDrawPixels, glPopAttrib, glPushAttrib, glWindowPos2i)
+
+        image_width, image_height, pixels = self.overlay_image
+        if not image_width:
+            return
+
+        glPushAttrib(GL_ENABLE_BIT)
+        glDisable(GL_LIGHTING)
+        glDisable(GL_TEXTURE_2D)
+        glDisable(GL_DEPTH_TEST)
+        glDisable(GL_BLEND)
+
+        glWindowPos2i(8, max(0, height - image_height - 8))
+        glDrawPixels(image_width, image_height, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+
+        glPopAttrib()
+
+    def _render_overlay(self, lines):
+        import pygame
+
+        if not lines:
+            return 0, 0, b''
+
+        if self.font is None:
+            pygame.font.init()
+            self.font = pygame.font.Font(None, 18)
+
+        rendered = [self.font.render(line, True, (255, 255, 255), (0, 0, 0)) for line in lines]
+        surface = pygame.Surface((max(r.get_width() for r in rendered), sum(r.get_height() for r in rendered)))
+        y = 0
+        for r in rendered:
+            surface.blit(r, (0, y))
+            y += r.get_height()
+
+        return surface.get_width(), surface.get_height(), pygame.image.tostring(surface, 'RGBA', True)
+
+
+def install_gl_counter(profiler, scene_module):
+    # Envuelve las funciones gl*/glu* que la escena y los módulos de render importaron con
+    # 'from OpenGL.GL import *'; las llamadas del propio profiler no se cuentan
+    modules = [scene_module] + [sys.modules[name] for name in RENDER_MODULES if name in sys.modules]
+
+    for module in modules:
+        for name, value in list(vars(module).items()):
+            if name.startswith('gl') and callable(value) and not getattr(value, '_counted', False):
+                setattr(module, name, counted_call(profiler, value))
+
+
+def counted_call(profiler, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        profiler.count()
+        return function(*args, **kwargs)
+
+    wrapper._counted = True
+    return wrapper
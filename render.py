@@ -0,0 +1,317 @@
+from typing import NamedTuple
+
+from OpenGL.GL import *
+from OpenGL.GLU import *
+import numpy as np
+
+from culling import camera_frustum, camera_matrix, camera_position
+from pipeline import ShaderPipeline
+
+# Capas en orden de dibujo: el fondo sin profundidad (la sombra fija de los contextos sin mapas de sombra),
+# lo opaco, la sombra encima (necesita su profundidad) y al final lo translúcido
+BACKGROUND = 0
+OPAQUE = 1
+SHADOWS = 2
+TRANSPARENT = 3
+
+LIGHT_AMBIENT = (0.1, 0.1, 0.1, 1.0)
+LIGHT_DIFFUSE = (1.0, 1.0, 1.0, 1.0)
+LIGHT_SPECULAR = (1.0, 1.0, 1.0, 1.0)
+CLEAR_COLOR = (0.53, 0.81, 0.98, 1.0)
+
+# Textura que no se sabe cuál es, p. ej. tras un dibujo inmediato que liga las suyas
+UNKNOWN_TEXTURE = -1
+
+
+class RenderState(NamedTuple):
+    """Estado GL que necesita un elemento; los campos van en el orden en que se ordena el cuadro."""
+
+    layer: int = OPAQUE
+    program: int = 0
+    texture: int = 0
+    blend: bool = False
+    lighting: bool = True
+    depth_test: bool = True
+
+
+# Estado que deja init_opengl() y al que vuelve cada flush()
+DEFAULT_STATE = RenderState()
+
+# El pase de sombra (shadows.py) oscurece con mezcla alfa lo opaco ya dibujado, sin luz ni profundidad
+SHADOW_STATE = RenderState(SHADOWS, blend=True, lighting=False, depth_test=False)
+
+# La sombra fija (QuadShadow) se pinta plana, sin luz ni profundidad, antes que todo lo demás
+QUAD_SHADOW_STATE = RenderState(BACKGROUND, lighting=False, depth_test=False)
+
+# Alas: mezcla alfa sin iluminar, después de todo lo opaco
+WING_STATE = RenderState(TRANSPARENT, blend=True, lighting=False)
+
+
+class RenderQueue:
+    """Lista de dibujo de un cuadro, ordenada por estado antes de mandarla a GL.
+
+    Las escenas añaden elementos en el orden que quieran con submit() y submit_mesh(); flush() los
+    ordena por capa, programa, textura y mezcla y solo toca el estado GL que cambia de un elemento al
+    siguiente. Con el mismo estado se agrupan por geometría, para no volver a apuntar los arrays de
+    vértices, y los empates conservan el orden en que se añadieron.
+
+    Con un ShaderPipeline en pipeline, submit_mesh() dibuja las mallas con sus programas GLSL.
+    """
+
+    def __init__(self, pipeline=None):
+        self.pipeline = pipeline
+        self.items = []
+        self.geometry_order = {}
+        self.drawn = 0
+        self.state_changes = 0
+
+    def submit(self, draw, state=DEFAULT_STATE, geometry=None, matrix=None, shader=None, uniforms=None,
+               geometry_key=None):
+        # draw() solo emite geometría. geometry, si la hay, tiene bind_arrays()/point_arrays()/unbind_arrays();
+        # matrix es una 4×4 de NumPy que se multiplica sobre la cámara; shader.set_uniform() recibe uniforms
+        order = 0
+        if geometry is not None:
+            key = geometry if geometry_key is None else geometry_key
+            order = self.geometry_order.setdefault(key, len(self.geometry_order) + 1)
+
+        if matrix is not None:
+            matrix = np.ascontiguousarray(matrix.T, np.float32)
+
+        self.items.append((state, order, len(self.items), draw, geometry, matrix, shader, uniforms))
+
+    def submit_mesh(self, mesh, state=DEFAULT_STATE, matrix=None):
+        # Un elemento por rango de la StaticMesh, con la textura del rango en el estado
+        if self.pipeline is not None:
+            self.pipeline.submit_mesh(self, mesh, state, matrix)
+            return
+
+        for tex_id, first, count in mesh.ranges:
+            self.submit(lambda first=first, count=count: glDrawArrays(mesh.primitive, first, count),
+                        state._replace(texture=tex_id or 0), mesh, matrix)
+
+    def flush(self):
+        items = sorted(self.items, key=lambda item: item[:3])
+        self.items = []
+        self.geometry_order = {}
+
+        current = DEFAULT_STATE._replace(texture=UNKNOWN_TEXTURE)
+        bound = None
+        bound_order = 0
+        uniforms = {}
+        changes = 0
+
+        for state, order, _, draw, geometry, matrix, shader, values in items:
+            if state != current:
+                changes += apply_state(state, current)
+                current = state
+
+            # Los elementos de una misma geometría comparten order aunque traigan otro envoltorio
+            if order != bound_order:
+                if bound is not None and type(bound) is type(geometry):
+                    geometry.point_arrays()
+                else:
+                    if bound is not None:
+                        bound.unbind_arrays()
+                    if geometry is not None:
+                        geometry.bind_arrays()
+                bound, bound_order = geometry, order
+
+            if values:
+                # Los uniforms se quedan en el programa: solo se mandan los que cambian
+                applied = uniforms.setdefault(state.program, {})
+                for name, value in values.items():
+                    if name not in applied or not same_value(applied[name], value):
+                        shader.set_uniform(name, value)
+                        applied[name] = value
+
+            if matrix is not None:
+                glPushMatrix()
+                glMultMatrixf(matrix)
+                draw()
+                glPopMatrix()
+            else:
+                draw()
+
+            if geometry is None:
+                current = current._replace(texture=UNKNOWN_TEXTURE)
+
+        if bound is not None:
+            bound.unbind_arrays()
+        changes += apply_state(DEFAULT_STATE, current)
+
+        self.drawn = len(items)
+        self.state_changes = changes
+
+
+def same_value(a, b):
+    # Las matrices solo se dan por iguales si son el mismo array, como IDENTITY o la de un mismo elemento
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return a is b
+    return a == b
+
+
+def apply_state(state, current):
+    # Cambia solo lo que difiere de current y devuelve cuántos cambios hizo
+    changes = 0
+
+    if state.program != current.program:
+        glUseProgram(state.program)
+        changes += 1
+
+    if state.texture != current.texture:
+        glBindTexture(GL_TEXTURE_2D, max(state.texture, 0))
+        changes += 1
+
+    for enabled, was_enabled, capability in ((state.blend, current.blend, GL_BLEND),
+                                             (state.lighting, current.lighting, GL_LIGHTING),
+                                             (state.depth_test, current.depth_test, GL_DEPTH_TEST)):
+        if enabled != was_enabled:
+            (glEnable if enabled else glDisable)(capability)
+            changes += 1
+
+    return changes
+
+
+def flush_frame(queue, profiler):
+    with profiler.phase('flush'):
+        queue.flush()
+
+    profiler.stat('elementos / cambios de estado', f"{queue.drawn} / {queue.state_changes}")
+
+
+class OrbitCamera:
+    """Cámara que gira alrededor del origen: rotación en X e Y más la distancia."""
+
+    def __init__(self, rot_x=45.0, rot_y=45.0, zoom=15.0):
+        self.rot_x = rot_x
+        self.rot_y = rot_y
+        self.zoom = zoom
+
+    def apply(self):
+        glTranslatef(0.0, 0.0, -self.zoom)
+        glRotatef(self.rot_x, 1, 0, 0)
+        glRotatef(self.rot_y, 0, 1, 0)
+
+    def orbit(self, dx, dy):
+        # Arrastre del ratón en píxeles
+        self.rot_y += dx * 0.2
+        self.rot_x = max(-90, min(90, self.rot_x + dy * 0.2))
+
+    def dolly(self, step):
+        self.zoom = max(5.0, min(40.0, self.zoom + step))
+
+    def view_matrix(self):
+        return camera_matrix(self.zoom, self.rot_x, self.rot_y)
+
+    def position(self):
+        return camera_position(self.zoom, self.rot_x, self.rot_y)
+
+    def frustum(self, aspect, fov_y, near, far):
+        return camera_frustum(self.zoom, self.rot_x, self.rot_y, aspect, fov_y, near, far)
+
+
+def init_opengl(width, height, light_pos, fov_y=45.0, z_near=0.1, z_far=50.0, shaders=False):
+    # Con shaders devuelve el ShaderPipeline para la RenderQueue de la escena; sin ellos, None
+    glEnable(GL_DEPTH_TEST)
+    glDepthFunc(GL_LESS)
+
+    glEnable(GL_LIGHTING)
+    glEnable(GL_LIGHT0)
+
+    glLightfv(GL_LIGHT0, GL_AMBIENT, LIGHT_AMBIENT)
+    glLightfv(GL_LIGHT0, GL_DIFFUSE, LIGHT_DIFFUSE)
+    glLightfv(GL_LIGHT0, GL_SPECULAR, LIGHT_SPECULAR)
+    glLightfv(GL_LIGHT0, GL_POSITION, light_pos)
+
+    glEnable(GL_COLOR_MATERIAL)
+    glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE)
+
+    # La mezcla solo se activa para lo translúcido, pero siempre con la misma función
+    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+    # Textura 0 equivale a sin textura, así que GL_TEXTURE_2D queda siempre activo
+    glEnable(GL_TEXTURE_2D)
+
+    glMatrixMode(GL_PROJECTION)
+    gluPerspective(fov_y, (width / height), z_near, z_far)
+    glMatrixMode(GL_MODELVIEW)
+
+    glClearColor(*CLEAR_COLOR)
+
+    if shaders:
+        return ShaderPipeline(width / height, light_pos, LIGHT_AMBIENT, LIGHT_DIFFUSE, fov_y, z_near, z_far)
+    return None
+
+
+def begin_frame(camera, queue):
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    glLoadIdentity()
+    camera.apply()
+
+    if queue.pipeline is not None:
+        queue.pipeline.begin_frame(camera.view_matrix())
+
+
+def draw_cube(center_x, center_y, center_z, size, color=None, texture_id=None, texture_repeat=1):
+    half = size / 2.0
+
+    vertices = [
+        (center_x - half, center_y - half, center_z + half), (center_x + half, center_y - half, center_z + half),
+        (center_x + half, center_y + half, center_z + half), (center_x - half, center_y + half, center_z + half),
+        (center_x - half, center_y - half, center_z - half), (center_x + half, center_y - half, center_z - half),
+        (center_x + half, center_y + half, center_z - half), (center_x - half, center_y + half, center_z - half)
+    ]
+
+    faces = [
+        (0, 3, 2, 1),  # Cara Frontal
+        (4, 7, 6, 5),  # Cara Trasera
+        (0, 4, 5, 1),  # Cara Inferior (Base)
+        (3, 7, 6, 2),  # Cara Superior (Tapa) <- Índice 3
+        (1, 2, 6, 5),  # Cara Derecha
+        (0, 3, 7, 4)  # Cara Izquierda
+    ]
+
+    normals = [
+        (0.0, 0.0, 1.0), (0.0, 0.0, -1.0), (0.0, -1.0, 0.0),
+        (0.0, 1.0, 0.0), (1.0, 0.0, 0.0), (-1.0, 0.0, 0.0)
+    ]
+
+    scaled_tex_coords = [
+        (0, 0),
+        (texture_repeat, 0),
+        (texture_repeat, texture_repeat),
+        (0, texture_repeat)
+    ]
+
+    base_color = color if color else (1.0, 1.0, 1.0)
+
+    for i, face in enumerate(faces):
+        current_tex_id = None
+
+        if isinstance(texture_id, dict):
+            current_tex_id = texture_id.get(i, texture_id.get('default'))
+        elif texture_id:
+            current_tex_id = texture_id
+
+        if current_tex_id:
+            glBindTexture(GL_TEXTURE_2D, current_tex_id)
+            glColor3f(1.0, 1.0, 1.0)
+            use_texture = True
+        else:
+            glBindTexture(GL_TEXTURE_2D, 0)
+
+            if color and len(color) == 4:
+                glColor4fv(color)
+            else:
+                glColor3fv(base_color)
+
+            use_texture = False
+
+        glBegin(GL_QUADS)
+        glNormal3fv(normals[i])
+
+        for j, vertex_index in enumerate(face):
+            if use_texture:
+                glTexCoord2fv(scaled_tex_coords[j])
+            glVertex3fv(vertices[vertex_index])
+        glEnd()
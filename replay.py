@@ -0,0 +1,154 @@
+import json
+import os
+import time
+
+import numpy as np
+import pygame
+from pygame.locals import MOUSEBUTTONDOWN, MOUSEBUTTONUP, MOUSEMOTION
+
+from simulation import ManualClock
+
+REPLAY_VERSION = 1
+
+# Eventos que mueven la cámara (los que atiende MouseOrbit); el resto no cambia lo que se dibuja
+CAMERA_EVENTS = (MOUSEBUTTONDOWN, MOUSEBUTTONUP, MOUSEMOTION)
+
+# Un evento por fila: cuadro en que llegó, tipo (índice en CAMERA_EVENTS), botón y posición en la ventana
+EVENT_DTYPE = np.dtype([('frame', '<u4'), ('type', 'u1'), ('button', 'u1'), ('x', '<i2'), ('y', '<i2')])
+
+
+def scene_name(scene):
+    # El módulo de la escena puede ser __main__; el nombre sale del archivo
+    return os.path.splitext(os.path.basename(scene.__file__))[0]
+
+
+class InputRecording:
+    """Sesión grabada: la escena y sus opciones, la cámara y la simulación al empezar, y por cuadro
+    el tiempo transcurrido y los eventos del ratón que llegaron.
+
+    Se guarda como un .npz comprimido: un encabezado JSON, la duración de cada cuadro en float64 (la
+    marca de tiempo de un evento es la suma hasta su cuadro) y la tabla de eventos con EVENT_DTYPE.
+    """
+
+    def __init__(self, header, frame_times, events):
+        self.header = header
+        self.frame_times = np.asarray(frame_times, np.float64)
+        self.events = np.asarray(events, EVENT_DTYPE)
+
+        # Primer evento de cada cuadro; los eventos ya vienen ordenados por cuadro
+        self.first_event = np.searchsorted(self.events['frame'], np.arange(len(self.frame_times) + 1))
+
+    def __len__(self):
+        return len(self.frame_times)
+
+    @property
+    def scene(self):
+        return self.header['scene']
+
+    @property
+    def options(self):
+        return self.header['options']
+
+    @property
+    def duration(self):
+        return float(self.frame_times.sum())
+
+    def frame_events(self, index):
+        start, end = self.first_event[index], self.first_event[index + 1]
+        return [pygame.event.Event(CAMERA_EVENTS[row['type']],
+                                   {'button': int(row['button']), 'pos': (int(row['x']), int(row['y']))})
+                for row in self.events[start:end]]
+
+    def save(self, path):
+        # Con el archivo abierto, savez no le agrega la extensión .npz
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, header=np.array(json.dumps(self.header)), frame_times=self.frame_times,
+                                events=self.events)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            header = json.loads(str(data['header']))
+            if header.get('version') != REPLAY_VERSION:
+                raise ValueError(f"'{path}' es de otra versión de grabación ({header.get('version')})")
+            return cls(header, data['frame_times'], data['events'])
+
+
+def clock_state(sim_clock):
+    if sim_clock is None:
+        return None
+    return {'hz': sim_clock.hz, 'time': sim_clock.time + sim_clock.accumulator}
+
+
+class InputRecorder:
+    """Graba los eventos del bucle con ventana para repetirlos después con InputReplay.
+
+    El reloj de la simulación pasa a un ManualClock que avanza, cuadro a cuadro, el tiempo de pared
+    medido: la abeja vuela igual que sin grabar y esos mismos tiempos quedan en el archivo.
+    """
+
+    def __init__(self, path, scene, options):
+        self.path = path
+        self.header = {'version': REPLAY_VERSION, 'scene': scene_name(scene), 'options': options,
+                       'size': [scene.WINDOW_WIDTH, scene.WINDOW_HEIGHT]}
+        self.frame_times = []
+        self.events = []
+        self.clock = ManualClock()
+        self.last_time = None
+
+    def begin(self, camera, sim_clock=None):
+        self.header['camera'] = [camera.rot_x, camera.rot_y, camera.zoom]
+        self.header['simulation'] = clock_state(sim_clock)
+        if sim_clock is not None:
+            sim_clock.clock = self.clock
+
+    def record_frame(self, events):
+        # Antes de dibujar el cuadro: avanza el reloj de la simulación y guarda lo que movió la cámara
+        now = time.perf_counter()
+        elapsed = 0.0 if self.last_time is None else now - self.last_time
+        self.last_time = now
+        self.clock.tick(elapsed)
+
+        frame = len(self.frame_times)
+        self.frame_times.append(elapsed)
+        for event in events:
+            if event.type in CAMERA_EVENTS:
+                x, y = event.pos
+                self.events.append((frame, CAMERA_EVENTS.index(event.type), getattr(event, 'button', 0), x, y))
+
+    def close(self):
+        recording = InputRecording(self.header, self.frame_times, self.events)
+        recording.save(self.path)
+        return recording
+
+
+class InputReplay:
+    """Repite una InputRecording: misma cámara inicial, mismos eventos y mismo tiempo en cada cuadro.
+
+    Sirve igual para la ventana que sin ella; lo que no depende de la entrada (el render) puede
+    cambiar entre corridas, así dos versiones se comparan sobre el mismo recorrido.
+    """
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.clock = ManualClock()
+
+    def __len__(self):
+        return len(self.recording)
+
+    def begin(self, camera, sim_clock=None):
+        camera.rot_x, camera.rot_y, camera.zoom = self.recording.header['camera']
+
+        state = self.recording.header['simulation']
+        if sim_clock is not None:
+            sim_clock.clock = self.clock
+            if state is not None:
+                if state['hz'] != sim_clock.hz:
+                    print(f"ADVERTENCIA: grabado a {state['hz']} Hz de simulación y la escena va a {sim_clock.hz} Hz")
+                sim_clock.seek(state['time'])
+                sim_clock.last_time = None
+
+    def replay_frame(self, index):
+        # Avanza el reloj lo que duró el cuadro grabado y devuelve sus eventos
+        self.clock.tick(self.recording.frame_times[index])
+        return self.recording.frame_events(index)
@@ -0,0 +1,46 @@
+from OpenGL.GL import *
+
+
+class ShaderError(RuntimeError):
+    pass
+
+
+def compile_shader(source, shader_type):
+    shader = glCreateShader(shader_type)
+    glShaderSource(shader, source)
+    glCompileShader(shader)
+
+    if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+        log = glGetShaderInfoLog(shader).decode(errors='replace')
+        glDeleteShader(shader)
+        raise ShaderError(f"No se pudo compilar el shader:\n{log}")
+
+    return shader
+
+
+def link_program(vertex_source, fragment_source, attributes=None):
+    # attributes = {nombre: location}; se fijan antes de enlazar para no chocar con gl_Vertex (location 0)
+    program = glCreateProgram()
+    shaders = [compile_shader(vertex_source, GL_VERTEX_SHADER), compile_shader(fragment_source, GL_FRAGMENT_SHADER)]
+    for shader in shaders:
+        glAttachShader(program, shader)
+
+    for name, location in (attributes or {}).items():
+        glBindAttribLocation(program, location, name)
+
+    glLinkProgram(program)
+
+    for shader in shaders:
+        glDetachShader(program, shader)
+        glDeleteShader(shader)
+
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        log = glGetProgramInfoLog(program).decode(errors='replace')
+        glDeleteProgram(program)
+        raise ShaderError(f"No se pudo enlazar el programa:\n{log}")
+
+    return program
+
+
+def uniform_locations(program, names):
+    return {name: glGetUniformLocation(program, name) for name in names}
@@ -0,0 +1,362 @@
+from functools import partial
+
+from OpenGL.GL import *
+import numpy as np
+
+from culling import look_at_matrix, orthographic_matrix, perspective_matrix
+from mesh import VERTEX_FLOATS, StaticMesh
+from render import QUAD_SHADOW_STATE, SHADOW_STATE, RenderQueue
+from shaders import link_program, uniform_locations
+
+# Resolución de cada capa: la estática cubre todo el escenario; la dinámica, solo por donde vuelan las abejas
+STATIC_MAP_SIZE = 2048
+DYNAMIC_MAP_SIZE = 512
+
+# Cuánto oscurece la sombra lo que ya se dibujó (alfa del negro que se mezcla encima)
+SHADOW_STRENGTH = 0.5
+
+# Desplazamiento de profundidad al dibujar desde la luz, para que una cara no se haga sombra a sí misma
+POLYGON_OFFSET = (2.0, 4.0)
+
+# Unidades de textura del pase de sombra; la 0 es de las mallas y la 1 del FlightPath (animation.py)
+DEPTH_UNIT = 2
+STATIC_UNIT = 3
+DYNAMIC_UNIT = 4
+
+# De [-1, 1] (recorte) a [0, 1] (textura y profundidad)
+BIAS_MATRIX = np.array([
+    [0.5, 0.0, 0.0, 0.5],
+    [0.0, 0.5, 0.0, 0.5],
+    [0.0, 0.0, 0.5, 0.5],
+    [0.0, 0.0, 0.0, 1.0],
+])
+
+# Un triángulo que tapa la pantalla, sin atributos: las esquinas salen de gl_VertexID
+MASK_VERTEX_SHADER = """
+#version 330 core
+
+out vec2 screen_uv;
+
+void main()
+{
+    vec2 corner = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+    screen_uv = corner;
+    gl_Position = vec4(corner * 2.0 - 1.0, 0.0, 1.0);
+}
+"""
+
+# Cada píxel va de la pantalla (con la profundidad del cuadro) directo a las coordenadas de cada capa, con
+# la inversa de la cámara ya multiplicada en su matriz. El muestreo lineal de un sampler2DShadow ya
+# promedia 2×2 comparaciones y suaviza el borde; la capa dinámica solo se mira dentro de su mapa
+MASK_FRAGMENT_SHADER = """
+#version 330 core
+
+uniform sampler2D scene_depth;
+uniform sampler2DShadow static_map;
+uniform sampler2DShadow dynamic_map;
+uniform mat4 static_matrix;
+uniform mat4 dynamic_matrix;
+uniform float strength;
+
+in vec2 screen_uv;
+
+out vec4 fragment_color;
+
+vec3 map_coords(mat4 matrix, vec4 screen)
+{
+    vec4 coords = matrix * screen;
+    return coords.xyz / coords.w;
+}
+
+void main()
+{
+    float depth = texture(scene_depth, screen_uv).r;
+    if (depth == 1.0)
+        discard;
+
+    vec4 screen = vec4(vec3(screen_uv, depth) * 2.0 - 1.0, 1.0);
+    vec3 coords = map_coords(static_matrix, screen);
+    float light = texture(static_map, vec3(coords.xy, min(coords.z, 1.0)));
+
+    coords = map_coords(dynamic_matrix, screen);
+    if (light > 0.0 && all(greaterThan(coords.xy, vec2(0.0))) && all(lessThan(coords.xy, vec2(1.0))))
+        light = min(light, texture(dynamic_map, vec3(coords.xy, min(coords.z, 1.0))));
+
+    fragment_color = vec4(0.0, 0.0, 0.0, strength * (1.0 - light));
+}
+"""
+
+
+def box_corners(low, high):
+    # Las 8 esquinas de la caja, en coordenadas homogéneas
+    return np.array([[x, y, z, 1.0] for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])])
+
+
+def light_matrices(direction, low, high):
+    # Vista y proyección ortográfica desde la luz, ajustadas a la caja (low, high) del mundo
+    low, high = np.asarray(low, np.float64), np.asarray(high, np.float64)
+    center = (low + high) / 2.0
+    reach = float(np.linalg.norm(high - low)) + 1.0
+
+    up = (0.0, 0.0, 1.0) if abs(direction[1]) > 0.99 else (0.0, 1.0, 0.0)
+    view = look_at_matrix(center + direction * reach, center, up)
+
+    eye = box_corners(low, high) @ view.T
+    (left, bottom, near), (right, top, far) = eye[:, :3].min(axis=0), eye[:, :3].max(axis=0)
+
+    # En la vista la luz mira hacia -Z: lo más cercano tiene la Z más alta. Con un margen, para que el
+    # desplazamiento de POLYGON_OFFSET no saque nada del rango de profundidad
+    return view, orthographic_matrix(left, right, bottom, top, -far - 0.5, -near + 0.5)
+
+
+class ShadowLayer:
+    """Mapa de profundidad visto desde la luz, en una textura que compara al muestrearse."""
+
+    def __init__(self, size):
+        self.size = size
+        self.matrix = BIAS_MATRIX
+        self.bounds = None
+
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_DEPTH_COMPONENT24, size, size, 0, GL_DEPTH_COMPONENT, GL_FLOAT, None)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+
+        # Fuera del mapa la profundidad es 1: ahí nada hace sombra
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
+        glTexParameterfv(GL_TEXTURE_2D, GL_TEXTURE_BORDER_COLOR, (1.0, 1.0, 1.0, 1.0))
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_COMPARE_MODE, GL_COMPARE_REF_TO_TEXTURE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_COMPARE_FUNC, GL_LEQUAL)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        self.framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_TEXTURE_2D, self.texture, 0)
+        glDrawBuffer(GL_NONE)
+        glReadBuffer(GL_NONE)
+        glClear(GL_DEPTH_BUFFER_BIT)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+    def render(self, queue, direction, bounds, submit):
+        # submit(queue) añade lo que hace sombra; se dibuja con la cámara en la luz, sin color
+        view, projection = light_matrices(direction, *bounds)
+        self.matrix = BIAS_MATRIX @ projection @ view
+        self.bounds = bounds
+
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glViewport(0, 0, self.size, self.size)
+        glClear(GL_DEPTH_BUFFER_BIT)
+
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        glEnable(GL_POLYGON_OFFSET_FILL)
+        glPolygonOffset(*POLYGON_OFFSET)
+
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadMatrixf(np.ascontiguousarray(projection.T, np.float32))
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadMatrixf(np.ascontiguousarray(view.T, np.float32))
+        if queue.pipeline is not None:
+            queue.pipeline.begin_frame(view, projection)
+
+        submit(queue)
+        queue.flush()
+
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+
+        glDisable(GL_POLYGON_OFFSET_FILL)
+        glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glViewport(*viewport)
+
+    def delete(self):
+        if self.framebuffer:
+            glDeleteFramebuffers(1, [self.framebuffer])
+            glDeleteTextures([self.texture])
+            self.framebuffer = self.texture = 0
+
+
+class ShadowMapper:
+    """Sombras desde LIGHT_POS con dos mapas de profundidad y un pase a pantalla completa.
+
+    Lo estático (tierra y tulipanes) va a un mapa grande que solo se vuelve a dibujar cuando cambia su
+    clave, p. ej. al rehacer un chunk o hornear el jardín; lo que se mueve (las abejas) va cada cuadro
+    a un mapa más chico ajustado a su vuelo. Así el costo por cuadro depende de lo que se mueve, no del
+    tamaño del escenario. La luz se trata como direccional, de LIGHT_POS hacia el origen, para que el
+    mapa cubra también un jardín grande.
+
+    submit() añade a la RenderQueue de la escena un elemento entre lo opaco y lo translúcido que vuelve
+    al mundo cada píxel con la profundidad del cuadro y oscurece los que no ven la luz en alguna capa.
+    No depende de cómo se dibujó lo opaco, así que sirve igual con el pipeline fijo que con --shaders.
+    """
+
+    def __init__(self, pipeline, light_position, width, height, fov_y=45.0, z_near=0.1, z_far=50.0,
+                 static_size=STATIC_MAP_SIZE, dynamic_size=DYNAMIC_MAP_SIZE):
+        self.queue = RenderQueue(pipeline)
+        self.direction = np.asarray(light_position[:3], np.float64) / np.linalg.norm(light_position[:3])
+        self.projection = perspective_matrix(fov_y, width / height, z_near, z_far)
+        self.width = width
+        self.height = height
+
+        self.static = ShadowLayer(static_size)
+        self.dynamic = ShadowLayer(dynamic_size)
+        self.static_key = None
+        self.static_redraws = 0
+
+        self.program = link_program(MASK_VERTEX_SHADER, MASK_FRAGMENT_SHADER)
+        self.uniforms = uniform_locations(self.program, ('scene_depth', 'static_map', 'dynamic_map',
+                                                         'static_matrix', 'dynamic_matrix', 'strength'))
+        glUseProgram(self.program)
+        glUniform1i(self.uniforms['scene_depth'], DEPTH_UNIT)
+        glUniform1i(self.uniforms['static_map'], STATIC_UNIT)
+        glUniform1i(self.uniforms['dynamic_map'], DYNAMIC_UNIT)
+        glUseProgram(0)
+
+        # Copia de la profundidad del cuadro: la del framebuffer en uso no se puede muestrear
+        self.depth_texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.depth_texture)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_DEPTH_COMPONENT24, width, height, 0, GL_DEPTH_COMPONENT, GL_FLOAT, None)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        # El triángulo no tiene atributos, pero hace falta un VAO para dibujarlo
+        self.vertex_array = glGenVertexArrays(1)
+
+    def update_static(self, key, bounds, submit):
+        # Vuelve a dibujar la capa estática solo si cambió key; bounds es la caja (low, high) que cubre
+        if key == self.static_key:
+            return False
+
+        self.static.render(self.queue, self.direction, bounds, submit)
+        self.static_key = key
+        self.static_redraws += 1
+        return True
+
+    def update_dynamic(self, bounds, submit):
+        self.dynamic.render(self.queue, self.direction, bounds, submit)
+
+    def set_uniform(self, name, value):
+        # Con el programa ya en uso
+        if isinstance(value, np.ndarray):
+            glUniformMatrix4fv(self.uniforms[name], 1, GL_FALSE, value)
+        else:
+            glUniform1f(self.uniforms[name], value)
+
+    def submit(self, queue, camera):
+        # Los pases de las capas dejan la luz en el bloque Frame; se vuelve a poner la cámara
+        view = camera.view_matrix()
+        if queue.pipeline is not None:
+            queue.pipeline.begin_frame(view)
+
+        view_projection = self.projection @ view
+        inverse = np.linalg.inv(view_projection)
+        uniforms = {'strength': SHADOW_STRENGTH}
+        for name, layer in (('static_matrix', self.static), ('dynamic_matrix', self.dynamic)):
+            uniforms[name] = np.ascontiguousarray((layer.matrix @ inverse).T, np.float32)
+
+        queue.submit(partial(self.draw_mask, self.screen_rect(view_projection)),
+                     SHADOW_STATE._replace(program=self.program), shader=self, uniforms=uniforms)
+
+    def screen_rect(self, view_projection):
+        # Rectángulo de pantalla (x, y, ancho, alto) donde puede haber sombra: la caja de la capa estática
+        # proyectada, porque lo que recibe sombra es la tierra y los tulipanes. El pase cuesta por píxel,
+        # así que no se paga el cielo. None si hay que cubrir toda la pantalla
+        if self.static.bounds is None:
+            return None
+
+        clip = box_corners(*self.static.bounds) @ view_projection.T
+        if (clip[:, 3] <= 0.0).any():
+            return None
+
+        ndc = clip[:, :2] / clip[:, 3:4]
+        low = np.floor((np.clip(ndc.min(axis=0), -1.0, 1.0) + 1.0) / 2.0 * (self.width, self.height))
+        high = np.ceil((np.clip(ndc.max(axis=0), -1.0, 1.0) + 1.0) / 2.0 * (self.width, self.height))
+        return int(low[0]), int(low[1]), int(high[0] - low[0]), int(high[1] - low[1])
+
+    def draw_mask(self, rect):
+        x, y, width, height = (0, 0, self.width, self.height) if rect is None else rect
+
+        glActiveTexture(GL_TEXTURE0 + DEPTH_UNIT)
+        glBindTexture(GL_TEXTURE_2D, self.depth_texture)
+        glCopyTexSubImage2D(GL_TEXTURE_2D, 0, x, y, x, y, width, height)
+        glActiveTexture(GL_TEXTURE0 + STATIC_UNIT)
+        glBindTexture(GL_TEXTURE_2D, self.static.texture)
+        glActiveTexture(GL_TEXTURE0 + DYNAMIC_UNIT)
+        glBindTexture(GL_TEXTURE_2D, self.dynamic.texture)
+        glActiveTexture(GL_TEXTURE0)
+
+        if rect is not None:
+            glEnable(GL_SCISSOR_TEST)
+            glScissor(x, y, width, height)
+
+        glBindVertexArray(self.vertex_array)
+        glDrawArrays(GL_TRIANGLES, 0, 3)
+        glBindVertexArray(0)
+
+        if rect is not None:
+            glDisable(GL_SCISSOR_TEST)
+
+    def delete(self):
+        self.static.delete()
+        self.dynamic.delete()
+        if self.program:
+            glDeleteProgram(self.program)
+            glDeleteTextures([self.depth_texture])
+            glDeleteVertexArrays(1, [self.vertex_array])
+            self.program = 0
+
+
+class QuadShadow:
+    """La sombra de antes de los mapas de profundidad: un cuadrado oscuro fijo bajo el tulipán.
+
+    Es lo que usan los contextos sin GLSL 330, VAOs o framebuffers (p. ej. OpenGL 2.1). Tiene la
+    interfaz de ShadowMapper para que la escena no distinga, pero no depende de lo que se dibuja: las
+    capas no guardan nada.
+    """
+
+    def __init__(self, size=1.5, height=0.05):
+        vertices = np.zeros((4, VERTEX_FLOATS), np.float32)
+        vertices[:, 0:3] = [(-size, height, size), (size, height, size), (size, height, -size), (-size, height, -size)]
+        vertices[:, 3:6] = (0.0, 1.0, 0.0)
+        vertices[:, 8:12] = (0.1, 0.1, 0.1, 1.0)
+        self.mesh = StaticMesh(vertices, [(None, 0, 4)])
+        self.static_redraws = 0
+
+    def update_static(self, key, bounds, submit):
+        return False
+
+    def update_dynamic(self, bounds, submit):
+        pass
+
+    def submit(self, queue, camera):
+        queue.submit_mesh(self.mesh, QUAD_SHADOW_STATE)
+
+    def delete(self):
+        self.mesh.delete()
+
+
+def shadow_maps_supported():
+    # El pase de ShadowMapper es GLSL 330 y dibuja con un VAO; las capas son framebuffers
+    version = glGetString(GL_SHADING_LANGUAGE_VERSION)
+    if not version or not (bool(glGenFramebuffers) and bool(glGenVertexArrays)):
+        return False
+
+    major, minor = version.split()[0].split(b'.')[:2]
+    return (int(major), int(minor)) >= (3, 30)
+
+
+def create_shadows(pipeline, light_position, width, height, fov_y=45.0, z_near=0.1, z_far=50.0):
+    # Con un contexto actual; sin mapas de sombra la escena sigue andando con la sombra fija
+    if not shadow_maps_supported():
+        print("ADVERTENCIA: El contexto no tiene GLSL 330 ni framebuffers; se usa la sombra fija bajo el tulipán.")
+        return QuadShadow()
+    return ShadowMapper(pipeline, light_position, width, height, fov_y, z_near, z_far)
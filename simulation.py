@@ -0,0 +1,347 @@
+import argparse
+from enum import Enum
+import time
+
+import numpy as np
+
+# Tope de tiempo que se recupera tras un cuadro muy lento, para no encadenar cuadros cada vez más lentos
+MAX_FRAME_TIME = 0.25
+
+
+class BeeState(Enum):
+    CIRCULANDO = 1
+    APROXIMANDOSE = 2  # se usa para el sobrevuelo tangencial
+    REGRESANDO = 3
+
+
+# Códigos de estado del enjambre, con los mismos valores que BeeState
+CIRCULANDO = BeeState.CIRCULANDO.value
+APROXIMANDOSE = BeeState.APROXIMANDOSE.value
+REGRESANDO = BeeState.REGRESANDO.value
+
+
+class FixedTimestep:
+    """Reloj de simulación a paso fijo, independiente de los cuadros por segundo.
+
+    advance() devuelve cuántos pasos tocan desde la última llamada y alpha indica cuánto del
+    siguiente paso ya pasó, para interpolar entre los dos últimos estados al dibujar.
+    """
+
+    def __init__(self, hz=60, clock=time.perf_counter, max_frame_time=MAX_FRAME_TIME):
+        self.hz = hz
+        self.dt = 1.0 / hz
+        self.clock = clock
+        self.max_frame_time = max_frame_time
+
+        self.last_time = None
+        self.accumulator = 0.0
+        self.steps = 0
+
+    def advance(self):
+        now = self.clock()
+        if self.last_time is None:
+            self.last_time = now
+            return 0
+
+        self.accumulator += min(now - self.last_time, self.max_frame_time)
+        self.last_time = now
+
+        # El margen evita perder un paso por redondeo cuando el cuadro dura exactamente dt
+        steps = int((self.accumulator + 1e-9) // self.dt)
+        self.accumulator = max(self.accumulator - steps * self.dt, 0.0)
+        self.steps += steps
+        return steps
+
+    def seek(self, seconds):
+        # Deja el reloj en seconds de tiempo simulado, como si hubiera avanzado desde 0, y sigue desde el
+        # instante actual de clock. Lo que se calcula desde el tiempo (FlightPath) queda en su sitio; la
+        # máquina de estados no, porque solo avanza paso a paso
+        self.steps = int((seconds + 1e-9) // self.dt)
+        self.accumulator = max(seconds - self.steps * self.dt, 0.0)
+        self.last_time = self.clock()
+
+    @property
+    def alpha(self):
+        return min(self.accumulator / self.dt, 1.0)
+
+    @property
+    def time(self):
+        # Tiempo simulado, en segundos, del último paso completado
+        return self.steps * self.dt
+
+
+class ManualClock:
+    """Reloj que solo avanza cuando se le indica; para render sin ventana y repeticiones exactas."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds):
+        self.now += seconds
+
+
+def lerp_angle(a, b, t):
+    # Interpola grados por el camino corto, así el salto 360 -> 0 no da una vuelta completa
+    delta = (b - a + 180.0) % 360.0 - 180.0
+    return a + delta * t
+
+
+def interpolate_pose(previous, current, alpha):
+    # Pose = (x, y, z, guiñada, cabeceo)
+    if previous is None:
+        return current
+
+    x, y, z = np.array(previous[:3]) + (np.array(current[:3]) - np.array(previous[:3])) * alpha
+    yaw = lerp_angle(previous[3], current[3], alpha)
+    pitch = lerp_angle(previous[4], current[4], alpha)
+    return float(x), float(y), float(z), yaw, pitch
+
+
+def interpolate_swarm(previous, current, alpha):
+    # Pose del enjambre = (posiciones (N, 3), guiñadas, cabeceos)
+    if previous is None:
+        return current
+
+    positions = previous[0] + (current[0] - previous[0]) * alpha
+    return positions, lerp_angle(previous[1], current[1], alpha), lerp_angle(previous[2], current[2], alpha)
+
+
+def random_phases(count, seed=None):
+    # Ángulos de arranque en grados; cada abeja llega a su sobrevuelo en un momento distinto
+    return np.random.default_rng(seed).uniform(0.0, 360.0, count)
+
+
+class BeeSwarm:
+    """N abejas con la misma máquina de estados que update_bee_movement(), en arrays de NumPy.
+
+    Cada paso avanza a todas a la vez: lo que cambia según el estado sale de tablas indexadas por
+    el código de estado y las transiciones, que son raras, se escriben solo en sus índices. El
+    desfase de cada abeja es su ángulo inicial en la órbita; centers desplaza cada órbita en XZ.
+    """
+
+    def __init__(self, count, phases=None, centers=None, orbit_radius=2.5, speed=1.0, height=2.0,
+                 approach_speed=1.2, min_radius=1.0, max_height=4.5, max_survol_steps=120):
+        self.count = count
+
+        self.orbit_radius = orbit_radius
+        self.speed = speed
+        self.height = height
+        self.approach_speed = approach_speed
+        self.min_radius = min_radius
+        self.max_height = max_height
+        self.max_survol_steps = max_survol_steps
+
+        # float32: con 100k abejas el seno en float64 costaría más que todo el resto del paso
+        self.state = np.full(count, CIRCULANDO, np.int8)
+        self.phases = np.zeros(count, np.float32) if phases is None else np.array(phases, np.float32)
+        self.angle = self.phases.copy()
+        self.radius = np.full(count, orbit_radius, np.float32)
+        self.y = np.full(count, height, np.float32)
+        self.steps = np.zeros(count, np.int32)
+
+        self.centers = np.zeros((count, 2), np.float32) if centers is None else np.asarray(centers, np.float32)
+
+        angle_rad = np.radians(self.angle)
+        self.x = np.sin(angle_rad) * self.radius
+        self.z = np.cos(angle_rad) * self.radius
+
+        self._build_tables()
+
+    def _build_tables(self):
+        def table(circling, approaching, returning, dtype=np.float32):
+            values = np.zeros(4, dtype)
+            values[[CIRCULANDO, APROXIMANDOSE, REGRESANDO]] = circling, approaching, returning
+            return values
+
+        # Curva del sobrevuelo por paso; vale 0 en los extremos, que es donde quedan los otros estados
+        progress = np.arange(self.max_survol_steps + 1) / self.max_survol_steps
+        self.survol_curve = np.sin(progress * np.pi).astype(np.float32)
+        self.survol_curve[[0, -1]] = 0.0
+
+        # Inclinación del sobrevuelo por paso, igual que bee_pose()
+        self.pitch_curve = np.where(progress < 0.5, -30.0 * progress / 0.5,
+                                    30.0 * (progress - 0.5) / 0.5).astype(np.float32)
+
+        orbit = self.orbit_radius
+
+        # radio' = objetivo + (radio - objetivo) * conservado; en el sobrevuelo se resta la curva
+        self.radius_target = table(orbit, self.min_radius, orbit)
+        self.radius_keep = table(0.0, 1.0, 0.9)
+        self.y_keep = table(0.0, 0.9, 0.9)
+
+        # Paso angular = fijo + extra * (1 - |órbita - radio| / órbita); solo el regreso usa el extra
+        self.angle_base = table(self.speed, self.approach_speed, 0.5 * self.speed)
+        self.angle_extra = table(0.0, 0.0, 0.5 * self.speed)
+
+        self.steps_keep = table(0, 1, 1, np.int32)
+        self.steps_add = table(0, 1, 0, np.int32)
+
+        self.pitch_survol = table(0.0, 1.0, 0.0)
+        self.pitch_fixed = table(0.0, 0.0, 10.0)
+
+    def step(self):
+        orbit = np.float32(self.orbit_radius)
+        height = np.float32(self.height)
+        state = self.state
+
+        survol = self.survol_curve[np.minimum(self.steps, self.max_survol_steps)]
+
+        # Radio y altura: fijos en la órbita, curva senoidal en el sobrevuelo, relajación al regresar
+        target = self.radius_target[state]
+        radius = target + (self.radius - target) * (self.radius_keep[state] - survol)
+
+        target_y = height + np.float32(self.max_height - self.height) * survol
+        y = target_y + (self.y - target_y) * self.y_keep[state]
+
+        # El regreso acelera a medida que el radio vuelve al de la órbita
+        angle_step = self.angle_base[state] + self.angle_extra[state] * (1.0 - np.abs(orbit - radius) / orbit)
+
+        circling = state == CIRCULANDO
+        angle = self.angle + angle_step
+        angle -= np.float32(360.0) * (circling & (angle > 360.0))
+
+        angle_rad = np.radians(angle)
+        x = np.sin(angle_rad) * radius
+        z = np.cos(angle_rad) * radius
+
+        steps = self.steps * self.steps_keep[state] + self.steps_add[state]
+
+        # Transiciones, con las mismas condiciones que la versión de una abeja
+        start = np.flatnonzero(circling & (angle > 350.0) & (angle < 360.0))
+        x[start] = np.sin(np.radians(359.9)) * orbit
+        z[start] = np.cos(np.radians(359.9)) * orbit
+
+        finished = np.flatnonzero((state == APROXIMANDOSE) & (steps >= self.max_survol_steps))
+
+        landed = np.flatnonzero((state == REGRESANDO) & (np.abs(radius - orbit) < 0.05) & (np.abs(y - height) < 0.05))
+        angle[landed] = 0.0
+        radius[landed] = orbit
+        y[landed] = height
+
+        state[start] = APROXIMANDOSE
+        state[finished] = REGRESANDO
+        state[landed] = CIRCULANDO
+
+        self.angle, self.radius, self.y, self.steps = angle, radius, y, steps
+        self.x, self.z = x, z
+
+    def positions(self):
+        # (N, 3) en coordenadas del mundo, ya con el centro de cada órbita
+        return np.column_stack((self.x + self.centers[:, 0], self.y, self.z + self.centers[:, 1]))
+
+    def orientations(self):
+        # Guiñada y cabeceo en grados, como rotation_angle y pitch_angle de draw_bee()
+        yaw = self.angle + np.float32(90.0)
+
+        progress = self.pitch_curve[np.minimum(self.steps, self.max_survol_steps)]
+        pitch = progress * self.pitch_survol[self.state] + self.pitch_fixed[self.state]
+
+        return yaw, pitch
+
+
+class FlightPath:
+    """Un ciclo completo de vuelo (órbita, sobrevuelo y regreso) precalculado paso a paso.
+
+    La trayectoria no depende de nada externo, así que se simula una sola vez con BeeSwarm y se
+    guardan posición, guiñada y cabeceo por paso. La pose en un instante cualquiera (en pasos, con
+    fracción) sale de interpolar entre los dos pasos vecinos, y el ciclo se repite. params guarda
+    los parámetros con los que se compiló, para saber cuándo hay que compilarlo de nuevo.
+    """
+
+    def __init__(self, orbit_radius=2.5, speed=1.0, height=2.0, approach_speed=1.2, min_radius=1.0,
+                 max_height=4.5, max_survol_steps=120, max_steps=100000):
+        self.params = dict(orbit_radius=orbit_radius, speed=speed, height=height, approach_speed=approach_speed,
+                           min_radius=min_radius, max_height=max_height, max_survol_steps=max_survol_steps)
+        bee = BeeSwarm(1, **self.params)
+
+        positions, yaw, pitch = [bee.positions()[0]], [bee.orientations()[0][0]], [bee.orientations()[1][0]]
+        left_orbit = False
+
+        # El ciclo cierra cuando la abeja aterriza de vuelta en la órbita, con el ángulo otra vez en 0
+        for _ in range(max_steps):
+            bee.step()
+            positions.append(bee.positions()[0])
+            yaw.append(bee.orientations()[0][0])
+            pitch.append(bee.orientations()[1][0])
+
+            left_orbit |= bool(bee.state[0] != CIRCULANDO)
+            if left_orbit and bee.state[0] == CIRCULANDO:
+                break
+        else:
+            raise ValueError(f"La trayectoria no cierra un ciclo en {max_steps} pasos")
+
+        # period + 1 muestras (x, y, z, guiñada, cabeceo); la última es el aterrizaje, así el último
+        # tramo también se interpola. La guiñada va desenrollada para interpolar sin pasar por lerp_angle
+        samples = np.column_stack((positions, yaw, pitch)).astype(np.float64)
+        samples[:, 3] = np.degrees(np.unwrap(np.radians(samples[:, 3])))
+
+        # Al aterrizar el ángulo vuelve a 0 pero la posición sigue donde terminó el regreso, y el salto
+        # ocurre en el paso siguiente; desde la segunda vuelta el ciclo arranca de esa pose, no de la inicial
+        samples[0, :3] = samples[-1, :3]
+
+        # Por componente (5, pasos): con miles de abejas cada búsqueda lee filas contiguas
+        self.period = len(samples) - 1
+        self.samples = np.ascontiguousarray(samples.T, np.float32)
+        self.deltas = np.ascontiguousarray(np.diff(samples, axis=0).T, np.float32)
+
+    def phase_steps(self, phases):
+        # Desfase en pasos, dentro de [0, period), equivalente a empezar la órbita en el ángulo phases,
+        # como en BeeSwarm
+        return (np.asarray(phases, np.float64) / self.params['speed'] % self.period).astype(np.float32)
+
+    def pose(self, steps, offsets=0.0):
+        # steps es el tiempo de la simulación en pasos (con fracción) y offsets el desfase de cada abeja
+        # según phase_steps(). El módulo del tiempo se hace en float64 para no perder la fracción
+        period = np.float32(self.period)
+        steps = np.asarray(offsets, np.float32) + np.float32(float(steps) % self.period)
+        steps -= period * (steps >= period)
+
+        whole = np.floor(steps)
+        i = whole.astype(np.int32)
+
+        # Muestra del paso más la pendiente del tramo por la fracción
+        pose = self.samples.take(i, axis=1)
+        pose += self.deltas.take(i, axis=1) * (steps - whole)
+        return pose[0:3].T, pose[3], pose[4]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide cuánto tarda un paso del enjambre de abejas.")
+    parser.add_argument('--bees', type=int, default=100000)
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--flight-path', action='store_true',
+                        help="Mide la consulta a la trayectoria precalculada en lugar del paso del enjambre")
+    args = parser.parse_args(argv)
+
+    phases = random_phases(args.bees, args.seed)
+    swarm = BeeSwarm(args.bees, phases=phases)
+
+    if args.flight_path:
+        start = time.perf_counter()
+        path = FlightPath()
+        print(f"Trayectoria de {path.period} pasos compilada en {(time.perf_counter() - start) * 1000.0:.1f} ms")
+        offsets = path.phase_steps(phases)
+
+    times = []
+    for tick in range(args.ticks):
+        start = time.perf_counter()
+        if args.flight_path:
+            path.pose(tick + 0.5, offsets)
+        else:
+            swarm.step()
+        times.append((time.perf_counter() - start) * 1000.0)
+
+    p50, p95 = np.percentile(times, (50, 95))
+    print(f"{args.bees} abejas, {args.ticks} pasos: p50 {p50:.2f} ms, p95 {p95:.2f} ms por paso")
+
+    if not args.flight_path:
+        states = np.bincount(swarm.state, minlength=4)
+        print(f"Circulando {states[CIRCULANDO]}, sobrevolando {states[APROXIMANDOSE]}, regresando {states[REGRESANDO]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+from OpenGL.GL import *
+from PIL import Image
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import hashlib
+import json
+import os
+import time
+
+# Texturas de bloque que usan las escenas, por clave de TEXTURES
+TEXTURE_FILES = {
+    'grass_top': "grass_top.png",
+    'red_wool': "red-wool.png",
+    'leaves': "oak-leaves.png",
+    'dirt': "dirt.png",
+    'bee_body': "bee_body.png",
+    'bee_wings': "bee-wings.png",
+}
+
+# Región blanca del atlas para las caras de color sólido, así no hace falta desligar la textura
+WHITE_REGION = 'blanco'
+
+ATLAS_PADDING = 1
+
+# Píxeles decodificados y volteados, reutilizados entre arranques mientras el PNG no cambie
+TEXTURE_CACHE_DIR = ".texture_cache"
+
+
+def cache_paths(filename):
+    key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()[:16]
+    base = os.path.join(TEXTURE_CACHE_DIR, f"{os.path.basename(filename)}.{key}")
+    return base + ".npy", base + ".json"
+
+
+def file_digest(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def read_cached_image(filename, stat):
+    pixels_path, meta_path = cache_paths(filename)
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        # Un cambio de mtime solo invalida si el contenido también cambió (p. ej. tras un checkout)
+        if (meta['mtime_ns'], meta['size']) != (stat.st_mtime_ns, stat.st_size):
+            if meta['size'] != stat.st_size or meta['sha1'] != file_digest(filename):
+                return None
+            meta['mtime_ns'] = stat.st_mtime_ns
+            write_json(meta_path, meta)
+
+        return np.load(pixels_path, mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def write_cached_image(filename, stat, img_data):
+    pixels_path, meta_path = cache_paths(filename)
+
+    try:
+        os.makedirs(TEXTURE_CACHE_DIR, exist_ok=True)
+
+        tmp_path = pixels_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, img_data)
+        os.replace(tmp_path, pixels_path)
+
+        write_json(meta_path, {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                               'sha1': file_digest(filename)})
+    except OSError as e:
+        print(f"ADVERTENCIA: No se pudo guardar la caché de '{filename}': {e}")
+
+
+def decode_image(filename, use_cache=True):
+    # Devuelve los píxeles RGB ya volteados para OpenGL. En un arranque en caliente se mapean
+    # desde la caché en disco y no se decodifica el PNG.
+    try:
+        stat = os.stat(filename)
+
+        if use_cache:
+            img_data = read_cached_image(filename, stat)
+            if img_data is not None:
+                return img_data
+
+        img = Image.open(filename)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        # Directo del búfer de PIL a un array uint8 contiguo, sin pasar por listas de Python
+        img_data = np.asarray(img.transpose(Image.Transpose.FLIP_TOP_BOTTOM), np.uint8)
+
+        if use_cache:
+            write_cached_image(filename, stat, img_data)
+
+        return img_data
+    except FileNotFoundError:
+        print(f"ERROR: No se encontró el archivo de textura '{filename}'.")
+        return None
+    except Exception as e:
+        print(f"Error al procesar la textura {filename}: {e}")
+        return None
+
+
+def upload_texture(img_data, wrap=GL_REPEAT):
+    height, width = img_data.shape[:2]
+
+    texture_id = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture_id)
+
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)  # Filtro Pixelado
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, width, height, 0,
+                 GL_RGB, GL_UNSIGNED_BYTE, np.ascontiguousarray(img_data))
+
+    return texture_id
+
+
+def load_texture(filename):
+    img_data = decode_image(filename)
+    if img_data is None:
+        return None
+
+    texture_id = upload_texture(img_data)
+    print(f"Textura '{filename}' cargada con ID: {texture_id}")
+    return texture_id
+
+
+class TextureAtlas:
+    """Empaqueta varias imágenes en una sola textura; regions[nombre] = (u0, v0, du, dv)."""
+
+    def __init__(self, images):
+        images = dict(images)
+        images[WHITE_REGION] = np.full((4, 4, 3), 255, np.uint8)
+
+        # Empaquetado por estantes: las imágenes más altas primero, de izquierda a derecha
+        names = sorted(images, key=lambda n: images[n].shape[0], reverse=True)
+        pad = ATLAS_PADDING
+        width = max(images[n].shape[1] for n in names) + 2 * pad
+        width = max(width, int(np.sqrt(sum((img.shape[0] + 2 * pad) * (img.shape[1] + 2 * pad)
+                                               for img in images.values()))))
+
+        placements = {}
+        x = y = shelf_height = 0
+        for name in names:
+            h, w = images[name].shape[0] + 2 * pad, images[name].shape[1] + 2 * pad
+            if x + w > width:
+                x, y = 0, y + shelf_height
+                shelf_height = 0
+            placements[name] = (x, y)
+            x += w
+            shelf_height = max(shelf_height, h)
+
+        height = y + shelf_height
+        self.pixels = np.zeros((height, width, 3), np.uint8)
+        self.regions = {}
+
+        for name, (x, y) in placements.items():
+            img = images[name]
+            h, w = img.shape[:2]
+            # El borde repetido evita que el filtrado tome texeles de la región vecina
+            self.pixels[y:y + h + 2 * pad, x:x + w + 2 * pad] = np.pad(img, ((pad, pad), (pad, pad), (0, 0)),
+                                                                       mode='edge')
+            self.regions[name] = ((x + pad) / width, (y + pad) / height, w / width, h / height)
+
+        self.texture_id = None
+
+    def upload(self):
+        self.texture_id = upload_texture(self.pixels, wrap=GL_CLAMP_TO_EDGE)
+        return self.texture_id
+
+    def layout(self):
+        # Copia sin los píxeles: lo que necesita el mallado en otro proceso (regiones e id de textura)
+        layout = TextureAtlas.__new__(TextureAtlas)
+        layout.pixels = None
+        layout.regions = dict(self.regions)
+        layout.texture_id = self.texture_id
+        return layout
+
+    def region(self, name):
+        return self.regions.get(name) if name else None
+
+    def white_uv(self):
+        u0, v0, du, dv = self.regions[WHITE_REGION]
+        return u0 + du * 0.5, v0 + dv * 0.5
+
+
+class AsyncTextureLoader:
+    """Decodifica las texturas en un pool de hilos mientras arranca la ventana.
+
+    Las subidas a GL se hacen en poll(), siempre desde el hilo de render y con un presupuesto
+    de tiempo por cuadro. Hasta que termina, las mallas se dibujan con los colores sólidos.
+    """
+
+    def __init__(self, files=TEXTURE_FILES, workers=None):
+        self.files = dict(files)
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4))
+        self.pending = {self.executor.submit(decode_image, filename): name for name, filename in self.files.items()}
+        self.images = {}
+        self.atlas = None
+
+    @property
+    def done(self):
+        return self.atlas is not None
+
+    def poll(self, textures, budget=0.004):
+        # Sube las texturas ya decodificadas a 'textures'; devuelve True en el cuadro en que el atlas queda listo
+        if self.done:
+            return False
+
+        start = time.perf_counter()
+        for future in [f for f in self.pending if f.done()]:
+            name = self.pending.pop(future)
+            img_data = future.result()
+
+            self.images[name] = img_data
+            textures[name] = upload_texture(img_data) if img_data is not None else None
+            if textures[name]:
+                print(f"Textura '{self.files[name]}' cargada con ID: {textures[name]}")
+
+            if budget is not None and time.perf_counter() - start > budget:
+                return False
+
+        if self.pending:
+            return False
+
+        self.atlas = TextureAtlas({name: img for name, img in self.images.items() if img is not None})
+        self.atlas.upload()
+        self.images = {}
+        self.executor.shutdown(wait=False)
+
+        height, width = self.atlas.pixels.shape[:2]
+        print(f"Atlas de {len(self.atlas.regions) - 1} texturas ({width}x{height}) "
+              f"cargado con ID: {self.atlas.texture_id}")
+        return True
+
+    def finish(self, textures):
+        while not self.poll(textures, budget=None):
+            wait(self.pending, return_when=FIRST_COMPLETED)
+
+
+def load_textures(files=TEXTURE_FILES):
+    # Versión bloqueante: texturas sueltas para el modo inmediato y el atlas para las mallas
+    textures = {}
+    loader = AsyncTextureLoader(files)
+    loader.finish(textures)
+    return textures, loader.atlas
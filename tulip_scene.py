@@ -0,0 +1,137 @@
+from functools import partial
+
+from chunks import VoxelWorld
+from garden import Garden, grid_bounds
+from render import DEFAULT_STATE, draw_cube, init_opengl as init_gl
+from shadows import create_shadows
+from voxels import build_tulip_grid, material_draw_args, tulip_blocks
+
+
+class TulipScene:
+    """El tulipán (o un jardín de tulipanes) con su sombra, común a las escenas del repositorio.
+
+    Dibuja en queue vista desde camera, con la luz y la proyección de la escena. textures es el dict
+    de la escena, que las texturas llenan en su sitio; el atlas llega con invalidate(). Las opciones
+    son las de la escena: static_mesh hornea el tulipán en VBOs en lugar de dibujarlo cubo a cubo,
+    frustum_culling descarta por celdas las instancias fuera de cámara, level_of_detail dibuja los
+    tulipanes lejanos con menos detalle, y con mesh_pool los chunks se mallan fuera del hilo de render.
+    """
+
+    def __init__(self, camera, queue, light_position, fov_y=45.0, z_near=0.1, z_far=50.0, textures=None,
+                 static_mesh=True, frustum_culling=True, level_of_detail=True):
+        self.camera = camera
+        self.queue = queue
+        self.light_position = light_position
+        self.fov_y = fov_y
+        self.z_near = z_near
+        self.z_far = z_far
+        self.aspect = None  # De init_opengl()
+
+        self.textures = textures
+        self.atlas = None
+        self.static_mesh = static_mesh
+        self.frustum_culling = frustum_culling
+        self.level_of_detail = level_of_detail
+        self.mesh_pool = None
+
+        self.grid = None
+        self.world = None  # VoxelWorld: editar un vóxel solo rehace los chunks que toca
+        self.garden = None  # Garden con --garden; reemplaza al tulipán único
+        self.shadows = None  # De init_opengl(): ShadowMapper desde LIGHT_POS, o QuadShadow sin GLSL 330
+
+    def tulip_grid(self):
+        # El modelo vive en una rejilla de vóxeles; se arma la primera vez que hace falta
+        if self.grid is None:
+            self.grid = build_tulip_grid()
+        return self.grid
+
+    def emit_tulip_model(self, cube):
+        for x, y, z, size, material in tulip_blocks():
+            color, texture_id, repeat = material_draw_args(material, size, self.textures)
+            cube(x, y, z, size, color, texture_id, texture_repeat=repeat)
+
+    def draw_tulip_model(self):
+        if not self.static_mesh:
+            self.queue.submit(partial(self.emit_tulip_model, draw_cube))
+            return
+
+        # Se hornea una sola vez hasta que se invalide
+        if self.world is None:
+            self.world = VoxelWorld(self.tulip_grid(), self.textures, atlas=self.atlas, pool=self.mesh_pool,
+                                    cache=True)
+
+            if self.mesh_pool is None:
+                self.world.rebuild(limit=None)
+
+                stats = self.world.stats()
+                print(f"Malla del tulipán: {stats['quads']} quads de {stats['faces']} caras "
+                      f"({stats['culled']} ocultas descartadas, {stats['merged']} fusionadas)")
+
+        # Tras una edición se rehacen solo los chunks sucios, unos pocos por cuadro
+        self.world.rebuild()
+        self.world.submit(self.queue, DEFAULT_STATE)
+
+    def create_garden(self, rows, cols, seed=0):
+        if self.garden is not None:
+            self.garden.invalidate()
+        self.garden = Garden(rows, cols, seed=seed)
+
+    def view_frustum(self):
+        if not self.frustum_culling:
+            return None
+        return self.camera.frustum(self.aspect, self.fov_y, self.z_near, self.z_far)
+
+    def draw_garden(self, profiler):
+        eye = self.camera.position() if self.level_of_detail else None
+        per_level = self.garden.submit(self.queue, self.tulip_grid(), self.textures, self.atlas,
+                                       self.view_frustum(), eye)
+
+        profiler.stat('tulipanes visibles', f"{sum(per_level)}/{self.garden.count}")
+        profiler.stat('tulipanes por nivel', " / ".join(str(n) for n in per_level))
+
+    def draw(self, profiler):
+        if self.garden is not None:
+            self.draw_garden(profiler)
+        else:
+            self.draw_tulip_model()
+
+    def invalidate(self, atlas=None):
+        # Con las texturas ya cargadas; la malla actual se sigue dibujando hasta que estén las nuevas
+        self.atlas = atlas
+        if self.world is not None:
+            self.world.set_textures(self.textures, self.atlas)
+
+        if self.garden is not None:
+            self.garden.invalidate()
+
+    def init_opengl(self, width, height, shaders=False):
+        self.aspect = width / height
+        self.queue.pipeline = init_gl(width, height, self.light_position, self.fov_y, self.z_near, self.z_far,
+                                      shaders=shaders)
+        self.shadows = create_shadows(self.queue.pipeline, self.light_position, width, height,
+                                      self.fov_y, self.z_near, self.z_far)
+
+    def submit_casters(self, queue):
+        if self.garden is not None:
+            self.garden.submit_casters(queue, self.tulip_grid(), self.textures, self.atlas)
+        elif self.static_mesh:
+            self.world.submit(queue, DEFAULT_STATE)
+        else:
+            queue.submit(partial(self.emit_tulip_model, draw_cube))
+
+    def draw_shadow(self, profiler, dynamic_bounds=None, submit_dynamic=None):
+        # El tulipán (o el jardín) solo se vuelve a dibujar en el mapa estático cuando cambian sus mallas
+        # (al hornearlo de nuevo levels es otra lista). Lo que se mueve, con submit_dynamic, va cada
+        # cuadro a la capa dinámica, que cubre solo dynamic_bounds
+        if self.garden is not None:
+            key, bounds = (self.garden, self.garden.levels), self.garden.bounds(self.tulip_grid())
+        else:
+            key = (self.world, self.world.revision) if self.static_mesh else 'cubos'
+            bounds = grid_bounds(self.tulip_grid())
+
+        redrawn = self.shadows.update_static(key, bounds, self.submit_casters)
+        profiler.stat('sombra estática', "redibujada" if redrawn else "en caché")
+
+        if submit_dynamic is not None:
+            self.shadows.update_dynamic(dynamic_bounds, submit_dynamic)
+        self.shadows.submit(self.queue, self.camera)
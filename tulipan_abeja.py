@@ -1,43 +1,75 @@
-import pygame
-from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLU import *
-from PIL import Image
+from OpenGL.GL import GL_STATIC_DRAW
+import argparse
+from functools import partial
+import sys
 import numpy as np
-import time
-from enum import Enum
+from culling import UniformGrid, model_matrix, translation_matrix
+from garden import parse_garden
+from animation import AnimatedSwarmRenderer
+from instancing import InstanceBuffer, shared_renderer
+from mesh import MeshBuilder
+from meshing import MeshWorkerPool
+from profiler import NULL_PROFILER
+from render import DEFAULT_STATE, WING_STATE, OrbitCamera, RenderQueue, begin_frame, draw_cube, flush_frame
+from simulation import BeeState, BeeSwarm, FixedTimestep, FlightPath, interpolate_pose, interpolate_swarm, random_phases
+from tulip_scene import TulipScene
+from window import add_render_args, parse_scene_args, run as run_window
 
 WINDOW_WIDTH = 800
 WINDOW_HEIGHT = 600
 
-COLOR_ROJO = (1.0, 0.0, 0.0)
 COLOR_NEGRO = (0.0, 0.0, 0.0)
-COLOR_VERDE = (0.0, 0.7, 0.0)
-COLOR_CAFE = (0.47, 0.3, 0.17)
 COLOR_BLANCO = (1.0, 1.0, 1.0)
 
 LIGHT_POS = (5.0, 10.0, 5.0, 1.0)
 
-cam_rot_x = 45.0
-cam_rot_y = 45.0
-last_mouse_pos = (0, 0)
-mouse_down = False
-zoom = 15.0
+# Proyección de init_opengl(); el frustum para descartar instancias usa los mismos valores
+FOV_Y = 45.0
+Z_NEAR = 0.1
+Z_FAR = 50.0
+
+CAMERA = OrbitCamera()
+QUEUE = RenderQueue()  # Lo que se dibuja en el cuadro, ordenado por estado GL en flush_frame()
+SHADERS = False  # Con --shaders las mallas se dibujan con el ShaderPipeline GLSL en lugar de la luz fija
 
 TEXTURES = {}
+ATLAS = None
+SCENE_TEXTURES = ('grass_top', 'red_wool', 'leaves', 'dirt', 'bee_body', 'bee_wings')
+
+PROFILER = NULL_PROFILER  # FrameProfiler con --profile
+
+STATIC_MESH = True  # Dibuja el tulipán y la abeja desde VBOs horneados en lugar de cubo a cubo
+MESH_POOL = None  # MeshWorkerPool con --mesh-workers; los chunks se mallan fuera del hilo de render
+
+FRUSTUM_CULLING = True  # Descarta por celdas las instancias fuera de cámara
+LEVEL_OF_DETAIL = True  # Tulipanes lejanos con menos detalle o como billboard
 
+# El tulipán, o el jardín con --garden, y su sombra
+TULIP = TulipScene(CAMERA, QUEUE, LIGHT_POS, FOV_Y, Z_NEAR, Z_FAR, textures=TEXTURES, static_mesh=STATIC_MESH,
+                   frustum_culling=FRUSTUM_CULLING, level_of_detail=LEVEL_OF_DETAIL)
+create_garden = TULIP.create_garden
 
-class BeeState(Enum):
-    CIRCULANDO = 1
-    APROXIMANDOSE = 2  # se usa para el sobrevuelo tangencial
-    REGRESANDO = 3
+bee_meshes = None
+
+# Con --bees la escena anima un BeeSwarm y lo dibuja con instancias en lugar de la abeja única
+SWARM = None
+swarm_meshes = None
+bee_instances = None
+bee_cells = UniformGrid(8.0, 1.0, (-0.5, 0.5))  # Celdas de 8 unidades; radio que cubre cuerpo y alas
+
+# Con --gpu-bees el enjambre vuela en el vertex shader: las instancias (centro y desfase) se suben una vez
+# y por cuadro solo se manda el tiempo
+GPU_BEES = False
+swarm_animation = None
+swarm_static_instances = None
+swarm_static_key = None
 
 
 bee_state = BeeState.CIRCULANDO
 
 bee_angle = 0.0
-BEE_RADIUS = 2.5
+ORBIT_RADIUS = 2.5  # Radio de la órbita grande
+BEE_RADIUS = ORBIT_RADIUS  # Radio de la abeja en el paso actual de la máquina de estados
 BEE_SPEED = 1.0
 BEE_Y_HEIGHT = 2.0  # Altura de vuelo normal
 
@@ -57,218 +89,161 @@ SURVOL_ALTURA_MAX = 4.5  # Altura máxima para pasar por encima del tulipán
 survol_steps = 0
 MAX_SURVOL_STEPS = 120  # Número de pasos para completar la trayectoria de sobrevuelo
 
+# Pasos por segundo de la simulación; a 60 Hz la abeja vuelve a acercarse cada ~10 segundos
+SIMULATION_HZ = 60
+SIM_CLOCK = FixedTimestep(SIMULATION_HZ)
 
-def load_texture(filename):
-    try:
-        img = Image.open(filename)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        img_data = np.array(list(img.getdata()), np.uint8)
-        img_data = img_data.reshape(img.size[1], img.size[0], 3)
-        img_data = np.flipud(img_data)
-
-        texture_id = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, texture_id)
+# La abeja (y el enjambre) toman la pose de un ciclo de vuelo precalculado según el tiempo simulado,
+# en lugar de avanzar la máquina de estados paso a paso. El ciclo sale de ORBIT_RADIUS, no de BEE_RADIUS,
+# que sin FLIGHT_PATH cambia en cada paso
+FLIGHT_PATH = True
+flight_path = None
 
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+# Poses (x, y, z, guiñada, cabeceo) de los dos últimos pasos, para interpolar al dibujar
+bee_prev_pose = None
+bee_current_pose = None
+swarm_prev_pose = None
+swarm_current_pose = None
 
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, img.size[0], img.size[1], 0,
-                     GL_RGB, GL_UNSIGNED_BYTE, img_data)
-
-        print(f"Textura '{filename}' cargada con ID: {texture_id}")
-        return texture_id
-    except FileNotFoundError:
-        print(f"ERROR: No se encontró el archivo de textura '{filename}'.")
-        return None
-    except Exception as e:
-        print(f"Error al procesar la textura {filename}: {e}")
-        return None
-
-
-def draw_cube(center_x, center_y, center_z, size, color=None, texture_id=None, texture_repeat=1):
-    half = size / 2.0
-
-    vertices = [
-        (center_x - half, center_y - half, center_z + half), (center_x + half, center_y - half, center_z + half),
-        (center_x + half, center_y + half, center_z + half), (center_x - half, center_y + half, center_z + half),
-        (center_x - half, center_y - half, center_z - half), (center_x + half, center_y - half, center_z - half),
-        (center_x + half, center_y + half, center_z - half), (center_x - half, center_y + half, center_z - half)
-    ]
-
-    faces = [
-        (0, 3, 2, 1), (4, 7, 6, 5), (0, 4, 5, 1),
-        (3, 7, 6, 2), (1, 2, 6, 5), (0, 3, 7, 4)
-    ]
 
-    normals = [
-        (0.0, 0.0, 1.0), (0.0, 0.0, -1.0), (0.0, -1.0, 0.0),
-        (0.0, 1.0, 0.0), (1.0, 0.0, 0.0), (-1.0, 0.0, 0.0)
+def emit_bee_body(cube, s_bee, tex_body):
+    body_parts = [
+        (0, 0, 0), (s_bee, 0, 0), (s_bee * 2, 0, 0)
     ]
 
-    scaled_tex_coords = [
-        (0, 0),
-        (texture_repeat, 0),
-        (texture_repeat, texture_repeat),
-        (0, texture_repeat)
-    ]
+    for x, y, z in body_parts:
+        cube(x, y, z, s_bee, COLOR_NEGRO, tex_body, 1)
 
-    base_color = color if color else (1.0, 1.0, 1.0)
 
-    for i, face in enumerate(faces):
-        current_tex_id = None
+def emit_bee_wing(cube, s_bee, tex_wings):
+    cube(0, 0, 0, s_bee * 1.5, (COLOR_BLANCO[0], COLOR_BLANCO[1], COLOR_BLANCO[2], 0.5), tex_wings, 1)
 
-        if isinstance(texture_id, dict):
-            current_tex_id = texture_id.get(i, texture_id.get('default'))
-        elif texture_id:
-            current_tex_id = texture_id
 
-        if current_tex_id:
-            glBindTexture(GL_TEXTURE_2D, current_tex_id)
-            glColor3f(1.0, 1.0, 1.0)
-            use_texture = True
-        else:
-            glBindTexture(GL_TEXTURE_2D, 0)
+def emit_bee_wings(cube, s_bee, tex_wings):
+    # Las dos alas ya colocadas, con los mismos desplazamientos que draw_minecraft_bee
+    for z in (-s_bee * 0.8, s_bee * 0.8):
+        cube(s_bee, s_bee * 0.5, z, s_bee * 1.5, (COLOR_BLANCO[0], COLOR_BLANCO[1], COLOR_BLANCO[2], 0.5), tex_wings, 1)
 
-            if color and len(color) == 4:
-                glColor4fv(color)
-            else:
-                glColor3fv(base_color)
 
-            use_texture = False
+def bake_bee_meshes(s_bee, emit_wings=emit_bee_wing):
+    # Con el atlas se pasan claves de TEXTURES en lugar de ids
+    textures = {name: name for name in TEXTURES} if ATLAS else TEXTURES
 
-        glBegin(GL_QUADS)
-        glNormal3fv(normals[i])
+    body = MeshBuilder(ATLAS)
+    emit_bee_body(body.add_cube, s_bee, textures.get('bee_body'))
 
-        for j, vertex_index in enumerate(face):
-            if use_texture:
-                glTexCoord2fv(scaled_tex_coords[j])
-            glVertex3fv(vertices[vertex_index])
-        glEnd()
+    wing = MeshBuilder(ATLAS)
+    emit_wings(wing.add_cube, s_bee, textures.get('bee_wings'))
 
+    return s_bee, body.build(), wing.build()
 
-def draw_minecraft_bee(s_bee=0.3):
-    tex_body = TEXTURES.get('bee_body')
-    tex_wings = TEXTURES.get('bee_wings')
 
-    body_parts = [
-        (0, 0, 0), (s_bee, 0, 0), (s_bee * 2, 0, 0)
-    ]
+def invalidate_bee_model():
+    global bee_meshes, swarm_meshes
 
-    for x, y, z in body_parts:
-        draw_cube(x, y, z, s_bee, COLOR_NEGRO, tex_body, 1)
+    for meshes in (bee_meshes, swarm_meshes):
+        if meshes is not None:
+            meshes[1].delete()
+            meshes[2].delete()
 
-    glEnable(GL_BLEND)
-    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    bee_meshes = swarm_meshes = None
 
-    glDisable(GL_LIGHTING)
 
-    glPushMatrix()
-    glTranslatef(s_bee, s_bee * 0.5, -s_bee * 0.8)
+def draw_minecraft_bee(matrix, s_bee=0.3):
+    # El cuerpo va con lo opaco y las alas, ya colocadas con su desplazamiento, con lo translúcido
+    global bee_meshes
 
-    draw_cube(0, 0, 0, s_bee * 1.5, (COLOR_BLANCO[0], COLOR_BLANCO[1], COLOR_BLANCO[2], 0.5), tex_wings, 1)
-    glPopMatrix()
+    wing_matrices = [matrix @ translation_matrix(s_bee, s_bee * 0.5, z) for z in (-s_bee * 0.8, s_bee * 0.8)]
 
-    glPushMatrix()
-    glTranslatef(s_bee, s_bee * 0.5, s_bee * 0.8)
-    draw_cube(0, 0, 0, s_bee * 1.5, (COLOR_BLANCO[0], COLOR_BLANCO[1], COLOR_BLANCO[2], 0.5), tex_wings, 1)
-    glPopMatrix()
+    if STATIC_MESH:
+        if bee_meshes is None or bee_meshes[0] != s_bee:
+            bee_meshes = bake_bee_meshes(s_bee)
 
-    glEnable(GL_LIGHTING)
-    glDisable(GL_BLEND)
+        QUEUE.submit_mesh(bee_meshes[1], DEFAULT_STATE, matrix)
+        for wing_matrix in wing_matrices:
+            QUEUE.submit_mesh(bee_meshes[2], WING_STATE, wing_matrix)
+    else:
+        tex_body = TEXTURES.get('bee_body')
+        tex_wings = TEXTURES.get('bee_wings')
 
+        QUEUE.submit(partial(emit_bee_body, draw_cube, s_bee, tex_body), matrix=matrix)
+        for wing_matrix in wing_matrices:
+            QUEUE.submit(partial(emit_bee_wing, draw_cube, s_bee, tex_wings), WING_STATE, matrix=wing_matrix)
 
-def draw_tulip_model():
-    tex_leaves = TEXTURES.get('leaves')
-    tex_wool = TEXTURES.get('red_wool')
-    tex_grass_top = TEXTURES.get('grass_top')
-    tex_dirt = TEXTURES.get('dirt')
 
-    floor_textures = {
-        3: tex_grass_top,
-        'default': tex_dirt
-    }
+def draw_swarm(s_bee=0.3):
+    # Todo el enjambre en dos llamadas: cuerpos iluminados y después las alas translúcidas
+    global swarm_meshes, bee_instances
 
-    s = 0.5
-    soil_repeat_factor = 4
+    if bee_instances is None:
+        bee_instances = InstanceBuffer()
 
-    draw_cube(0, -s * 0.5, 0, 2.0, COLOR_CAFE, floor_textures, texture_repeat=soil_repeat_factor)
+    if swarm_meshes is None or swarm_meshes[0] != s_bee:
+        swarm_meshes = bake_bee_meshes(s_bee, emit_bee_wings)
 
-    stem_blocks = [
-        (0, s * 0.5, 0), (0, s * 1.5, 0), (0, s * 2.5, 0), (0, s * 3.5, 0),
-        (-s, s * 1.5, 0), (s, s * 1.5, 0), (0, s * 2.5, -s), (0, s * 2.5, s),
-    ]
-    for x, y, z in stem_blocks:
-        draw_cube(x, y, z, s, COLOR_VERDE, tex_leaves, texture_repeat=1)
+    if FLIGHT_PATH:
+        positions, yaw, pitch = flight_pose(bee_flight_path().phase_steps(SWARM.phases))
+        positions = positions.copy()
+        positions[:, [0, 2]] += SWARM.centers
+    else:
+        positions, yaw, pitch = interpolate_swarm(swarm_prev_pose, swarm_current_pose, SIM_CLOCK.alpha)
 
-    flower_center_y = s * 4.5
+    planes = TULIP.view_frustum()
+    if planes is not None:
+        # Las abejas se mueven: se reparten en celdas cada cuadro, que es O(N) y sin ordenar
+        bee_cells.assign(positions)
+        visible = bee_cells.cull(planes)
+        positions, yaw, pitch = positions[visible], yaw[visible], pitch[visible]
 
-    flower_parts = [
-        (0, flower_center_y, 0), (s, flower_center_y, 0), (-s, flower_center_y, 0),
-        (0, flower_center_y, s), (0, flower_center_y, -s),
-        (s, flower_center_y + s, 0), (-s, flower_center_y + s, 0),
-        (0, flower_center_y + s, s), (0, flower_center_y + s, -s),
-    ]
-    for x, y, z in flower_parts:
-        draw_cube(x, y, z, s, COLOR_ROJO, tex_wool, texture_repeat=1)
+    PROFILER.stat('abejas visibles', f"{len(positions)}/{SWARM.count}")
+    bee_instances.update(positions, yaw, pitch)
 
-    black_centers = [
-        (s * 0.5, flower_center_y + s * 0.5, 0), (-s * 0.5, flower_center_y + s * 0.5, 0),
-        (0, flower_center_y + s * 0.5, s * 0.5), (0, flower_center_y + s * 0.5, -s * 0.5),
-    ]
-    for x, y, z in black_centers:
-        draw_cube(x, y, z, s * 0.5, COLOR_NEGRO, None, texture_repeat=1)
+    renderer = shared_renderer()
+    renderer.submit(QUEUE, swarm_meshes[1], bee_instances, DEFAULT_STATE)
+    renderer.submit(QUEUE, swarm_meshes[2], bee_instances, WING_STATE)
 
 
-def draw_shadow():
-    glDisable(GL_LIGHTING)
-    glDisable(GL_TEXTURE_2D)
-    glDisable(GL_DEPTH_TEST)
+def draw_swarm_gpu(s_bee=0.3):
+    # Sin poses en la CPU: el costo por cuadro es el mismo con mil abejas que con cien mil
+    global swarm_meshes, swarm_animation, swarm_static_instances, swarm_static_key
 
-    glColor4f(0.1, 0.1, 0.1, 1.0)
+    if swarm_animation is None:
+        swarm_animation = AnimatedSwarmRenderer(QUEUE.pipeline)
+        swarm_static_instances = InstanceBuffer(GL_STATIC_DRAW)
 
-    s_size = 1.5
-    s_y = 0.05
+    if swarm_meshes is None or swarm_meshes[0] != s_bee:
+        swarm_meshes = bake_bee_meshes(s_bee, emit_bee_wings)
 
-    glBegin(GL_QUADS)
-    glVertex3f(-s_size, s_y, s_size)
-    glVertex3f(s_size, s_y, s_size)
-    glVertex3f(s_size, s_y, -s_size)
-    glVertex3f(-s_size, s_y, -s_size)
-    glEnd()
+    # Las instancias solo cambian con otro enjambre o con otra trayectoria (los desfases dependen de la velocidad)
+    path = bee_flight_path()
+    swarm_animation.set_flight_path(path)
+    if swarm_static_key != (SWARM, path):
+        swarm_animation.update_instances(swarm_static_instances, SWARM.centers, path.phase_steps(SWARM.phases))
+        swarm_static_key = (SWARM, path)
 
-    glEnable(GL_DEPTH_TEST)
-    glEnable(GL_LIGHTING)
-    glEnable(GL_TEXTURE_2D)
+    PROFILER.stat('abejas visibles', f"{SWARM.count}/{SWARM.count}")
 
+    steps = simulation_steps()
+    swarm_animation.submit(QUEUE, swarm_meshes[1], swarm_static_instances, DEFAULT_STATE, steps)
+    swarm_animation.submit(QUEUE, swarm_meshes[2], swarm_static_instances, WING_STATE, steps)
 
-def init_opengl():
-    glEnable(GL_DEPTH_TEST)
-    glDepthFunc(GL_LESS)
 
-    glEnable(GL_LIGHTING)
-    glEnable(GL_LIGHT0)
+def create_swarm(count, seed=0):
+    global SWARM, swarm_prev_pose, swarm_current_pose
 
-    light_ambient = [0.1, 0.1, 0.1, 1.0]
-    light_diffuse = [1.0, 1.0, 1.0, 1.0]
-    light_specular = [1.0, 1.0, 1.0, 1.0]
+    SWARM = BeeSwarm(count, phases=random_phases(count, seed), orbit_radius=ORBIT_RADIUS, speed=BEE_SPEED,
+                     height=BEE_Y_HEIGHT, approach_speed=APPROACH_SPEED, min_radius=MIN_RADIUS_SURVOL,
+                     max_height=SURVOL_ALTURA_MAX, max_survol_steps=MAX_SURVOL_STEPS)
+    swarm_prev_pose = swarm_current_pose = None
 
-    glLightfv(GL_LIGHT0, GL_AMBIENT, light_ambient)
-    glLightfv(GL_LIGHT0, GL_DIFFUSE, light_diffuse)
-    glLightfv(GL_LIGHT0, GL_SPECULAR, light_specular)
-    glLightfv(GL_LIGHT0, GL_POSITION, LIGHT_POS)
 
-    glEnable(GL_COLOR_MATERIAL)
-    glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE)
+def invalidate_models():
+    TULIP.invalidate(ATLAS)
+    invalidate_bee_model()
 
-    glMatrixMode(GL_PROJECTION)
-    gluPerspective(45, (WINDOW_WIDTH / WINDOW_HEIGHT), 0.1, 50.0)
-    glMatrixMode(GL_MODELVIEW)
 
-    glClearColor(0.53, 0.81, 0.98, 1.0)
+def init_opengl():
+    TULIP.init_opengl(WINDOW_WIDTH, WINDOW_HEIGHT, shaders=SHADERS or GPU_BEES)
 
 
 def update_bee_movement():
@@ -280,7 +255,7 @@ def update_bee_movement():
         if bee_angle > 360.0:
             bee_angle -= 360.0
 
-        BEE_RADIUS = 2.5  # Radio de órbita grande
+        BEE_RADIUS = ORBIT_RADIUS  # Radio de órbita grande
 
         angle_rad = np.radians(bee_angle)
         bee_x = np.sin(angle_rad) * BEE_RADIUS
@@ -334,7 +309,7 @@ def update_bee_movement():
     elif bee_state == BeeState.REGRESANDO:
        
 
-        target_radius = 2.5
+        target_radius = ORBIT_RADIUS
         target_y = BEE_Y_HEIGHT
 
         # 1. Ajuste de Radio (para que el radio vuelva a 2.5)
@@ -358,25 +333,7 @@ def update_bee_movement():
             bee_y = target_y
 
 
-def display():
-    global cam_rot_x, cam_rot_y, zoom, bee_x, bee_y, bee_z, bee_angle, bee_state
-
-    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-    glLoadIdentity()
-
-    update_bee_movement()
-
-    glTranslatef(0.0, 0.0, -zoom)
-    glRotatef(cam_rot_x, 1, 0, 0)
-    glRotatef(cam_rot_y, 0, 1, 0)
-
-    draw_shadow()
-    draw_tulip_model()
-
-    glPushMatrix()
-
-    glTranslatef(bee_x, bee_y, bee_z)
-
+def bee_pose():
     rotation_angle = 0.0
     pitch_angle = 0.0  # Inclinación 
     if bee_state == BeeState.CIRCULANDO:
@@ -398,72 +355,158 @@ def display():
         rotation_angle = bee_angle + 90.0
         pitch_angle = 10.0  # Ligera inclinación mientras se estabiliza
 
-    glRotatef(rotation_angle, 0, 1, 0)
-    glRotatef(pitch_angle, 1, 0, 0)  # Aplicar inclinación
+    return float(bee_x), float(bee_y), float(bee_z), rotation_angle, pitch_angle
+
+
+def swarm_pose():
+    return (SWARM.positions(),) + SWARM.orientations()
+
+
+def bee_flight_path():
+    # Se compila de nuevo solo si cambió algún parámetro del vuelo
+    global flight_path
+
+    params = dict(orbit_radius=ORBIT_RADIUS, speed=BEE_SPEED, height=BEE_Y_HEIGHT, approach_speed=APPROACH_SPEED,
+                  min_radius=MIN_RADIUS_SURVOL, max_height=SURVOL_ALTURA_MAX, max_survol_steps=MAX_SURVOL_STEPS)
+    if flight_path is None or flight_path.params != params:
+        flight_path = FlightPath(**params)
+    return flight_path
+
+
+def simulation_steps():
+    # Tiempo simulado en pasos, con la fracción del siguiente paso ya incluida. Como en la máquina de
+    # estados, el primer paso ya está dado antes del primer cuadro
+    return max(SIM_CLOCK.steps + SIM_CLOCK.alpha, 1.0)
 
-    draw_minecraft_bee(s_bee=0.3)
 
-    glPopMatrix()
+def flight_pose(offsets=0.0):
+    return bee_flight_path().pose(simulation_steps(), offsets)
 
-    pygame.display.flip()
 
+def step_simulation():
+    # La máquina de estados avanza a SIMULATION_HZ pasos por segundo sin importar los cuadros
+    global bee_prev_pose, bee_current_pose, swarm_prev_pose, swarm_current_pose
 
-def main():
-    global mouse_down, last_mouse_pos, cam_rot_x, cam_rot_y, zoom, TEXTURES
+    if FLIGHT_PATH or (GPU_BEES and SWARM is not None):
+        # Con la trayectoria precalculada no hay estado que avanzar, solo el reloj
+        SIM_CLOCK.advance()
+        return
 
-    pygame.init()
-    pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), DOUBLEBUF | OPENGL)
-    pygame.display.set_caption("Abejita encima de tulipan")
+    if SWARM is not None:
+        if swarm_current_pose is None:
+            SWARM.step()
+            swarm_prev_pose = swarm_current_pose = swarm_pose()
 
-    init_opengl()
+        for _ in range(SIM_CLOCK.advance()):
+            SWARM.step()
+            swarm_prev_pose, swarm_current_pose = swarm_current_pose, swarm_pose()
+        return
 
-    glEnable(GL_TEXTURE_2D)
+    if bee_current_pose is None:
+        update_bee_movement()
+        bee_prev_pose = bee_current_pose = bee_pose()
 
-    TEXTURES['grass_top'] = load_texture("grass_top.png")
-    TEXTURES['red_wool'] = load_texture("red-wool.png")
-    TEXTURES['leaves'] = load_texture("oak-leaves.png")
-    TEXTURES['dirt'] = load_texture("dirt.png")
+    for _ in range(SIM_CLOCK.advance()):
+        update_bee_movement()
+        bee_prev_pose, bee_current_pose = bee_current_pose, bee_pose()
 
-    TEXTURES['bee_body'] = load_texture("bee_body.png")
 
-    TEXTURES['bee_wings'] = load_texture("bee_wings.png")
+def bee_matrix():
+    # Se dibuja entre los dos últimos pasos de simulación según lo que ya pasó del siguiente
+    if FLIGHT_PATH:
+        (x, y, z), rotation_angle, pitch_angle = flight_pose()
+    else:
+        x, y, z, rotation_angle, pitch_angle = interpolate_pose(bee_prev_pose, bee_current_pose, SIM_CLOCK.alpha)
+
+    return model_matrix(x, y, z, rotation_angle, pitch_angle)
+
+
+def draw_bee():
+    draw_minecraft_bee(bee_matrix(), s_bee=0.3)
+
+
+def submit_bee_casters(queue):
+    # Solo los cuerpos, en la pose que ya tienen en este cuadro: las alas son translúcidas. Del enjambre
+    # en la CPU hacen sombra las abejas que pasaron el frustum de la cámara
+    if SWARM is not None and GPU_BEES:
+        swarm_animation.submit(queue, swarm_meshes[1], swarm_static_instances, DEFAULT_STATE, simulation_steps())
+    elif SWARM is not None:
+        shared_renderer().submit(queue, swarm_meshes[1], bee_instances, DEFAULT_STATE)
+    elif STATIC_MESH:
+        queue.submit_mesh(bee_meshes[1], DEFAULT_STATE, bee_matrix())
+    else:
+        queue.submit(partial(emit_bee_body, draw_cube, 0.3, TEXTURES.get('bee_body')), matrix=bee_matrix())
+
+
+def bee_bounds():
+    # Caja por la que vuela la abeja, o cada abeja del enjambre alrededor de su centro, más su tamaño.
+    # Sale del ciclo precalculado también sin FLIGHT_PATH: la máquina de estados recorre la misma órbita
+    samples = bee_flight_path().samples
+    low, high = samples[0:3].min(axis=1), samples[0:3].max(axis=1)
+    if SWARM is not None:
+        low[[0, 2]] += SWARM.centers.min(axis=0)
+        high[[0, 2]] += SWARM.centers.max(axis=0)
+    return low - 0.5, high + 0.5
+
+
+def render_scene():
+    with PROFILER.phase('update_bee_movement'):
+        step_simulation()
+
+    begin_frame(CAMERA, QUEUE)
+
+    with PROFILER.phase('draw_tulip_model'):
+        TULIP.draw(PROFILER)
+
+    with PROFILER.phase('draw_bee'):
+        if SWARM is not None and GPU_BEES:
+            draw_swarm_gpu()
+        elif SWARM is not None:
+            draw_swarm()
+        else:
+            draw_bee()
+
+    # Después de los modelos: la sombra se pinta sobre lo opaco y sus mapas usan las poses de este cuadro.
+    # Las abejas van cada cuadro a la capa dinámica, que cubre solo por donde vuelan
+    with PROFILER.phase('draw_shadow'):
+        TULIP.draw_shadow(PROFILER, bee_bounds(), submit_bee_casters)
 
-    if not all(TEXTURES.values()):
-        print("ADVERTENCIA: Alguna textura no se cargó. Usando color sólido o fallando.")
+    flush_frame(QUEUE, PROFILER)
 
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
 
-            elif event.type == MOUSEBUTTONDOWN:
-                if event.button == 1:
-                    mouse_down = True
-                    last_mouse_pos = event.pos
-                elif event.button == 4:
-                    zoom = max(5.0, zoom - 1.0)
-                elif event.button == 5:
-                    zoom = min(40.0, zoom + 1.0)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tulipán 3D con una abeja animada.")
+    add_render_args(parser)
+    parser.add_argument('--garden', type=parse_garden, default=None, metavar='FILASxCOLUMNAS',
+                        help="Dibuja un jardín de tulipanes con instancias en lugar de uno solo")
+    parser.add_argument('--mesh-workers', type=int, default=0, metavar='N',
+                        help="Malla los chunks del modelo en N procesos en lugar del hilo de render")
+    parser.add_argument('--bees', type=int, default=None,
+                        help="Anima un enjambre de N abejas dibujado con instancias")
+    parser.add_argument('--gpu-bees', action='store_true',
+                        help="El enjambre vuela en el vertex shader; la CPU solo manda el tiempo (usa --shaders)")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Semilla de los desfases del enjambre y de la disposición del jardín")
+    return parse_scene_args(parser, argv)
 
-            elif event.type == MOUSEBUTTONUP:
-                if event.button == 1:
-                    mouse_down = False
 
-            elif event.type == MOUSEMOTION:
-                if mouse_down:
-                    dx, dy = event.pos[0] - last_mouse_pos[0], event.pos[1] - last_mouse_pos[1]
+def main(argv=None):
+    global MESH_POOL, GPU_BEES
 
-                    cam_rot_y += dx * 0.2
-                    cam_rot_x = max(-90, min(90, cam_rot_x + dy * 0.2))
+    args = parse_args(argv)
 
-                    last_mouse_pos = event.pos
+    if args.garden:
+        create_garden(*args.garden, seed=args.seed)
 
-        display()
+    if args.bees:
+        create_swarm(args.bees, args.seed)
+    GPU_BEES = args.gpu_bees
 
-        pygame.time.wait(10)
+    # Los procesos del pool se crean antes que la ventana y los hilos de texturas
+    if args.mesh_workers:
+        MESH_POOL = TULIP.mesh_pool = MeshWorkerPool(args.mesh_workers)
 
-    pygame.quit()
+    run_window(sys.modules[__name__], "Abejita encima de tulipan", args)
 
 
 if __name__ == "__main__":
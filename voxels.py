@@ -0,0 +1,363 @@
+import numpy as np
+
+from mesh import (CUBE_CORNERS, CUBE_FACES, CUBE_NORMALS, VERTEX_FLOATS, StaticMesh, load_cached_mesh,
+                  mesh_cache_key, save_cached_mesh, texture_set)
+
+# Lado de un vóxel: la mitad del centro negro, así todos los bloques del tulipán caen en la rejilla
+VOXEL_SIZE = 0.125
+
+# Tamaño en unidades de mundo que cubre una repetición de textura (bloque de 0.5 o tierra con repeat 4)
+TEXTURE_TILE = 0.5
+
+MAT_AIRE = 0
+MAT_HOJAS = 1
+MAT_LANA_ROJA = 2
+MAT_TIERRA = 3
+MAT_CENTRO_NEGRO = 4
+
+# 'texture' usa las claves de TEXTURES; un dict indica textura por cara como en draw_cube.
+# 'uv_origin' es la esquina desde donde se repite la textura, para respetar el mapeo original.
+MATERIALS = {
+    MAT_HOJAS: {'color': (0.0, 0.7, 0.0), 'texture': 'leaves', 'uv_origin': (-0.25, 0.0, -0.25)},
+    MAT_LANA_ROJA: {'color': (1.0, 0.0, 0.0), 'texture': 'red_wool', 'uv_origin': (-0.25, 0.0, -0.25)},
+    MAT_TIERRA: {'color': (0.47, 0.3, 0.17), 'texture': {3: 'grass_top', 'default': 'dirt'},
+                 'uv_origin': (-1.0, -1.25, -1.0)},
+    MAT_CENTRO_NEGRO: {'color': (0.0, 0.0, 0.0), 'texture': None, 'uv_origin': (0.0, 0.0, 0.0)},
+}
+
+
+def tulip_blocks():
+    # (x, y, z, tamaño, material) en el mismo orden en que se dibujaban los cubos
+    s = 0.5
+    blocks = [(0, -s * 0.5, 0, 2.0, MAT_TIERRA)]
+
+    stem_blocks = [
+        (0, s * 0.5, 0), (0, s * 1.5, 0), (0, s * 2.5, 0), (0, s * 3.5, 0),
+        (-s, s * 1.5, 0), (s, s * 1.5, 0), (0, s * 2.5, -s), (0, s * 2.5, s),
+    ]
+    blocks += [(x, y, z, s, MAT_HOJAS) for x, y, z in stem_blocks]
+
+    flower_center_y = s * 4.5
+
+    flower_parts = [
+        (0, flower_center_y, 0), (s, flower_center_y, 0), (-s, flower_center_y, 0),
+        (0, flower_center_y, s), (0, flower_center_y, -s),
+        (s, flower_center_y + s, 0), (-s, flower_center_y + s, 0),
+        (0, flower_center_y + s, s), (0, flower_center_y + s, -s),
+    ]
+    blocks += [(x, y, z, s, MAT_LANA_ROJA) for x, y, z in flower_parts]
+
+    black_centers = [
+        (s * 0.5, flower_center_y + s * 0.5, 0), (-s * 0.5, flower_center_y + s * 0.5, 0),
+        (0, flower_center_y + s * 0.5, s * 0.5), (0, flower_center_y + s * 0.5, -s * 0.5),
+    ]
+    blocks += [(x, y, z, s * 0.5, MAT_CENTRO_NEGRO) for x, y, z in black_centers]
+
+    return blocks
+
+
+def material_texture(material, face_index, textures):
+    if not textures:
+        return None
+
+    spec = MATERIALS[material]['texture']
+    if isinstance(spec, dict):
+        spec = spec.get(face_index, spec.get('default'))
+
+    return textures.get(spec) if spec else None
+
+
+def material_draw_args(material, size, textures):
+    # Argumentos equivalentes para draw_cube (color, textura, repeticiones)
+    spec = MATERIALS[material]['texture']
+
+    if not textures or not spec:
+        texture_id = None
+    elif isinstance(spec, dict):
+        texture_id = {face: textures.get(name) for face, name in spec.items()}
+    else:
+        texture_id = textures.get(spec)
+
+    return MATERIALS[material]['color'], texture_id, size / TEXTURE_TILE
+
+
+class VoxelGrid:
+    """Rejilla densa de ids de material; origin es la esquina mínima del vóxel (0, 0, 0)."""
+
+    def __init__(self, shape, origin=(0.0, 0.0, 0.0), voxel_size=VOXEL_SIZE):
+        self.data = np.zeros(shape, np.uint8)
+        self.origin = np.array(origin, np.float32)
+        self.voxel_size = voxel_size
+
+    @classmethod
+    def from_blocks(cls, blocks, voxel_size=VOXEL_SIZE):
+        centers = np.array([b[:3] for b in blocks], np.float64)
+        halves = np.array([b[3] for b in blocks], np.float64)[:, None] / 2.0
+
+        lo = (centers - halves).min(axis=0)
+        hi = (centers + halves).max(axis=0)
+        shape = tuple(np.round((hi - lo) / voxel_size).astype(int))
+
+        grid = cls(shape, lo, voxel_size)
+        for x, y, z, size, material in blocks:
+            grid.fill_cube(x, y, z, size, material)
+        return grid
+
+    def world_to_index(self, x, y, z):
+        return tuple(np.floor((np.array((x, y, z)) - self.origin) / self.voxel_size).astype(int))
+
+    def fill_box(self, min_corner, max_corner, material):
+        lo = np.round((np.array(min_corner) - self.origin) / self.voxel_size).astype(int)
+        hi = np.round((np.array(max_corner) - self.origin) / self.voxel_size).astype(int)
+        lo = np.clip(lo, 0, self.data.shape)
+        hi = np.clip(hi, 0, self.data.shape)
+
+        self.data[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]] = material
+        return lo, hi
+
+    def fill_cube(self, center_x, center_y, center_z, size, material):
+        half = size / 2.0
+        self.fill_box((center_x - half, center_y - half, center_z - half),
+                      (center_x + half, center_y + half, center_z + half), material)
+
+    def occupied_count(self):
+        return int(np.count_nonzero(self.data))
+
+    def downsample(self, factor):
+        # Rejilla factor veces más gruesa: cada bloque con algo ocupado toma su material más frecuente,
+        # así un tallo fino no desaparece
+        shape = -(-np.array(self.data.shape) // factor)
+        padded = np.zeros(shape * factor, np.uint8)
+        padded[:self.data.shape[0], :self.data.shape[1], :self.data.shape[2]] = self.data
+
+        blocks = padded.reshape(shape[0], factor, shape[1], factor, shape[2], factor)
+        counts = np.stack([(blocks == m).sum(axis=(1, 3, 5)) for m in MATERIALS])
+
+        coarse = VoxelGrid(tuple(shape), self.origin, self.voxel_size * factor)
+        coarse.data = np.where(counts.any(axis=0), np.array(list(MATERIALS), np.uint8)[counts.argmax(axis=0)], MAT_AIRE)
+        return coarse
+
+
+def build_tulip_grid():
+    return VoxelGrid.from_blocks(tulip_blocks())
+
+
+def material_tables(textures, atlas=None):
+    # Tablas [material, cara] para resolver textura, color, origen uv y región del atlas sin bucles
+    # por vóxel. Con atlas todas las caras usan la misma textura; las de color sólido apuntan a la
+    # región blanca con tamaño cero.
+    tex_table = np.zeros((256, 6), np.int64)
+    color_table = np.ones((256, 6, 4), np.float32)
+    uv_origin_table = np.zeros((256, 3), np.float32)
+    region_table = np.zeros((256, 6, 4), np.float32)
+
+    for material, spec in MATERIALS.items():
+        uv_origin_table[material] = spec['uv_origin']
+        color = tuple(spec['color']) + (1.0,) * (4 - len(spec['color']))
+
+        for face in range(6):
+            if atlas is not None:
+                region = material_texture(material, face, atlas.regions)
+                tex_table[material, face] = atlas.texture_id
+                if region:
+                    region_table[material, face] = region
+                else:
+                    region_table[material, face, :2] = atlas.white_uv()
+                    color_table[material, face] = color
+                continue
+
+            tex_id = material_texture(material, face, textures)
+            if tex_id:
+                tex_table[material, face] = tex_id
+            else:
+                color_table[material, face] = color
+
+    return tex_table, color_table, uv_origin_table, region_table
+
+
+def average_material_colors(atlas=None):
+    # Tabla [material, cara] con el color medio de la textura de cada cara, para mallas sin textura
+    # que a distancia se vean del mismo tono; sin atlas quedan los colores sólidos de MATERIALS
+    _, color_table, _, _ = material_tables(None)
+    if atlas is None:
+        return color_table
+
+    height, width = atlas.pixels.shape[:2]
+    for material in MATERIALS:
+        for face in range(6):
+            region = material_texture(material, face, atlas.regions)
+            if region:
+                u0, v0, du, dv = region
+                x0, y0 = int(round(u0 * width)), int(round(v0 * height))
+                x1, y1 = int(round((u0 + du) * width)), int(round((v0 + dv) * height))
+                color_table[material, face, :3] = atlas.pixels[y0:y1, x0:x1].reshape(-1, 3).mean(axis=0) / 255.0
+
+    return color_table
+
+
+# Esquinas de cada cara en un cubo unitario [0, 1]^3 y ejes u/v que reproducen las uv de draw_cube
+FACE_CORNERS = (CUBE_CORNERS + 0.5)[CUBE_FACES]
+FACE_U_AXES = FACE_CORNERS[:, 1] - FACE_CORNERS[:, 0]
+FACE_V_AXES = FACE_CORNERS[:, 3] - FACE_CORNERS[:, 0]
+
+# Eje y sentido del vecino que tapa cada cara (frontal +z, trasera -z, inferior -y, ...)
+FACE_AXES = np.abs(CUBE_NORMALS).argmax(axis=1)
+FACE_STEPS = CUBE_NORMALS.sum(axis=1).astype(int)
+
+
+def visible_faces(data, face):
+    # Material de cada vóxel cuya cara 'face' no está tapada por un vecino opaco, 0 si no
+    axis = FACE_AXES[face]
+    padded = np.pad(data, 1)
+    neighbour = np.roll(padded, -FACE_STEPS[face], axis=axis)[1:-1, 1:-1, 1:-1]
+
+    return np.where(neighbour == 0, data, 0)
+
+
+def greedy_quads(mask, face, tile=None, phases=None):
+    # Fusiona caras coplanares del mismo material: primero tramos a lo largo de un eje del plano
+    # y después tramos idénticos en filas consecutivas del otro eje. Devuelve (mínimo, extensión, material).
+    # Con 'tile' los quads se cortan en los bordes de repetición de la textura (phases[material, eje]),
+    # necesario con el atlas porque GL_REPEAT no puede repetir una sola región.
+    a = FACE_AXES[face]
+    b, c = [axis for axis in range(3) if axis != a]
+    m = np.moveaxis(mask, (a, b, c), (0, 1, 2))
+
+    prev = np.pad(m, ((0, 0), (0, 0), (1, 0)))[:, :, :-1]
+    nxt = np.pad(m, ((0, 0), (0, 0), (0, 1)))[:, :, 1:]
+    starts = m != prev
+    ends = m != nxt
+
+    if tile:
+        c_index = np.arange(m.shape[2])[None, None, :] - phases[m, c]
+        starts |= c_index % tile == 0
+        ends |= (c_index + 1) % tile == 0
+
+    sa, sb, sc = np.nonzero((m != 0) & starts)
+    ec = np.nonzero((m != 0) & ends)[2]
+    length = ec - sc + 1
+    material = m[sa, sb, sc]
+
+    order = np.lexsort((sb, material, length, sc, sa))
+    sa, sb, sc, length, material = sa[order], sb[order], sc[order], length[order], material[order]
+
+    new_quad = np.ones(len(sa), bool)
+    new_quad[1:] = ((sa[1:] != sa[:-1]) | (sc[1:] != sc[:-1]) | (length[1:] != length[:-1]) |
+                    (material[1:] != material[:-1]) | (sb[1:] != sb[:-1] + 1))
+    if tile:
+        new_quad |= (sb - phases[material, b]) % tile == 0
+    first = np.flatnonzero(new_quad)
+    height = np.diff(np.append(first, len(sa)))
+
+    mins = np.empty((len(first), 3), np.int64)
+    mins[:, a], mins[:, b], mins[:, c] = sa[first], sb[first], sc[first]
+
+    extents = np.ones((len(first), 3), np.int64)
+    extents[:, b], extents[:, c] = height, length[first]
+
+    return mins, extents, material[first]
+
+
+def tile_phases(origin, voxel_size, uv_origin_table):
+    # Índice de vóxel (módulo la repetición) donde empieza cada repetición de textura por material y eje
+    tile = int(round(TEXTURE_TILE / voxel_size))
+    phases = np.round((uv_origin_table - origin) / voxel_size).astype(np.int64) % tile
+    return tile, phases
+
+
+def extract_mesh(grid, textures=None, cull=True, greedy=True, atlas=None, materials=None, colors=None, border=0):
+    # Devuelve (vertices, rangos, estadísticas) con la disposición de mesh.py. Todo el trabajo es
+    # vectorial sobre los vóxeles ocupados; el único bucle de Python recorre las 6 caras.
+    # Con materials solo se emiten las caras de esos materiales, pero la oclusión usa toda la rejilla.
+    # colors reemplaza la tabla de colores de las caras sin textura (ver average_material_colors).
+    # border es el ancho del marco de vóxeles vecinos que trae la rejilla: tapan caras pero no emiten.
+    interior = tuple(slice(border, n - border) for n in grid.data.shape)
+    origin = grid.origin + np.float32(border * grid.voxel_size)
+
+    keep = None if materials is None else np.asarray(materials)
+    inside = grid.data[interior]
+    voxels = int(np.count_nonzero(inside if keep is None else np.isin(inside, keep)))
+    stats = {'voxels': voxels, 'faces': voxels * 6, 'culled': 0, 'merged': 0, 'quads': 0}
+
+    tex_table, color_table, uv_origin_table, region_table = material_tables(textures, atlas)
+    if colors is not None:
+        color_table = np.where(tex_table[:, :, None] == 0, colors, color_table)
+    tile, phases = tile_phases(origin, grid.voxel_size, uv_origin_table) if atlas is not None else (None, None)
+
+    face_vertices = []
+    face_textures = []
+
+    for face in range(6):
+        mask = (visible_faces(grid.data, face) if cull else grid.data)[interior]
+        if keep is not None:
+            mask = np.where(np.isin(mask, keep), mask, MAT_AIRE)
+        visible = int(np.count_nonzero(mask))
+
+        if greedy:
+            mins, extents, quad_materials = greedy_quads(mask, face, tile, phases)
+        else:
+            mins = np.argwhere(mask)
+            extents = np.ones_like(mins)
+            quad_materials = mask[tuple(mins.T)]
+
+        stats['culled'] += voxels - visible
+        stats['merged'] += visible - len(mins)
+        stats['quads'] += len(mins)
+
+        corners = origin + (mins[:, None, :] + FACE_CORNERS[face][None, :, :] * extents[:, None, :]) * grid.voxel_size
+        local = corners - uv_origin_table[quad_materials][:, None, :]
+
+        data = np.empty((len(mins), 4, VERTEX_FLOATS), np.float32)
+        data[:, :, 0:3] = corners
+        data[:, :, 3:6] = CUBE_NORMALS[face]
+        data[:, :, 6] = local @ FACE_U_AXES[face] / TEXTURE_TILE
+        data[:, :, 7] = local @ FACE_V_AXES[face] / TEXTURE_TILE
+        data[:, :, 8:12] = color_table[quad_materials, face][:, None, :]
+
+        if atlas is not None:
+            # Cada quad cae dentro de una sola repetición: uv local en [0, 1] llevada a su región
+            uv = data[:, :, 6:8]
+            uv -= np.floor(uv.min(axis=1, keepdims=True) + 1e-4)
+            region = region_table[quad_materials, face][:, None, :]
+            data[:, :, 6:8] = region[:, :, 0:2] + uv * region[:, :, 2:4]
+
+        face_vertices.append(data)
+        face_textures.append(tex_table[quad_materials, face])
+
+    vertices, ranges = pack_by_texture(np.concatenate(face_vertices), np.concatenate(face_textures))
+    return vertices, ranges, stats
+
+
+def pack_by_texture(quads, quad_textures):
+    # Ordena los quads por textura y devuelve el array plano con un rango de dibujo por textura
+    order = np.argsort(quad_textures, kind='stable')
+    quads = quads[order]
+    quad_textures = quad_textures[order]
+
+    tex_ids, starts, counts = np.unique(quad_textures, return_index=True, return_counts=True)
+    ranges = [(int(t) or None, int(first) * 4, int(count) * 4) for t, first, count in zip(tex_ids, starts, counts)]
+
+    return quads.reshape(-1, VERTEX_FLOATS), ranges
+
+
+def voxel_mesh_key(grid, textures=None, atlas=None, cull=True, greedy=True, materials=None, colors=None, border=0):
+    # Clave de caché con todo lo que decide la malla de extract_mesh
+    return mesh_cache_key('voxels', grid.data, grid.origin, grid.voxel_size, cull, greedy,
+                          None if materials is None else tuple(materials), colors, border, texture_set(textures, atlas))
+
+
+def build_voxel_mesh(grid, textures=None, cull=True, greedy=True, atlas=None, materials=None, colors=None, border=0,
+                     cache=False):
+    # Con cache la malla se guarda en MESH_CACHE_DIR y en los arranques siguientes se mapea sin mallar
+    if cache:
+        key = voxel_mesh_key(grid, textures, atlas, cull, greedy, materials, colors, border)
+        mesh = load_cached_mesh(key, textures, atlas)
+        if mesh is not None:
+            return mesh
+
+    vertices, ranges, stats = extract_mesh(grid, textures, cull, greedy, atlas, materials, colors, border)
+
+    if cache:
+        save_cached_mesh(key, vertices, ranges, stats, textures, atlas)
+
+    return StaticMesh(vertices, ranges, stats=stats)
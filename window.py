@@ -0,0 +1,239 @@
+import time
+
+import pygame
+from pygame.locals import *
+
+from capture import FrameRecorder
+from encoders import open_sink
+from profiler import FrameProfiler, install_gl_counter
+from replay import InputRecorder, InputRecording, InputReplay, scene_name
+from textures import TEXTURE_FILES, AsyncTextureLoader
+
+# Cuadros por segundo del video de --record
+RECORD_FPS = 60
+
+# Opciones que deciden qué hay en la escena; --record-input las guarda y --replay las toma del archivo
+SCENE_OPTIONS = ('bees', 'garden', 'seed')
+
+
+class MouseOrbit:
+    """Arrastrar con el botón izquierdo gira la cámara; la rueda la acerca o la aleja."""
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.mouse_down = False
+        self.last_mouse_pos = (0, 0)
+
+    def handle(self, event):
+        if event.type == MOUSEBUTTONDOWN:
+            if event.button == 1:
+                self.mouse_down = True
+                self.last_mouse_pos = event.pos
+            elif event.button == 4:
+                self.camera.dolly(-1.0)
+            elif event.button == 5:
+                self.camera.dolly(1.0)
+
+        elif event.type == MOUSEBUTTONUP:
+            if event.button == 1:
+                self.mouse_down = False
+
+        elif event.type == MOUSEMOTION:
+            if self.mouse_down:
+                dx, dy = event.pos[0] - self.last_mouse_pos[0], event.pos[1] - self.last_mouse_pos[1]
+                self.camera.orbit(dx, dy)
+                self.last_mouse_pos = event.pos
+
+
+def add_render_args(parser):
+    parser.add_argument('--shaders', action='store_true',
+                        help="Dibuja las mallas con shaders GLSL (luz y cámara en un búfer de uniforms)")
+    parser.add_argument('--profile', metavar='RUTA',
+                        help="Mide cada fase del cuadro y guarda los tiempos en CSV o JSON (según la extensión)")
+    parser.add_argument('--gpu-timers', action='store_true',
+                        help="Añade tiempos de GPU por fase con consultas GL_TIME_ELAPSED")
+    parser.add_argument('--record', metavar='RUTA',
+                        help="Graba lo que se ve: a un video con ffmpeg (.mp4, .mkv, ...) o a una carpeta de PNG")
+    parser.add_argument('--record-input', metavar='RUTA',
+                        help="Graba los eventos del ratón y el tiempo de cada cuadro para repetirlos con --replay")
+    parser.add_argument('--replay', metavar='RUTA',
+                        help="Repite una grabación de --record-input: misma cámara, mismos eventos y mismo vuelo")
+
+
+def parse_scene_args(parser, argv=None):
+    # Con --replay la escena queda como se grabó: el enjambre, el jardín y la semilla salen del archivo
+    args = parser.parse_args(argv)
+
+    if args.record_input and args.replay:
+        parser.error("--record-input y --replay no se pueden usar juntos")
+
+    if args.replay:
+        try:
+            recording = InputRecording.load(args.replay)
+        except (OSError, ValueError) as error:
+            parser.error(f"No se pudo leer la grabación: {error}")
+
+        for name, value in recording.options.items():
+            setattr(args, name, tuple(value) if isinstance(value, list) else value)
+
+    # Los chunks de los procesos llegan cuando terminan, no en el mismo cuadro en cada corrida
+    if (args.record_input or args.replay) and getattr(args, 'mesh_workers', 0):
+        parser.error("--mesh-workers no se puede combinar con --record-input ni con --replay")
+
+    return args
+
+
+def display(scene, recorder=None):
+    # render_scene() es el mismo camino que usa el modo sin ventana (headless.py)
+    profiler = scene.PROFILER
+
+    profiler.begin_frame()
+    scene.render_scene()
+
+    # Antes del overlay y del intercambio: se graba la escena sola, del búfer trasero
+    if recorder is not None:
+        with profiler.phase('capture'):
+            recorder.capture()
+
+    profiler.draw_overlay(scene.WINDOW_WIDTH, scene.WINDOW_HEIGHT)
+
+    with profiler.phase('flip'):
+        pygame.display.flip()
+
+    profiler.end_frame()
+
+
+def video_clock(scene):
+    # La ventana no dibuja a un ritmo fijo: el video de --record va con el tiempo de la simulación
+    # (el de pared, o el grabado con --replay) y, en las escenas sin SIM_CLOCK, con el de pared
+    sim_clock = getattr(scene, 'SIM_CLOCK', None)
+    if sim_clock is not None:
+        return lambda: sim_clock.time + sim_clock.accumulator
+    return time.perf_counter
+
+
+def use_textures(scene, texture_loader):
+    scene.ATLAS = texture_loader.atlas
+    scene.invalidate_models()
+
+    if not all(scene.TEXTURES.values()):
+        print("ADVERTENCIA: Alguna textura no se cargó. Usando color sólido para el resto.")
+
+
+def run(scene, caption, args):
+    """Bucle con ventana común a las escenas.
+
+    La escena es un módulo con WINDOW_WIDTH/WINDOW_HEIGHT, CAMERA, PROFILER, SHADERS, init_opengl() y
+    render_scene(). Si tiene SCENE_TEXTURES se cargan en segundo plano y al llegar se guardan en
+    TEXTURES y ATLAS y se llama a su invalidate_models(); si tiene MESH_POOL se atiende cada cuadro.
+    Con args.record cada cuadro se graba con un FrameRecorder. Con args.record_input se graban los
+    eventos para repetirlos con args.replay; en los dos casos la simulación avanza con el tiempo
+    grabado y las texturas se cargan antes del primer cuadro, así no cambia en qué cuadro llegan.
+    """
+    replay = None
+    if args.replay:
+        recording = InputRecording.load(args.replay)
+        if recording.scene != scene_name(scene):
+            raise SystemExit(f"'{args.replay}' es una grabación de {recording.scene}, no de {scene_name(scene)}")
+
+        replay = InputReplay(recording)
+        scene.WINDOW_WIDTH, scene.WINDOW_HEIGHT = recording.header['size']
+
+    pygame.init()
+
+    # Las texturas se decodifican en segundo plano mientras se crean la ventana y el contexto GL;
+    # hasta que estén listas el modelo se dibuja con sus colores sólidos
+    scene_textures = getattr(scene, 'SCENE_TEXTURES', ())
+    texture_loader = None
+    if scene_textures:
+        texture_loader = AsyncTextureLoader({name: TEXTURE_FILES[name] for name in scene_textures})
+
+    # Profundidad de 24 bits, como el contexto de headless.py: la máscara de sombra reconstruye cada píxel
+    # desde ella y con los 16 de SDL por defecto aparecen franjas en las caras
+    pygame.display.gl_set_attribute(GL_DEPTH_SIZE, 24)
+    pygame.display.set_mode((scene.WINDOW_WIDTH, scene.WINDOW_HEIGHT), DOUBLEBUF | OPENGL)
+    pygame.display.set_caption(caption)
+
+    scene.SHADERS = args.shaders
+    scene.init_opengl()
+
+    if args.profile:
+        scene.PROFILER = FrameProfiler(gpu_timers=args.gpu_timers)
+        install_gl_counter(scene.PROFILER, scene)
+
+    recorder = None
+    if args.record:
+        recorder = FrameRecorder(scene.WINDOW_WIDTH, scene.WINDOW_HEIGHT,
+                                 open_sink(args.record, scene.WINDOW_WIDTH, scene.WINDOW_HEIGHT, RECORD_FPS),
+                                 clock=video_clock(scene), fps=RECORD_FPS)
+
+    input_recorder = None
+    if args.record_input:
+        options = {name: getattr(args, name) for name in SCENE_OPTIONS if hasattr(args, name)}
+        input_recorder = InputRecorder(args.record_input, scene, options)
+
+    source = replay if replay is not None else input_recorder
+    if source is not None:
+        source.begin(scene.CAMERA, getattr(scene, 'SIM_CLOCK', None))
+        if texture_loader is not None:
+            texture_loader.finish(scene.TEXTURES)
+            use_textures(scene, texture_loader)
+
+    controls = MouseOrbit(scene.CAMERA)
+    mesh_pool = getattr(scene, 'MESH_POOL', None)
+
+    frame = 0
+    start = time.perf_counter()
+    running = True
+    while running:
+        events = pygame.event.get()
+
+        # Al repetir, de la ventana solo cuenta QUIT: la cámara se mueve con los eventos grabados
+        if replay is not None:
+            if frame == len(replay) or any(event.type == pygame.QUIT for event in events):
+                break
+            events = replay.replay_frame(frame)
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+            else:
+                controls.handle(event)
+
+        if input_recorder is not None:
+            input_recorder.record_frame(events)
+
+        if texture_loader is not None and texture_loader.poll(scene.TEXTURES):
+            use_textures(scene, texture_loader)
+
+        if mesh_pool is not None:
+            mesh_pool.poll()
+
+        display(scene, recorder)
+        frame += 1
+
+        pygame.time.wait(10)
+
+    if input_recorder is not None:
+        recording = input_recorder.close()
+        print(f"{len(recording)} cuadros ({recording.duration:.1f} s) y {len(recording.events)} eventos "
+              f"grabados en '{args.record_input}'")
+
+    if replay is not None:
+        elapsed = time.perf_counter() - start
+        print(f"Repetidos {frame} de {len(replay)} cuadros en {elapsed:.3f} s "
+              f"({frame / max(elapsed, 1e-9):.1f} cuadros/s)")
+
+    if recorder is not None:
+        recorder.close()
+        print(f"{recorder.recorded} cuadros grabados en '{args.record}'")
+
+    if args.profile:
+        scene.PROFILER.print_summary()
+        scene.PROFILER.export(args.profile)
+        print(f"Perfil guardado en '{args.profile}'")
+
+    if mesh_pool is not None:
+        mesh_pool.shutdown()
+
+    pygame.quit()